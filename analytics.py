@@ -0,0 +1,238 @@
+import argparse
+import sys
+import time
+
+from database import get_pool
+from money import Money
+from order_export import ORDER_STATUSES, order_filter
+from valuation import GROUP_KEYS, LINE_STATUSES, PRODUCT_JOIN, load_lines, np
+
+# Sales reports for the admin panel. Order lines are read once with
+# valuation.load_lines into int64 columns; every report is then a group-by
+# over those columns (sort + reduceat with NumPy, dictionaries without it),
+# so switching between reports needs no more SQL.
+
+DEFAULT_BATCH_SIZE = 20000
+UNKNOWN_STATUS = "Unknown"
+
+# The valuation.GROUP_KEYS columns every report here needs
+SALES_KEYS = ('order', 'day', 'seller', 'category', 'order_status', 'line_status')
+DIMENSIONS = ('seller', 'category', 'day')
+
+CANCELLED_LINE = LINE_STATUSES.index('Cancelled')
+
+# The same reports in plain SQL, for the benchmark and for checking results
+SQL_GROUPED = f"""
+    SELECT {{key}} as group_key, SUM(op.quantity * op.price), SUM(op.quantity), COUNT(DISTINCT op.order_id)
+    FROM shopper_orders o
+    JOIN ordered_products op ON op.order_id = o.order_id{PRODUCT_JOIN}
+    WHERE {{order_filter}} AND op.ordered_product_status IS NOT 'Cancelled'
+    GROUP BY group_key
+"""
+
+SQL_STATUS = """
+    SELECT {key} as group_key, COUNT(*), SUM(op.quantity), SUM(op.quantity * op.price)
+    FROM shopper_orders o
+    JOIN ordered_products op ON op.order_id = o.order_id
+    WHERE {order_filter}
+    GROUP BY group_key
+"""
+
+
+def load_sales(conn, date_from=None, date_to=None, statuses=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Read the matching order lines, cancelled ones included, into valuation OrderLines with SALES_KEYS"""
+    return load_lines(conn, SALES_KEYS, date_from, date_to, statuses, include_cancelled=True,
+                      batch_size=batch_size)
+
+
+def _average(revenue, orders):
+    """Average order value rounded half up to the penny"""
+    return Money((2 * revenue + orders) // (2 * orders)) if orders else Money(0)
+
+
+def _grouped_numpy(sales, key):
+    keep = sales.column('line_status') != CANCELLED_LINE
+    keys = sales.column(key)[keep]
+    orders = sales.column('order')[keep]
+    quantity = sales.column('quantity')[keep]
+    values = quantity * sales.column('price')[keep]
+    if not len(keys):
+        return []
+    # Sort by group then order so each group's distinct orders are runs too.
+    # One argsort of group * span + order is about twice as fast as lexsort.
+    span = int(orders.max()) + 1
+    if int(keys.min()) >= 0 and int(keys.max()) < np.iinfo(np.int64).max // span:
+        order = np.argsort(keys * span + orders)
+    else:
+        order = np.lexsort((orders, keys))
+    keys, orders = keys[order], orders[order]
+    group_start = np.r_[True, keys[1:] != keys[:-1]]
+    order_start = group_start | np.r_[True, orders[1:] != orders[:-1]]
+    starts = np.flatnonzero(group_start)
+    return list(zip(keys[starts].tolist(),
+                    np.add.reduceat(values[order], starts).tolist(),
+                    np.add.reduceat(quantity[order], starts).tolist(),
+                    np.add.reduceat(order_start.astype(np.int64), starts).tolist()))
+
+
+def _grouped_python(sales, key):
+    totals = {}
+    columns = (sales.keys[key], sales.keys['order'], sales.quantity, sales.price, sales.keys['line_status'])
+    for group, order_id, quantity, price, status in zip(*columns):
+        if status == CANCELLED_LINE:
+            continue
+        entry = totals.get(group)
+        if entry is None:
+            entry = totals[group] = [0, 0, set()]
+        entry[0] += quantity * price
+        entry[1] += quantity
+        entry[2].add(order_id)
+    return [(group, revenue, units, len(orders)) for group, (revenue, units, orders) in totals.items()]
+
+
+def grouped_sales(sales, key):
+    """Revenue, units, orders and average order value per group, largest revenue first.
+
+    Cancelled lines are left out, as in the order rollups.
+    """
+    rows = _grouped_numpy(sales, key) if np is not None else _grouped_python(sales, key)
+    report = [{'key': group, 'revenue': Money(revenue), 'units': units, 'orders': orders,
+               'average_order_value': _average(revenue, orders)}
+              for group, revenue, units, orders in rows]
+    report.sort(key=lambda row: (-row['revenue'], row['key']))
+    return report
+
+
+def status_breakdown(sales, key='line_status'):
+    """Lines, units and value per line or order status, cancelled lines included"""
+    names = (LINE_STATUSES if key == 'line_status' else ORDER_STATUSES) + (UNKNOWN_STATUS,)
+    if np is not None and len(sales):
+        codes = sales.column(key)
+        quantity = sales.column('quantity')
+        size = len(names)
+        counts = np.bincount(codes, minlength=size)
+        units = np.bincount(codes, weights=quantity, minlength=size)
+        # Sum values per status exactly in int64 (bincount weights are floats)
+        values = quantity * sales.column('price')
+        value_sums = [int(values[codes == code].sum()) if counts[code] else 0 for code in range(size)]
+        rows = zip(counts.tolist(), units.astype(np.int64).tolist(), value_sums)
+    else:
+        totals = [[0, 0, 0] for _ in names]
+        for code, quantity, price in zip(sales.keys[key], sales.quantity, sales.price):
+            entry = totals[code]
+            entry[0] += 1
+            entry[1] += quantity
+            entry[2] += quantity * price
+        rows = totals
+    return [{'status': name, 'lines': count, 'units': units, 'value': Money(value)}
+            for name, (count, units, value) in zip(names, rows) if count]
+
+
+def _distinct_count(ids):
+    """Number of distinct ids; counting into a table beats sorting for row ids"""
+    if not len(ids):
+        return 0
+    if int(ids.min()) >= 0 and int(ids.max()) <= 4 * len(ids) + 1000000:
+        return int(np.count_nonzero(np.bincount(ids)))
+    return len(np.unique(ids))
+
+
+def _totals(sales):
+    if np is not None and len(sales):
+        keep = sales.column('line_status') != CANCELLED_LINE
+        quantity = sales.column('quantity')[keep]
+        revenue = int(np.dot(quantity, sales.column('price')[keep]))
+        return revenue, int(quantity.sum()), _distinct_count(sales.column('order')[keep])
+    revenue = units = 0
+    orders = set()
+    for order_id, quantity, price, status in zip(sales.keys['order'], sales.quantity, sales.price,
+                                                 sales.keys['line_status']):
+        if status != CANCELLED_LINE:
+            revenue += quantity * price
+            units += quantity
+            orders.add(order_id)
+    return revenue, units, len(orders)
+
+
+def sales_summary(sales):
+    """Revenue, units, orders and average order value over every line that was not cancelled"""
+    revenue, units, orders = _totals(sales)
+    return {'lines': len(sales), 'revenue': Money(revenue), 'units': units, 'orders': orders,
+            'average_order_value': _average(revenue, orders)}
+
+
+def group_labels(conn, key):
+    """{group key: display name} for a dimension"""
+    if key == 'seller':
+        return dict(conn.execute("SELECT seller_id, seller_name FROM sellers"))
+    if key == 'category':
+        labels = dict(conn.execute("SELECT category_id, category_description FROM categories"))
+        labels[0] = "(none)"
+        return labels
+    return {}
+
+
+def label(labels, key, group):
+    """Display name for a group, formatting days as YYYY-MM-DD"""
+    if key == 'day':
+        return f"{group // 10000:04d}-{group // 100 % 100:02d}-{group % 100:02d}"
+    return labels.get(group, str(group))
+
+
+def sql_grouped_sales(conn, key, date_from=None, date_to=None, statuses=None):
+    """grouped_sales() computed by SQLite: {group: (revenue, units, orders)}"""
+    condition, params = order_filter(date_from, date_to, statuses)
+    sql = SQL_GROUPED.format(key=GROUP_KEYS[key], order_filter=condition)
+    return {row[0]: tuple(row[1:]) for row in conn.execute(sql, params)}
+
+
+def sql_sales_summary(conn, date_from=None, date_to=None, statuses=None):
+    """sales_summary() computed by SQLite: (revenue, units, orders)"""
+    condition, params = order_filter(date_from, date_to, statuses)
+    sql = SQL_GROUPED.format(key="0", order_filter=condition)
+    row = conn.execute(sql, params).fetchone()
+    return tuple(row[1:]) if row else (0, 0, 0)
+
+
+def sql_status_breakdown(conn, key='line_status', date_from=None, date_to=None, statuses=None):
+    """status_breakdown() computed by SQLite: {status code: (lines, units, value)}"""
+    condition, params = order_filter(date_from, date_to, statuses)
+    sql = SQL_STATUS.format(key=GROUP_KEYS[key], order_filter=condition)
+    return {row[0]: tuple(row[1:]) for row in conn.execute(sql, params)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sales by seller, category or day")
+    parser.add_argument("--by", choices=DIMENSIONS, default="seller")
+    parser.add_argument("--from", dest="date_from", help="first order date to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="order dates before this are included (YYYY-MM-DD)")
+    parser.add_argument("--status", action="append", choices=ORDER_STATUSES,
+                        help="only orders with this status (repeatable)")
+    parser.add_argument("--top", type=int, default=10, help="groups to print")
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        sales = load_sales(conn, args.date_from, args.date_to, args.status)
+        labels = group_labels(conn, args.by)
+    started = time.perf_counter()
+    summary = sales_summary(sales)
+    report = grouped_sales(sales, args.by)
+    breakdown = status_breakdown(sales)
+    elapsed = time.perf_counter() - started
+
+    print(f"{summary['lines']} lines loaded in {sales.load_seconds:.2f}s, "
+          f"reports in {elapsed:.3f}s ({'numpy' if np is not None else 'python'})")
+    print(f"Revenue {summary['revenue']} from {summary['orders']} orders, "
+          f"{summary['units']} units, average order {summary['average_order_value']}")
+    print(f"\n{args.by:<32} {'revenue':>16} {'units':>10} {'orders':>9} {'avg order':>11}")
+    for row in report[:args.top]:
+        print(f"{label(labels, args.by, row['key'])[:32]:<32} {row['revenue']:>16} {row['units']:>10} "
+              f"{row['orders']:>9} {row['average_order_value']:>11}")
+    print(f"\n{'line status':<12} {'lines':>10} {'units':>10} {'value':>16}")
+    for row in breakdown:
+        print(f"{row['status']:<12} {row['lines']:>10} {row['units']:>10} {row['value']:>16}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
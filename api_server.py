@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import sqlite3
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from catalog import get_catalog_cache
+from database import DB_PATH, ConnectionPool, is_busy_error
+from maintenance import SWEEP_INTERVAL_MINUTES, MaintenanceTimer
+from orders import CheckoutConflict
+from reviews import rating_summary, review_page
+from search import search_products
+from shopper_session import ShopperError, ShopperSession, find_shopper
+
+# API settings (override with environment variables)
+API_HOST = os.environ.get('ORINOCO_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('ORINOCO_API_PORT', '8080'))
+API_WORKERS = int(os.environ.get('ORINOCO_API_WORKERS', '4'))
+MAX_CONCURRENT_REQUESTS = 64      # requests being handled at once, across all clients
+MAX_BODY_BYTES = 64 * 1024
+KEEP_ALIVE_SECONDS = 15
+SHUTDOWN_GRACE_SECONDS = 10
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class ApiError(Exception):
+    """An error returned to the client as {"error": message} with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, sqlite3.Row):
+        return dict(zip(value.keys(), value))
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _int_field(data, name):
+    try:
+        value = int(data[name])
+    except KeyError:
+        raise ApiError(400, f"'{name}' is required")
+    except (TypeError, ValueError, OverflowError):
+        raise ApiError(400, f"'{name}' must be a whole number")
+    if not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX:
+        raise ApiError(400, f"'{name}' is out of range")
+    return value
+
+
+def _content_length(headers):
+    value = headers.get('content-length', '')
+    if not value:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise ApiError(400, "Content-Length must be a whole number of bytes")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+    return length
+
+
+def _session(conn, shopper_id):
+    if find_shopper(conn, shopper_id) is None:
+        raise ApiError(404, f"Shopper {shopper_id} not found")
+    return ShopperSession(conn, shopper_id)
+
+
+def _basket_json(basket):
+    return {
+        'basket_id': basket.basket_id,
+        'item_count': basket.item_count,
+        'total': basket.total,
+        'lines': basket.lines,
+    }
+
+# Handlers run on a worker thread with that worker's connection:
+# handler(conn, path ids, query params, json body) -> (status, data)
+def list_categories(conn, ids, query, body):
+    return 200, [{'category_id': c[0], 'description': c[1]} for c in get_catalog_cache().categories()]
+
+
+def list_category_products(conn, ids, query, body):
+    products = get_catalog_cache().category_products(ids[0])
+    return 200, [{'product_id': p[0], 'description': p[1]} for p in products]
+
+
+def list_product_sellers(conn, ids, query, body):
+    sellers = get_catalog_cache().product_sellers(ids[0])
+    return 200, [{'seller_id': s[0], 'description': s[1], 'price': s[2]} for s in sellers]
+
+
+def search(conn, ids, query, body):
+    text = query.get('q', [''])[0]
+    page = _int_field({'page': query.get('page', ['0'])[0]}, 'page')
+    results, has_more = search_products(conn, text, max(page, 0))
+    return 200, {'results': results, 'has_more': has_more}
+
+
+def get_basket(conn, ids, query, body):
+    return 200, _basket_json(_session(conn, ids[0]).basket())
+
+
+def add_basket_item(conn, ids, query, body):
+    # The price always comes from the catalog, never from the client
+    session = _session(conn, ids[0])
+    basket = session.add_item(_int_field(body, 'product_id'), _int_field(body, 'seller_id'),
+                              _int_field(body, 'quantity'))
+    return 201, _basket_json(basket)
+
+
+def change_basket_item(conn, ids, query, body):
+    basket = _session(conn, ids[0]).change_quantity(ids[1], _int_field(body, 'quantity'))
+    return 200, _basket_json(basket)
+
+
+def remove_basket_item(conn, ids, query, body):
+    return 200, _basket_json(_session(conn, ids[0]).remove_item(ids[1]))
+
+
+def checkout(conn, ids, query, body):
+    idempotency_key = body.get('idempotency_key')
+    if idempotency_key is not None and not isinstance(idempotency_key, str):
+        raise ApiError(400, "'idempotency_key' must be a string")
+    order_id = _session(conn, ids[0]).checkout(idempotency_key)
+    return 201, {'order_id': order_id}
+
+
+def _page_args(query):
+    """(after cursor or None, page size) from ?after_date=&after_id=&page_size="""
+    after = None
+    if 'after_date' in query and 'after_id' in query:
+        after = (query['after_date'][0], _int_field({'after_id': query['after_id'][0]}, 'after_id'))
+    page_size = min(max(_int_field({'page_size': query.get('page_size', ['10'])[0]}, 'page_size'), 1), 100)
+    return after, page_size
+
+
+def _next_page(after):
+    return None if after is None else {'after_date': after[0], 'after_id': after[1]}
+
+
+def order_history(conn, ids, query, body):
+    session = _session(conn, ids[0])
+    orders, after = session.order_history(*_page_args(query))
+    return 200, {'orders': orders, 'next': _next_page(after)}
+
+
+def _list_reviews(kind):
+    def list_reviews(conn, ids, query, body):
+        after, page_size = _page_args(query)
+        reviews, after = review_page(conn, kind, ids[0], page_size, after)
+        return 200, {'rating': rating_summary(conn, kind, ids[0]), 'reviews': reviews, 'next': _next_page(after)}
+    return list_reviews
+
+
+ROUTES = [
+    ("GET", r"/categories", list_categories),
+    ("GET", r"/categories/(\d+)/products", list_category_products),
+    ("GET", r"/products/(\d+)/sellers", list_product_sellers),
+    ("GET", r"/products/(\d+)/reviews", _list_reviews('product')),
+    ("GET", r"/sellers/(\d+)/reviews", _list_reviews('seller')),
+    ("GET", r"/search", search),
+    ("GET", r"/shoppers/(\d+)/basket", get_basket),
+    ("POST", r"/shoppers/(\d+)/basket/items", add_basket_item),
+    ("PUT", r"/shoppers/(\d+)/basket/items/(\d+)", change_basket_item),
+    ("DELETE", r"/shoppers/(\d+)/basket/items/(\d+)", remove_basket_item),
+    ("POST", r"/shoppers/(\d+)/checkout", checkout),
+    ("GET", r"/shoppers/(\d+)/orders", order_history),
+]
+ROUTES = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in ROUTES]
+
+
+def find_route(method, path):
+    """Return (handler, path ids) for a request, raising ApiError if there is none"""
+    allowed = False
+    for route_method, pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match:
+            if route_method == method:
+                ids = [int(value) for value in match.groups()]
+                # No row can have an id SQLite cannot even store
+                if any(value > SQLITE_INT_MAX for value in ids):
+                    raise ApiError(404, f"No such resource: {path}")
+                return handler, ids
+            allowed = True
+    if allowed:
+        raise ApiError(405, f"{method} is not allowed on {path}")
+    raise ApiError(404, f"No such resource: {path}")
+
+
+class ApiServer:
+    """HTTP/JSON front end for the shopper operations.
+
+    The event loop only parses requests and writes responses. SQLite work
+    runs on a fixed pool of worker threads, each holding one pooled
+    connection for its lifetime, and a semaphore caps how many requests are
+    being handled at once so a burst queues instead of piling onto SQLite.
+    """
+
+    def __init__(self, host=API_HOST, port=API_PORT, workers=API_WORKERS,
+                 max_concurrent=MAX_CONCURRENT_REQUESTS, sweep_minutes=SWEEP_INTERVAL_MINUTES, path=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.path = path or DB_PATH
+        self.pool = ConnectionPool(self.path, size=workers)
+        # Abandoned baskets are swept on a thread of its own, outside the worker pool
+        self._maintenance = MaintenanceTimer(sweep_minutes * 60, self.path) if sweep_minutes > 0 else None
+        self._local = threading.local()
+        self._executor = None
+        self._server = None
+        self._limit = None
+        self._clients = set()
+        self._idle = set()
+        self._closing = False
+        self._stopped = None
+
+    # Worker threads
+    def _open_worker_connection(self):
+        self._local.conn = self.pool.acquire()
+
+    def _run(self, handler, ids, query, body):
+        conn = self._local.conn
+        try:
+            return handler(conn, ids, query, body)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    # Requests
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = _content_length(headers)
+        body = await reader.readexactly(length) if length else b""
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return method.upper(), target, headers, body, keep_alive
+
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        handler, ids = find_route(method, url.path)
+        query = parse_qs(url.query)
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        if 'idempotency-key' in headers:
+            data.setdefault('idempotency_key', headers['idempotency-key'])
+
+        async with self._limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._run, handler, ids, query, data)
+
+    async def _respond(self, request):
+        method, target, headers, body, keep_alive = request
+        try:
+            return await self._dispatch(method, target, headers, body)
+        except ApiError as e:
+            return e.status, {'error': str(e)}
+        except ShopperError as e:
+            return 400, {'error': str(e)}
+        except CheckoutConflict as e:
+            return 409, {'error': str(e)}
+        except sqlite3.IntegrityError:
+            return 409, {'error': "The request conflicts with data already stored"}
+        except sqlite3.Error as e:
+            if is_busy_error(e):
+                return 503, {'error': "The database is busy, try again"}
+            return 500, {'error': "Database error"}
+        except Exception:
+            # Every request gets an answer; the details go to the server log only
+            print(f"Unhandled error for {method} {target}:", file=sys.stderr)
+            traceback.print_exc()
+            return 500, {'error': "Internal server error"}
+
+    def _write(self, writer, status, data, keep_alive):
+        payload = json.dumps(data, default=_json_default).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + payload)
+
+    async def _handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            keep_alive = True
+            while keep_alive and not self._closing:
+                self._idle.add(writer)
+                try:
+                    request = await self._read_request(reader)
+                except ApiError as e:
+                    self._write(writer, e.status, {'error': str(e)}, False)
+                    break
+                finally:
+                    self._idle.discard(writer)
+                if request is None:
+                    break
+                status, data = await self._respond(request)
+                keep_alive = request[4] and not self._closing
+                self._write(writer, status, data, keep_alive)
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    # Lifecycle
+    async def start(self):
+        """Open the worker pool and start listening"""
+        self._limit = asyncio.Semaphore(self.max_concurrent)
+        self._stopped = asyncio.Event()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="api-db",
+                                            initializer=self._open_worker_connection)
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self._maintenance is not None:
+            self._maintenance.start()
+
+    def request_shutdown(self):
+        """Begin a graceful shutdown (safe to call from a signal handler)"""
+        self._stopped.set()
+
+    async def shutdown(self):
+        """Stop accepting, let in-flight requests finish, then close the database"""
+        self._closing = True
+        self._server.close()
+        await self._server.wait_closed()
+        # Connections waiting for their next request are simply closed
+        for writer in list(self._idle):
+            writer.close()
+        if self._clients:
+            done, pending = await asyncio.wait(list(self._clients), timeout=SHUTDOWN_GRACE_SECONDS)
+            for task in pending:
+                task.cancel()
+        self._executor.shutdown(wait=True)
+        if self._maintenance is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._maintenance.stop)
+        self.pool.close()
+
+    async def serve(self):
+        """Serve until request_shutdown() is called, then shut down"""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.request_shutdown)
+            except (NotImplementedError, RuntimeError):
+                pass
+        print(f"Listening on http://{self.host}:{self.port}", flush=True)
+        await self._stopped.wait()
+        await self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON API for the shopping app")
+    parser.add_argument("--host", default=API_HOST, help="address to bind (default localhost only)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="port to listen on (0 picks a free one)")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="database worker threads")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="requests handled at once before new ones wait")
+    parser.add_argument("--sweep-every", type=float, default=SWEEP_INTERVAL_MINUTES, metavar="MINUTES",
+                        help="delete abandoned baskets this often (0 turns the sweeper off)")
+    args = parser.parse_args()
+
+    server = ApiServer(args.host, args.port, max(1, args.workers), max(1, args.max_concurrent),
+                       max(0.0, args.sweep_every))
+    asyncio.run(server.serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
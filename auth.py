@@ -0,0 +1,373 @@
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import string
+import sys
+import threading
+import time
+
+from database import get_pool, retry_on_busy
+
+# Shopper accounts. Emails are matched on a normalized key (trimmed,
+# ASCII-lowercased, as SQLite's lower() would) held in shoppers.email_key
+# under a unique index, so a login is one index lookup however many
+# shoppers there are. Passwords are stored as salted PBKDF2-SHA256 hashes
+# that carry their own cost, so HASH_ITERATIONS can be raised at any time:
+# older hashes still verify and are upgraded at the next login.
+#
+# Shoppers who existed before logins (or who forget their password) set one
+# with a one-time setup code: an admin issues it with `python auth.py
+# <shopper_id>` and the shopper redeems it with their email address.
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = int(os.environ.get('ORINOCO_HASH_ITERATIONS', '310000'))
+SALT_BYTES = 16
+MIN_PASSWORD_LENGTH = 8
+SESSION_IDLE_SECONDS = int(os.environ.get('ORINOCO_SESSION_IDLE_SECONDS', '1800'))
+SETUP_CODE_HOURS = int(os.environ.get('ORINOCO_SETUP_CODE_HOURS', '72'))
+SETUP_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"     # no 0/O or 1/I to misread
+SETUP_CODE_LENGTH = 12                                       # 60 random bits
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+SHOPPER_BY_EMAIL_SQL = """
+    SELECT shopper_id, shopper_first_name, shopper_surname, shopper_email_address,
+           shopper_account_ref, date_joined, password_hash
+    FROM shoppers
+    WHERE email_key = ?
+"""
+
+SETUP_CODE_BY_EMAIL_SQL = """
+    SELECT sh.shopper_id, c.code_hash
+    FROM shoppers sh
+    JOIN password_setup_codes c ON c.shopper_id = sh.shopper_id
+    WHERE sh.email_key = ? AND c.expires_date_time > datetime('now')
+"""
+
+REGISTER_SQL = """
+    INSERT INTO shoppers (shopper_account_ref, shopper_first_name, shopper_surname,
+                          shopper_email_address, email_key, password_hash, date_of_birth, gender, date_joined)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, date('now'))
+"""
+
+
+class AuthError(Exception):
+    """A registration or login that cannot go ahead; the message is safe to show the user"""
+
+
+def normalize_email(email):
+    """The key emails are matched on: trimmed and ASCII-lowercased"""
+    return (email or "").strip().translate(_ASCII_LOWER)
+
+
+def hash_password(password, iterations=None):
+    """Return 'pbkdf2_sha256$iterations$salt$hash' for a password, with a new random salt"""
+    iterations = iterations or HASH_ITERATIONS
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash in constant time"""
+    try:
+        algorithm, iterations, salt, expected = stored.split("$")
+        if algorithm != HASH_ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    except (AttributeError, ValueError):
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def needs_rehash(stored):
+    """True if a hash was made with fewer iterations than HASH_ITERATIONS"""
+    try:
+        return int(stored.split("$")[1]) < HASH_ITERATIONS
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+# Verified against when the email is unknown, so a miss takes as long as a wrong password
+_DUMMY_HASH = None
+
+
+def _dummy_hash():
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None or needs_rehash(_DUMMY_HASH):
+        _DUMMY_HASH = hash_password(secrets.token_hex(16))
+    return _DUMMY_HASH
+
+
+def _insert_shopper(conn, params):
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(REGISTER_SQL, params)
+        conn.commit()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        if "email_key" in str(e):
+            raise AuthError("An account with this email address already exists. If you have not set a "
+                            "password for it yet, ask us for a password setup code.")
+        raise
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _update_password_hash(conn, shopper_id, password_hash):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE shoppers SET password_hash = ? WHERE shopper_id = ?", (password_hash, shopper_id))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _check_email(email):
+    """Return (email as entered, trimmed; its key), or raise AuthError if it is not an email address"""
+    email = (email or "").strip()
+    key = normalize_email(email)
+    local, _, domain = key.partition("@")
+    if not local or "." not in domain or any(char.isspace() for char in key):
+        raise AuthError("Please enter a valid email address")
+    return email, key
+
+
+def _check_password(password):
+    if len(password or "") < MIN_PASSWORD_LENGTH:
+        raise AuthError(f"Passwords must be at least {MIN_PASSWORD_LENGTH} characters")
+
+
+def register_shopper(conn, first_name, surname, email, password, date_of_birth=None, gender=None):
+    """Create a shopper account and return its shopper_id"""
+    first_name, surname = (value.strip() for value in (first_name or "", surname or ""))
+    if not first_name or not surname:
+        raise AuthError("Please enter your first name and surname")
+    email, key = _check_email(email)
+    _check_password(password)
+
+    # Hash before taking the write lock; it is deliberately slow
+    password_hash = hash_password(password)
+    account_ref = f"WEB{secrets.token_hex(4).upper()}"
+    return retry_on_busy(_insert_shopper, conn, (account_ref, first_name, surname, email, key, password_hash,
+                                                  date_of_birth or None, gender or None))
+
+
+def authenticate(conn, email, password):
+    """Return the shopper's details for a correct email and password, else raise AuthError"""
+    row = conn.execute(SHOPPER_BY_EMAIL_SQL, (normalize_email(email),)).fetchone()
+    if row is None or row['password_hash'] is None:
+        verify_password(password or "", _dummy_hash())
+        raise AuthError("Incorrect email or password")
+    if not verify_password(password or "", row['password_hash']):
+        raise AuthError("Incorrect email or password")
+    if needs_rehash(row['password_hash']):
+        retry_on_busy(_update_password_hash, conn, row['shopper_id'], hash_password(password))
+    return {
+        'shopper_id': row['shopper_id'],
+        'first_name': row['shopper_first_name'],
+        'surname': row['shopper_surname'],
+        'email': row['shopper_email_address'],
+        'account_ref': row['shopper_account_ref'],
+        'date_joined': row['date_joined'],
+    }
+
+
+# Password setup codes
+def _code_hash(code):
+    # Codes are long and random and expire, so a fast hash is enough
+    code = "".join((code or "").split()).replace("-", "").upper()
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+def _store_setup_code(conn, shopper_id, code_hash, email, key):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if email is not None:
+            conn.execute("UPDATE shoppers SET shopper_email_address = ?, email_key = ? WHERE shopper_id = ?",
+                         (email, key, shopper_id))
+        conn.execute("""
+            INSERT OR REPLACE INTO password_setup_codes (shopper_id, code_hash, expires_date_time)
+            VALUES (?, ?, datetime('now', ?))
+        """, (shopper_id, code_hash, f"+{SETUP_CODE_HOURS} hours"))
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        if "email_key" in str(e):
+            raise AuthError("Another account already uses this email address")
+        raise
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def issue_setup_code(conn, shopper_id, email=None):
+    """Give a shopper a one-time code to set their password with; return the code.
+
+    A new code replaces any earlier one. Shoppers whose email address is
+    shared with an older account have no login key; pass email to give them
+    an address of their own.
+    """
+    row = conn.execute("SELECT email_key FROM shoppers WHERE shopper_id = ?", (shopper_id,)).fetchone()
+    if row is None:
+        raise AuthError(f"Shopper {shopper_id} does not exist")
+    key = None
+    if email is not None:
+        email, key = _check_email(email)
+    elif row['email_key'] is None:
+        raise AuthError(f"Shopper {shopper_id} shares an email address with another account; "
+                        f"give them an address of their own")
+    code = "".join(secrets.choice(SETUP_CODE_ALPHABET) for _ in range(SETUP_CODE_LENGTH))
+    retry_on_busy(_store_setup_code, conn, shopper_id, _code_hash(code), email, key)
+    return "-".join(code[i:i + 4] for i in range(0, SETUP_CODE_LENGTH, 4))
+
+
+def _redeem_setup_code(conn, shopper_id, code_hash, password_hash):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Deleting the code first means two redemptions cannot both succeed
+        deleted = conn.execute("DELETE FROM password_setup_codes WHERE shopper_id = ? AND code_hash = ?",
+                               (shopper_id, code_hash)).rowcount
+        if not deleted:
+            conn.rollback()
+            raise AuthError("That setup code is not valid for this email address, or it has expired")
+        conn.execute("UPDATE shoppers SET password_hash = ? WHERE shopper_id = ?", (password_hash, shopper_id))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def set_password_with_code(conn, email, code, password):
+    """Set a shopper's password with a setup code from issue_setup_code; return the shopper_id"""
+    _check_password(password)
+    row = conn.execute(SETUP_CODE_BY_EMAIL_SQL, (normalize_email(email),)).fetchone()
+    if row is None or not hmac.compare_digest(row['code_hash'], _code_hash(code)):
+        raise AuthError("That setup code is not valid for this email address, or it has expired")
+    retry_on_busy(_redeem_setup_code, conn, row['shopper_id'], row['code_hash'], hash_password(password))
+    return row['shopper_id']
+
+
+class Session:
+    """A logged-in shopper"""
+
+    def __init__(self, token, shopper):
+        self.token = token
+        self.shopper = shopper
+        self.shopper_id = shopper['shopper_id']
+        self.created = self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """In-memory sessions, so a shopper's password is checked once per login, not per action.
+
+    Sessions expire after idle_seconds without use. Nothing is written to the
+    database, so sessions do not survive a restart.
+    """
+
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, shopper):
+        """Start a session for an authenticated shopper and return it"""
+        session = Session(secrets.token_urlsafe(32), shopper)
+        with self._lock:
+            self._purge()
+            self._sessions[session.token] = session
+        return session
+
+    def get(self, token):
+        """Return the live session for a token (and mark it used), or None"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session.last_seen > self.idle_seconds:
+                del self._sessions[token]
+                return None
+            session.last_seen = now
+            return session
+
+    def end(self, token):
+        """Log a session out"""
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def _purge(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for token in [token for token, session in self._sessions.items() if session.last_seen < cutoff]:
+            del self._sessions[token]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Return the process-wide session store, creating it on first use"""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
+
+
+def log_in(conn, email, password, sessions=None):
+    """Authenticate and start a session; return the Session"""
+    shopper = authenticate(conn, email, password)
+    return (sessions or get_session_store()).create(shopper)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Issue password setup codes for shopper accounts")
+    parser.add_argument("shopper_id", type=int, nargs="?", help="shopper to issue a setup code for")
+    parser.add_argument("--email", help="give the shopper this (new) email address as well")
+    parser.add_argument("--list", action="store_true", help="list the shoppers who cannot log in yet")
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        if args.list:
+            for row in conn.execute("""
+                SELECT shopper_id, shopper_email_address, email_key IS NULL AS shared
+                FROM shoppers
+                WHERE password_hash IS NULL
+                ORDER BY shopper_id
+            """):
+                note = "  (email shared with another account: issue with --email)" if row['shared'] else ""
+                print(f"{row['shopper_id']}  {row['shopper_email_address']}{note}")
+            return 0
+        if args.shopper_id is None:
+            parser.error("give a shopper_id, or --list")
+        try:
+            code = issue_setup_code(conn, args.shopper_id, args.email)
+        except AuthError as e:
+            print(e, file=sys.stderr)
+            return 1
+    print(f"Setup code for shopper {args.shopper_id}: {code} (valid for {SETUP_CODE_HOURS} hours)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
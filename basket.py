@@ -0,0 +1,179 @@
+import sqlite3
+import threading
+
+from money import Money
+
+# One round trip for the lines, line totals, item count and grand total
+BASKET_SQL = """
+    SELECT bc.product_id, bc.seller_id, p.product_description,
+           s.seller_name, bc.quantity, bc.price,
+           (bc.quantity * bc.price) as line_total,
+           COUNT(*) OVER () as item_count,
+           SUM(bc.quantity * bc.price) OVER () as grand_total
+    FROM basket_contents bc
+    JOIN products p ON bc.product_id = p.product_id
+    JOIN sellers s ON bc.seller_id = s.seller_id
+    WHERE bc.basket_id = ?
+    ORDER BY p.product_description
+"""
+
+LINE_NAMES_SQL = """
+    SELECT p.product_description, s.seller_name
+    FROM products p, sellers s
+    WHERE p.product_id = ? AND s.seller_id = ?
+"""
+
+
+class Basket:
+    """In-memory view of one basket: its lines plus running totals"""
+
+    def __init__(self, basket_id, lines=(), item_count=0, total=0):
+        self.basket_id = basket_id
+        self.lines = list(lines)
+        self.item_count = item_count
+        self.total = Money(total)
+
+    def find(self, product_id):
+        """Return the line for a product, or None"""
+        for line in self.lines:
+            if line['product_id'] == product_id:
+                return line
+        return None
+
+    def is_empty(self):
+        """Return True if the basket has no lines"""
+        return not self.lines
+
+
+class BasketService:
+    """Basket reads and edits for one shopper session.
+
+    Baskets are loaded with a single query and then kept in memory. Every
+    edit writes through to the database and adjusts the cached lines and
+    totals in place, so viewing the basket again costs no SQL. The cache
+    assumes this session is the only writer of its baskets.
+
+    With autocommit off, edits are left in the open transaction and errors
+    are not rolled back here; the caller commits (or rolls back to a
+    savepoint) itself.
+    """
+
+    def __init__(self, conn, autocommit=True):
+        self.conn = conn
+        self.autocommit = autocommit
+        self._baskets = {}
+        self._lock = threading.Lock()
+
+    def _commit(self):
+        if self.autocommit:
+            self.conn.commit()
+
+    def _rollback(self):
+        if self.autocommit:
+            self.conn.rollback()
+
+    def _load(self, basket_id):
+        rows = self.conn.execute(BASKET_SQL, (basket_id,)).fetchall()
+        lines = [{'product_id': row['product_id'],
+                  'seller_id': row['seller_id'],
+                  'product_description': row['product_description'],
+                  'seller_name': row['seller_name'],
+                  'quantity': row['quantity'],
+                  'price': Money(row['price']),
+                  'line_total': Money(row['line_total'])}
+                 for row in rows]
+        if not rows:
+            return Basket(basket_id)
+        return Basket(basket_id, lines, rows[0]['item_count'], rows[0]['grand_total'])
+
+    def get(self, basket_id):
+        """Return the Basket for basket_id (an empty Basket if basket_id is None)"""
+        if basket_id is None:
+            return Basket(None)
+        with self._lock:
+            basket = self._baskets.get(basket_id)
+            if basket is None:
+                basket = self._baskets[basket_id] = self._load(basket_id)
+            return basket
+
+    def add_item(self, shopper_id, basket_id, product_id, seller_id, quantity, price):
+        """Add a line at price (in pence), creating the basket if needed, and return the basket id"""
+        price = Money(price)
+        cursor = self.conn.cursor()
+        if basket_id is None:
+            cursor.execute("""
+                INSERT INTO shopper_baskets (shopper_id, basket_created_date_time)
+                VALUES (?, datetime('now'))
+            """, (shopper_id,))
+            basket_id = cursor.lastrowid
+            basket = Basket(basket_id)
+        else:
+            # Load before writing so the new line is only counted once
+            basket = self.get(basket_id)
+
+        try:
+            cursor.execute("""
+                INSERT INTO basket_contents (basket_id, product_id, seller_id, quantity, price)
+                VALUES (?, ?, ?, ?, ?)
+            """, (basket_id, product_id, seller_id, quantity, price))
+            names = cursor.execute(LINE_NAMES_SQL, (product_id, seller_id)).fetchone()
+            self._commit()
+        except sqlite3.Error:
+            self._rollback()
+            raise
+
+        with self._lock:
+            line_total = quantity * price
+            basket.lines.append({'product_id': product_id,
+                                 'seller_id': seller_id,
+                                 'product_description': names['product_description'],
+                                 'seller_name': names['seller_name'],
+                                 'quantity': quantity,
+                                 'price': price,
+                                 'line_total': line_total})
+            basket.lines.sort(key=lambda line: line['product_description'])
+            basket.item_count += 1
+            basket.total += line_total
+            self._baskets[basket_id] = basket
+        return basket_id
+
+    def change_quantity(self, basket_id, product_id, quantity):
+        """Set the quantity of a line and update the cached totals"""
+        basket = self.get(basket_id)
+        line = basket.find(product_id)
+        self.conn.execute("""
+            UPDATE basket_contents
+            SET quantity = ?
+            WHERE basket_id = ? AND product_id = ? AND seller_id = ?
+        """, (quantity, basket_id, product_id, line['seller_id']))
+        self._commit()
+
+        with self._lock:
+            line_total = quantity * line['price']
+            basket.total += line_total - line['line_total']
+            line['quantity'] = quantity
+            line['line_total'] = line_total
+        return basket
+
+    def remove_item(self, basket_id, product_id):
+        """Delete a line and update the cached totals"""
+        basket = self.get(basket_id)
+        line = basket.find(product_id)
+        self.conn.execute("""
+            DELETE FROM basket_contents
+            WHERE basket_id = ? AND product_id = ? AND seller_id = ?
+        """, (basket_id, product_id, line['seller_id']))
+        self._commit()
+
+        with self._lock:
+            basket.lines.remove(line)
+            basket.item_count -= 1
+            basket.total -= line['line_total']
+            if not basket.lines:
+                basket.total = Money(0)
+        return basket
+
+    def forget(self, basket_id):
+        """Drop a basket from the cache, e.g. once it has been checked out"""
+        with self._lock:
+            self._baskets.pop(basket_id, None)
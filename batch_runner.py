@@ -0,0 +1,199 @@
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+from database import get_pool
+from money import Money
+from orders import CheckoutConflict
+from shopper_session import ShopperError, ShopperSession
+
+# Replays a JSONL script of shopper operations without any prompts, e.g.
+#   {"op": "add_item", "shopper_id": 10000, "product_id": 3000000, "seller_id": 200000, "quantity": 2}
+#   (add_item may also give "price" in pounds, e.g. "12.99"; it defaults to the seller's price)
+#   {"op": "change_quantity", "shopper_id": 10000, "product_id": 3000000, "quantity": 3}
+#   {"op": "remove_item", "shopper_id": 10000, "product_id": 3000000}
+#   {"op": "view_basket", "shopper_id": 10000}
+#   {"op": "checkout", "shopper_id": 10000, "idempotency_key": "replay-42"}
+#   {"op": "history", "shopper_id": 10000, "pages": 2}
+
+DEFAULT_COMMIT_BATCH = 100
+MAX_REPORTED_ERRORS = 20
+INVALID_LINE = "invalid"        # counted under this name: lines that are not an operation object
+
+# What a bad operation can raise; anything else is a bug and stops the replay
+OP_ERRORS = (ShopperError, CheckoutConflict, sqlite3.Error, KeyError, TypeError, ValueError, ArithmeticError)
+
+
+def _history(session, pages=1, page_size=10):
+    after = None
+    for _ in range(pages):
+        orders, after = session.order_history(after, page_size)
+        if after is None:
+            break
+
+
+OPERATIONS = {
+    'add_item': lambda s, op: s.add_item(op['product_id'], op['seller_id'], op['quantity'],
+                                         Money.from_pounds(op['price']) if 'price' in op else None),
+    'change_quantity': lambda s, op: s.change_quantity(op['product_id'], op['quantity']),
+    'remove_item': lambda s, op: s.remove_item(op['product_id']),
+    'view_basket': lambda s, op: s.basket(),
+    'checkout': lambda s, op: s.checkout(op.get('idempotency_key')),
+    'history': lambda s, op: _history(s, op.get('pages', 1), op.get('page_size', 10)),
+}
+
+
+class BatchReport:
+    """Counts and timings from a replay"""
+
+    def __init__(self):
+        self.ops = Counter()
+        self.errors = Counter()
+        self.error_samples = []
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        return sum(self.ops.values())
+
+    def record_error(self, line_no, op_name, error):
+        self.errors[op_name] += 1
+        if len(self.error_samples) < MAX_REPORTED_ERRORS:
+            self.error_samples.append((line_no, op_name, f"{type(error).__name__}: {error}"))
+
+    def as_dict(self):
+        return {
+            'operations': self.total,
+            'errors': sum(self.errors.values()),
+            'seconds': self.elapsed,
+            'ops_per_second': self.total / self.elapsed if self.elapsed else 0.0,
+            'by_operation': dict(self.ops),
+            'errors_by_operation': dict(self.errors),
+            'error_samples': self.error_samples,
+        }
+
+
+def read_script(lines):
+    """Yield (line number, operation) from JSONL text, skipping blanks and # comments.
+
+    A line that is not valid JSON yields its ValueError in place of the
+    operation, so run_script reports it and carries on.
+    """
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            op = json.loads(line)
+        except ValueError as e:
+            op = e
+        yield line_no, op
+
+
+def _op_name(op):
+    if isinstance(op, dict) and isinstance(op.get('op'), str):
+        return op['op']
+    return INVALID_LINE
+
+
+def run_script(conn, operations, commit_batch=DEFAULT_COMMIT_BATCH):
+    """Run operations against conn, committing every commit_batch basket edits.
+
+    Each operation runs inside a savepoint, so a failing operation is undone
+    on its own without losing the rest of the uncommitted batch. Checkout
+    commits whatever is pending before placing the order.
+    """
+    report = BatchReport()
+    sessions = {}
+    pending = 0
+    started = time.perf_counter()
+
+    for line_no, op in operations:
+        op_name = _op_name(op)
+        report.ops[op_name] += 1
+        if not isinstance(op, dict):
+            error = op if isinstance(op, ValueError) else ValueError("Each line must be a JSON object")
+            report.record_error(line_no, op_name, error)
+            continue
+        handler = OPERATIONS.get(op_name)
+        if handler is None:
+            report.record_error(line_no, op_name, ValueError(f"Unknown operation {op.get('op')!r}"))
+            continue
+        try:
+            shopper_id = op['shopper_id']
+            session = sessions.get(shopper_id)
+            if session is None:
+                session = sessions[shopper_id] = ShopperSession(conn, shopper_id, autocommit=False)
+        except (KeyError, TypeError) as e:
+            report.record_error(line_no, op_name, e)
+            continue
+
+        if op_name == 'checkout':
+            # place_order commits the pending batch and runs its own transaction
+            try:
+                handler(session, op)
+            except OP_ERRORS as e:
+                report.record_error(line_no, op_name, e)
+            pending = 0
+            continue
+
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT batch_op")
+        try:
+            handler(session, op)
+            conn.execute("RELEASE batch_op")
+        except OP_ERRORS as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK TO batch_op")
+                conn.execute("RELEASE batch_op")
+            # The cached basket may no longer match what is in the database
+            session.baskets.forget(session.basket_id)
+            report.record_error(line_no, op_name, e)
+            continue
+
+        pending += 1
+        if pending >= commit_batch and conn.in_transaction:
+            conn.commit()
+            pending = 0
+
+    if conn.in_transaction:
+        conn.commit()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL script of shopper operations")
+    parser.add_argument("script", help="JSONL file of operations, or - for stdin")
+    parser.add_argument("--commit-batch", type=int, default=DEFAULT_COMMIT_BATCH,
+                        help="basket edits per commit (checkout always commits)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    script = sys.stdin if args.script == "-" else open(args.script, encoding="utf-8")
+    try:
+        with get_pool().connection() as conn:
+            report = run_script(conn, read_script(script), max(1, args.commit_batch))
+    finally:
+        if script is not sys.stdin:
+            script.close()
+
+    summary = report.as_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['operations']} operations in {summary['seconds']:.2f}s "
+              f"({summary['ops_per_second']:.0f} ops/s), {summary['errors']} errors")
+        for op_name, count in sorted(report.ops.items(), key=lambda item: str(item[0])):
+            print(f"  {op_name}: {count} ({report.errors[op_name]} errors)")
+        for line_no, op_name, message in report.error_samples:
+            print(f"  line {line_no} ({op_name}): {message}")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import json
+import sys
+import time
+
+from analytics import (DIMENSIONS, LINE_STATUSES, UNKNOWN_STATUS, grouped_sales, load_sales,
+                       sales_summary, sql_grouped_sales, sql_sales_summary, sql_status_breakdown,
+                       status_breakdown)
+from database import DB_PATH, ConnectionPool
+from order_export import ORDER_STATUSES
+from valuation import np
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def reports(conn, filters):
+    """[(report name, SQL function, columnar function, columnar result -> SQL's shape)]"""
+    status_names = {'line_status': LINE_STATUSES + (UNKNOWN_STATUS,),
+                    'order_status': ORDER_STATUSES + (UNKNOWN_STATUS,)}
+    result = [("summary",
+               lambda: sql_sales_summary(conn, *filters),
+               sales_summary,
+               lambda summary: (summary['revenue'], summary['units'], summary['orders']))]
+    for key in DIMENSIONS:
+        result.append((f"by {key}",
+                       lambda key=key: sql_grouped_sales(conn, key, *filters),
+                       lambda sales, key=key: grouped_sales(sales, key),
+                       lambda rows: {row['key']: (row['revenue'], row['units'], row['orders'])
+                                     for row in rows}))
+    for key, names in status_names.items():
+        result.append((key,
+                       lambda key=key: sql_status_breakdown(conn, key, *filters),
+                       lambda sales, key=key: status_breakdown(sales, key),
+                       lambda rows, names=names: {names.index(row['status']): (row['lines'], row['units'],
+                                                                               row['value'])
+                                                  for row in rows}))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar sales reports against the same reports in SQL")
+    parser.add_argument("--db", default=DB_PATH,
+                        help="database to read (see benchmarks.datagen --lines); it is not written to")
+    parser.add_argument("--from", dest="date_from", help="first order date to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="order dates before this are included (YYYY-MM-DD)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    filters = (args.date_from, args.date_to)
+    pool = ConnectionPool(args.db, size=1)
+    with pool.connection() as conn:
+        sales, load_seconds = timed(load_sales, conn, *filters)
+        results = {}
+        for name, sql_report, columnar_report, as_sql in reports(conn, filters):
+            expected, sql_seconds = timed(sql_report)
+            actual, columnar_seconds = timed(columnar_report, sales)
+            results[name] = {'sql_s': sql_seconds, 'columnar_s': columnar_seconds,
+                             'matches': as_sql(actual) == expected}
+    pool.close()
+
+    engine = "numpy" if np is not None else "python"
+    print(f"{len(sales)} order lines loaded in {load_seconds:.2f}s; reports computed with {engine}")
+    print(f"{'report':<14} {'sql s':>9} {'columnar s':>11} {'speedup':>8}  same result")
+    for name, result in results.items():
+        speedup = result['sql_s'] / result['columnar_s'] if result['columnar_s'] else float('inf')
+        print(f"{name:<14} {result['sql_s']:>9.2f} {result['columnar_s']:>11.3f} {speedup:>7.1f}x  "
+              f"{'yes' if result['matches'] else 'NO'}")
+    sql_total = sum(result['sql_s'] for result in results.values())
+    columnar_total = sum(result['columnar_s'] for result in results.values())
+    print(f"{'all reports':<14} {sql_total:>9.2f} {columnar_total:>11.3f}  "
+          f"(columnar including the load: {load_seconds + columnar_total:.2f}s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'db': args.db, 'lines': len(sales), 'engine': engine, 'load_s': load_seconds,
+                       'results': results}, f, indent=2)
+    return 0 if all(result['matches'] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_checkout import copy_database
+from benchmarks.bench_operations import summarize
+from catalog import CatalogCache
+from database import DB_PATH, ConnectionPool, connect
+from shopper_session import ShopperSession
+
+# One shopper visit: browse a category, add two items, look at the basket and history, check out
+REQUESTS_PER_VISIT = 9
+
+
+def load_offers(conn):
+    """Return (shoppers, [(category_id, product_id, seller_id)]) to drive the visits"""
+    shoppers = [row[0] for row in conn.execute("SELECT shopper_id FROM shoppers LIMIT 10000")]
+    offers = [tuple(row) for row in conn.execute("""
+        SELECT p.category_id, ps.product_id, ps.seller_id
+        FROM product_sellers ps
+        JOIN products p ON p.product_id = ps.product_id
+        LIMIT 10000
+    """)]
+    return shoppers, offers
+
+
+def pick_visit(rng, offers):
+    """Two offers for different products"""
+    first = rng.choice(offers)
+    second = rng.choice([offer for offer in offers[:200] if offer[1] != first[1]] or [first])
+    return first, second
+
+
+def run_cli_path(db_path, shoppers, offers, visits, seed):
+    """The CLI's path: one shopper at a time through ShopperSession on one connection"""
+    rng = random.Random(seed)
+    pool = ConnectionPool(db_path, size=1)
+    catalog = CatalogCache(connect(db_path))
+    started = time.perf_counter()
+    with pool.connection() as conn:
+        for _ in range(visits):
+            session = ShopperSession(conn, rng.choice(shoppers))
+            first, second = pick_visit(rng, offers)
+            catalog.categories()
+            catalog.category_products(first[0])
+            for category_id, product_id, seller_id in (first, second):
+                sellers = catalog.product_sellers(product_id)
+                price = next(seller[2] for seller in sellers if seller[0] == seller_id)
+                session.add_item(product_id, seller_id, 1, price)
+            session.basket()
+            session.order_history()
+            session.checkout()
+    elapsed = time.perf_counter() - started
+    catalog.close()
+    pool.close()
+    # Same calls per visit as the API clients make, so the rates compare directly
+    return visits * REQUESTS_PER_VISIT / elapsed
+
+
+class Client:
+    """Minimal keep-alive HTTP/1.1 client for the benchmark"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        payload = await self.reader.readexactly(length)
+        return status, payload
+
+
+async def api_client(port, shopper_id, offers, visits, seed, latencies, errors):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    client = Client(reader, writer)
+
+    async def call(method, path, data=None):
+        started = time.perf_counter()
+        status, _ = await client.request(method, path, data)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors.append(status)
+
+    for _ in range(visits):
+        first, second = pick_visit(rng, offers)
+        await call("GET", "/categories")
+        await call("GET", f"/categories/{first[0]}/products")
+        for category_id, product_id, seller_id in (first, second):
+            await call("GET", f"/products/{product_id}/sellers")
+            await call("POST", f"/shoppers/{shopper_id}/basket/items",
+                       {'product_id': product_id, 'seller_id': seller_id, 'quantity': 1})
+        await call("GET", f"/shoppers/{shopper_id}/basket")
+        await call("GET", f"/shoppers/{shopper_id}/orders")
+        await call("POST", f"/shoppers/{shopper_id}/checkout")
+    writer.close()
+
+
+async def run_api_path(port, shoppers, offers, clients, visits, seed):
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        api_client(port, shoppers[i % len(shoppers)], offers, visits, seed + i, latencies, errors)
+        for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, summarize(latencies), len(errors)
+
+
+def start_server(db_path, workers):
+    """Start api_server.py on a free port and return (process, port)"""
+    env = dict(os.environ, ORINOCO_DB=db_path)
+    server = subprocess.Popen([sys.executable, "api_server.py", "--port", "0", "--workers", str(workers)],
+                              env=env, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    return server, int(line.rsplit(":", 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the JSON API against the CLI path")
+    parser.add_argument("--db", default=DB_PATH, help="database to copy (see benchmarks.datagen)")
+    parser.add_argument("--clients", default="1,4,16", help="comma separated concurrent API clients")
+    parser.add_argument("--visits", type=int, default=50, help="shopper visits per client")
+    parser.add_argument("--workers", type=int, default=4, help="API database worker threads")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        copy_database(args.db, db_path)
+        pool = ConnectionPool(db_path, size=1)
+        with pool.connection() as conn:
+            shoppers, offers = load_offers(conn)
+        pool.close()
+
+        rate = run_cli_path(db_path, shoppers, offers, args.visits, args.seed)
+        print(f"{'path':<16} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        print(f"{'cli (1 shopper)':<16} {rate:>9.0f} {'-':>8} {'-':>8} {0:>7}")
+
+        server, port = start_server(db_path, args.workers)
+        try:
+            for clients in [int(n) for n in args.clients.split(",")]:
+                rate, stats, errors = asyncio.run(
+                    run_api_path(port, shoppers, offers, clients, args.visits, args.seed))
+                print(f"{f'api x{clients}':<16} {rate:>9.0f} {stats['p50_ms']:>8.2f} "
+                      f"{stats['p99_ms']:>8.2f} {errors:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if len(shoppers) < max(int(n) for n in args.clients.split(",")):
+        print("\nnote: fewer shoppers than clients, so some clients share a basket "
+              "(use a benchmarks.datagen database)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_operations import summarize
+from catalog import CatalogCache
+from catalog_snapshot import CatalogSnapshot, SnapshotCatalog, build_snapshot
+from database import DB_PATH, connect
+
+
+def browse(catalog, categories, products):
+    """Time every lookup a shopper makes while browsing; return {lookup: [seconds]}"""
+    samples = {'categories': [], 'category_products': [], 'product_sellers': []}
+    for category_id, product_id in zip(categories, products):
+        for name, args in (('categories', ()), ('category_products', (category_id,)),
+                           ('product_sellers', (product_id,))):
+            started = time.perf_counter()
+            getattr(catalog, name)(*args)
+            samples[name].append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog lookups from the mmap snapshot against SQL")
+    parser.add_argument("--db", default=DB_PATH, help="database to read (it is not written to)")
+    parser.add_argument("--lookups", type=int, default=2000, help="browse steps to time")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    category_ids = [row[0] for row in conn.execute("SELECT category_id FROM categories")]
+    product_ids = [row[0] for row in conn.execute("SELECT product_id FROM product_sellers")]
+    rng = random.Random(args.seed)
+    categories = [rng.choice(category_ids) for _ in range(args.lookups)]
+    products = [rng.choice(product_ids) for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalog.snapshot")
+        started = time.perf_counter()
+        build_snapshot(conn, path)
+        build_seconds = time.perf_counter() - started
+
+        # Cold start: from nothing to the first answer for a product page
+        started = time.perf_counter()
+        cache = CatalogCache(connect(args.db))
+        cache.product_sellers(products[0])
+        sql_cold = time.perf_counter() - started
+        started = time.perf_counter()
+        snapshot_catalog = SnapshotCatalog(path, connect(args.db))
+        snapshot_catalog.product_sellers(products[0])
+        snapshot_cold = time.perf_counter() - started
+
+        results = {
+            'sql (cache misses)': browse(CatalogCache(connect(args.db), max_entries=1), categories, products),
+            'lru cache': browse(cache, categories, products),
+            'snapshot': browse(snapshot_catalog, categories, products),
+        }
+        snapshot = CatalogSnapshot(path)
+        size = snapshot.size
+        snapshot.close()
+        snapshot_catalog.close()
+        cache.close()
+    conn.close()
+
+    print(f"snapshot: {size / 1024 / 1024:.1f} MiB, built in {build_seconds:.2f}s")
+    print(f"cold start to first product page: sql {sql_cold * 1000:.2f} ms, snapshot {snapshot_cold * 1000:.2f} ms")
+    print(f"{'source':<20} {'lookup':<18} {'mean':>8} {'p50':>8} {'p99':>8}  (ms)")
+    for source, samples in results.items():
+        for name, values in samples.items():
+            stats = summarize(values)
+            print(f"{source:<20} {name:<18} {stats['mean_ms']:>8.3f} {stats['p50_ms']:>8.3f} {stats['p99_ms']:>8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
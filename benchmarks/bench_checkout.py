@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database import DB_PATH, ConnectionPool, connect, retry_on_busy
+from orders import place_order
+
+
+def copy_database(source, target):
+    """Copy a database with the backup API so the source is never written to"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def fill_basket(conn, shopper_id, lines):
+    """Create a basket holding the given (product_id, seller_id, price) lines"""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        INSERT INTO shopper_baskets (shopper_id, basket_created_date_time)
+        VALUES (?, datetime('now'))
+    """, (shopper_id,))
+    basket_id = cursor.lastrowid
+    cursor.executemany("""
+        INSERT INTO basket_contents (basket_id, product_id, seller_id, quantity, price)
+        VALUES (?, ?, ?, 1, ?)
+    """, [(basket_id, product_id, seller_id, price) for product_id, seller_id, price in lines])
+    conn.commit()
+    return basket_id
+
+
+def run(db_path, writers, checkouts, lines_per_basket, seed):
+    """Run checkouts from concurrent writer threads and return checkouts per second"""
+    with ConnectionPool(db_path, size=1).connection() as conn:
+        shoppers = [row[0] for row in conn.execute("SELECT shopper_id FROM shoppers")]
+        offers = [tuple(row) for row in conn.execute(
+            "SELECT product_id, seller_id, price FROM product_sellers")]
+
+    errors = []
+    start_barrier = threading.Barrier(writers + 1)
+
+    def writer(index):
+        rng = random.Random(seed + index)
+        conn = connect(db_path)
+        start_barrier.wait()
+        try:
+            for _ in range(checkouts):
+                # basket_contents is keyed on product, so pick distinct products
+                by_product = {offer[0]: offer for offer in rng.sample(offers, lines_per_basket)}
+                shopper_id = rng.choice(shoppers)
+                basket_id = retry_on_busy(fill_basket, conn, shopper_id, by_product.values())
+                place_order(conn, shopper_id, basket_id, f"bench:{basket_id}")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise errors[0]
+    return writers * checkouts / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure checkouts per second with concurrent writers")
+    parser.add_argument("--db", default=DB_PATH, help="source database (copied, never modified)")
+    parser.add_argument("--writers", default="1,2,4,8", help="comma separated writer counts")
+    parser.add_argument("--checkouts", type=int, default=200, help="checkouts per writer")
+    parser.add_argument("--lines", type=int, default=3, help="lines per basket")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'writers':>8} {'checkouts/s':>12}")
+    for writers in [int(n) for n in args.writers.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            copy_database(args.db, db_path)
+            rate = run(db_path, writers, args.checkouts, args.lines, args.seed)
+        print(f"{writers:>8} {rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
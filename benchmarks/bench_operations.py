@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from basket import BasketService
+from benchmarks.bench_checkout import copy_database
+from catalog import (CATEGORIES_SQL, CATEGORY_PRODUCTS_SQL, PRODUCT_SELLERS_SQL,
+                     CatalogCache)
+from database import DB_PATH, ConnectionPool
+from orders import order_history_page, place_order
+from search import search_products
+
+SEARCH_TERMS = ["sony", "wireless headphones", "camera", "smart watch", "laptop pro", "tv"]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p90_ms': percentile(ordered, 0.90) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+def timed(samples, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def run(conn, iterations, seed):
+    """Call each shopper operation headlessly and return {operation: latency summary}"""
+    rng = random.Random(seed)
+    shoppers = [row[0] for row in conn.execute(
+        "SELECT shopper_id FROM shopper_rollups ORDER BY order_count DESC LIMIT 1000")]
+    shoppers = shoppers or [row[0] for row in conn.execute("SELECT shopper_id FROM shoppers LIMIT 1000")]
+    categories = [row[0] for row in conn.execute("SELECT category_id FROM categories")]
+    products = [row[0] for row in conn.execute(
+        "SELECT product_id FROM product_summary WHERE seller_count > 0 LIMIT 10000")]
+    baskets = [row[0] for row in conn.execute(
+        "SELECT DISTINCT basket_id FROM basket_contents LIMIT ?", (iterations,))]
+
+    samples = {name: [] for name in (
+        "order_history_page", "order_history_next_page", "view_basket", "add_item",
+        "checkout", "catalog_categories", "catalog_products", "catalog_sellers",
+        "catalog_cached", "search")}
+
+    for _ in range(iterations):
+        shopper_id = rng.choice(shoppers)
+        orders, after = timed(samples["order_history_page"], order_history_page, conn, shopper_id)
+        if after is not None:
+            timed(samples["order_history_next_page"], order_history_page, conn, shopper_id, 10, after)
+
+        category_id = rng.choice(categories)
+        product_id = rng.choice(products)
+        timed(samples["catalog_categories"], lambda: conn.execute(CATEGORIES_SQL).fetchall())
+        timed(samples["catalog_products"],
+              lambda: conn.execute(CATEGORY_PRODUCTS_SQL, (category_id,)).fetchall())
+        sellers = timed(samples["catalog_sellers"],
+                        lambda: conn.execute(PRODUCT_SELLERS_SQL, (product_id,)).fetchall())
+        timed(samples["search"], search_products, conn, rng.choice(SEARCH_TERMS))
+
+    cache = CatalogCache(conn)
+    for _ in range(iterations):
+        timed(samples["catalog_cached"], cache.category_products, rng.choice(categories))
+
+    # A fresh service per call so view_basket measures the single query, not the cache
+    for basket_id in baskets:
+        timed(samples["view_basket"], BasketService(conn).get, basket_id)
+
+    service = BasketService(conn)
+    for _ in range(iterations):
+        shopper_id = rng.choice(shoppers)
+        basket_id = None
+        for product_id in rng.sample(products, 3):
+            seller_id, _, price = conn.execute(PRODUCT_SELLERS_SQL, (product_id,)).fetchone()
+            basket_id = timed(samples["add_item"], service.add_item,
+                              shopper_id, basket_id, product_id, seller_id, 1, price)
+        timed(samples["checkout"], place_order, conn, shopper_id, basket_id, f"bench:{basket_id}")
+        service.forget(basket_id)
+
+    return {name: summarize(values) for name, values in samples.items() if values}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-operation latency benchmark")
+    parser.add_argument("--db", default=DB_PATH, help="database to benchmark (see benchmarks.datagen)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--in-place", action="store_true",
+                        help="run against --db directly instead of a copy (checkout writes orders)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if not args.in_place:
+            db_path = os.path.join(tmp, "bench.db")
+            copy_database(args.db, db_path)
+        pool = ConnectionPool(db_path, size=1)
+        with pool.connection() as conn:
+            results = run(conn, args.iterations, args.seed)
+        pool.close()
+
+    print(f"{'operation':<24} {'count':>6} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, stats in results.items():
+        print(f"{name:<24} {stats['count']:>6} {stats['mean_ms']:>8.3f} {stats['p50_ms']:>8.3f} "
+              f"{stats['p90_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['max_ms']:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'db': args.db, 'iterations': args.iterations, 'seed': args.seed,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import sys
+import time
+
+from auth import get_session_store
+from benchmarks.bench_operations import summarize
+
+# Screens a shopper moves between, in the order the harness visits them
+MAIN_VIEWS = ["home", "history", "add_item", "basket"]
+TOP_SCREENS = ["welcome", "login", "register", "admin_login"]
+
+
+def switch(root, manager, name):
+    """Show a screen and wait until Tk has drawn it; return (built, seconds)"""
+    started = time.perf_counter()
+    manager.show(name)
+    root.update()
+    return manager.last_switch[1], time.perf_counter() - started
+
+
+def log_in(app):
+    """Start a session for the first shopper the way a successful login does (no password check)"""
+    app.show_login_screen()
+    with app.db.pool.connection() as conn:
+        row = conn.execute("""
+            SELECT shopper_id, shopper_first_name, shopper_surname, shopper_email_address,
+                   shopper_account_ref, date_joined
+            FROM shoppers ORDER BY shopper_id LIMIT 1
+        """).fetchone()
+    shopper = dict(zip(('shopper_id', 'first_name', 'surname', 'email', 'account_ref', 'date_joined'), row))
+    app.start_session(get_session_store().create(shopper), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time GUI screen switches (run under xvfb-run)")
+    parser.add_argument("--rounds", type=int, default=50, help="times to cycle through every screen")
+    args = parser.parse_args()
+
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"No display ({e}); run as: xvfb-run -a python -m benchmarks.bench_screens", file=sys.stderr)
+        return 1
+
+    from online_shopping_GUI_v2 import OnlineShoppingApp
+    app = OnlineShoppingApp(root)
+    root.update()
+    first = {}
+    again = {}
+
+    def record(label, built, seconds):
+        if built:
+            first[label] = seconds
+        else:
+            again.setdefault(label, []).append(seconds)
+
+    for _ in range(args.rounds):
+        for name in TOP_SCREENS:
+            record(name, *switch(root, app.screens, name))
+    started = time.perf_counter()
+    log_in(app)
+    root.update()
+    # Logging in builds the main screen and its home view
+    record("main", app.screens.last_switch[1], time.perf_counter() - started)
+    for _ in range(args.rounds):
+        for name in MAIN_VIEWS:
+            app.db.cancel("screen")
+            record(name, *switch(root, app.content, name))
+
+    print(f"{'screen':<12} {'first build ms':>15} {'switch mean ms':>15} {'p50 ms':>8} {'p99 ms':>8}")
+    for name in TOP_SCREENS + ["main"] + MAIN_VIEWS:
+        stats = summarize(again.get(name, []))
+        built = f"{first[name] * 1000:.2f}" if name in first else "-"
+        print(f"{name:<12} {built:>15} {stats['mean_ms']:>15.2f} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+    app.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from database import connect, retry_on_busy
+from migrations import migrate
+
+# The shipped schema (Orinoco.db before any migration). Generated databases
+# start from it so every migration replays exactly as it does on a real copy.
+BASELINE_SCHEMA = """
+CREATE TABLE shoppers
+(shopper_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ shopper_account_ref TEXT UNIQUE NOT NULL,
+ shopper_first_name TEXT NOT NULL,
+ shopper_surname TEXT NOT NULL,
+ shopper_email_address TEXT NOT NULL,
+ date_of_birth TEXT,
+ gender TEXT,
+ date_joined TEXT NOT NULL
+);
+
+CREATE TABLE shopper_orders
+(order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ shopper_id INTEGER NOT NULL,
+ order_date TEXT NOT NULL,
+ order_status TEXT NOT NULL,
+ CONSTRAINT shopper_orders_shoppers_fk FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id),
+ CONSTRAINT shopper_orders_order_status_check CHECK (order_status in ('Placed','Incomplete','Complete','Cancelled'))
+);
+
+CREATE TABLE sellers
+(seller_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ seller_account_ref TEXT UNIQUE NOT NULL,
+ seller_name TEXT NOT NULL,
+ seller_address_line1 TEXT NOT NULL,
+ seller_address_line2 TEXT,
+ seller_address_line3 TEXT,
+ seller_county TEXT NOT NULL,
+ seller_post_code TEXT NOT NULL,
+ seller_email_address TEXT NOT NULL
+);
+
+CREATE TABLE categories
+(category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ category_code TEXT UNIQUE NOT NULL,
+ category_description TEXT NOT NULL
+);
+
+CREATE TABLE products
+(product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ category_id INTEGER,
+ product_code TEXT UNIQUE NOT NULL,
+ product_description TEXT NOT NULL,
+ product_manufacturer TEXT NOT NULL,
+ product_model TEXT,
+ product_status TEXT NOT NULL,
+ CONSTRAINT products_categories_fk FOREIGN KEY (category_id) REFERENCES categories(category_id),
+ CONSTRAINT products_product_status_check CHECK (product_status IN ('Available','Temporarily Unavailable','Discontinued'))
+);
+
+CREATE TABLE product_sellers
+(product_id INTEGER NOT NULL,
+ seller_id INTEGER NOT NULL,
+ price REAL NOT NULL,
+ PRIMARY KEY (product_id, seller_id),
+ CONSTRAINT product_sellers_products_fk FOREIGN KEY (product_id) REFERENCES products(product_id),
+ CONSTRAINT product_sellers_sellers_fk FOREIGN KEY (seller_id) REFERENCES sellers(seller_id)
+);
+
+CREATE TABLE ordered_products
+(order_id INTEGER,
+ product_id INTEGER,
+ seller_id INTEGER NOT NULL,
+ quantity INTEGER NOT NULL,
+ price REAL NOT NULL,
+ ordered_product_status TEXT,
+ PRIMARY KEY (order_id, product_id),
+ CONSTRAINT ordered_products_shopper_orders_fk FOREIGN KEY (order_id) REFERENCES shopper_orders(order_id),
+ CONSTRAINT ordered_products_product_sellers_fk FOREIGN KEY (seller_id,product_id) REFERENCES product_sellers(seller_id,product_id),
+ CONSTRAINT ordered_products_ordered_product_status_check CHECK (ordered_product_status in ('Placed','Dispatched','Delivered','Cancelled'))
+);
+
+CREATE TABLE shopper_baskets
+(basket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+ shopper_id INTEGER NOT NULL,
+ basket_created_date_time TEXT NOT NULL,
+ CONSTRAINT shopper_baskets_shoppers_fk FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id)
+);
+
+CREATE TABLE basket_contents
+(basket_id INTEGER,
+ product_id INTEGER,
+ seller_id INTEGER NOT NULL,
+ quantity INTEGER NOT NULL,
+ price REAL NOT NULL,
+ PRIMARY KEY (basket_id, product_id),
+ CONSTRAINT basket_contents_shopper_baskets_fk FOREIGN KEY (basket_id) REFERENCES shopper_baskets(basket_id),
+ CONSTRAINT basket_contents_product_sellers_fk FOREIGN KEY (seller_id,product_id) REFERENCES product_sellers(seller_id,product_id)
+);
+
+CREATE TABLE SellerReviews (
+    ReviewID INTEGER PRIMARY KEY,
+    ShopperID INTEGER NOT NULL,
+    SellerID INTEGER NOT NULL,
+    Rating TEXT CHECK(Rating IN ('*', '**', '***', '****', '*****')) NOT NULL,
+    Comment TEXT,
+    ReviewDateTime DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (ShopperID) REFERENCES Shoppers(ShopperID),
+    FOREIGN KEY (SellerID) REFERENCES Sellers(SellerID)
+);
+
+CREATE TABLE product_reviews (
+    review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    shopper_id INTEGER NOT NULL,
+    rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+    comment TEXT NOT NULL CHECK (LENGTH(comment) > 0),
+    review_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(product_id),
+    FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id),
+    UNIQUE (product_id, shopper_id, review_date)
+);
+
+CREATE INDEX idx_product_reviews_product_id ON product_reviews(product_id);
+
+CREATE INDEX idx_product_reviews_shopper_id ON product_reviews(shopper_id);
+
+CREATE TABLE seller_reviews (
+    review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seller_id INTEGER NOT NULL,
+    shopper_id INTEGER NOT NULL,
+    rating TEXT NOT NULL CHECK (rating IN ('1', '2', '3', '4', '5')),
+    comment TEXT NOT NULL CHECK (LENGTH(TRIM(comment)) > 0),
+    review_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES sellers(seller_id),
+    FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id),
+    UNIQUE (seller_id, shopper_id, review_date)
+);
+"""
+
+SCALES = {
+    # shoppers, sellers, products, order lines, baskets, reviews
+    "small": dict(shoppers=10_000, sellers=200, products=5_000, lines=500_000, baskets=2_000, reviews=20_000),
+    "medium": dict(shoppers=100_000, sellers=2_000, products=50_000, lines=5_000_000, baskets=20_000, reviews=200_000),
+    "large": dict(shoppers=1_000_000, sellers=10_000, products=200_000, lines=50_000_000, baskets=200_000, reviews=2_000_000),
+}
+
+CATEGORIES = ["Audio and Hifi", "Cameras", "Computers", "Gaming", "Home Appliances",
+              "Mobile Phones", "Televisions", "Tablets", "Wearables", "Smart Home"]
+MANUFACTURERS = ["Sony", "Samsung", "Canon", "Nikon", "Huawei", "Lenovo", "Apple", "LG",
+                 "Panasonic", "Philips", "Bosch", "Dell", "HP", "Asus", "Acer", "JBL"]
+ADJECTIVES = ["Wireless", "Portable", "Digital", "Smart", "Compact", "Pro", "Ultra", "Mini",
+              "Noise Cancelling", "HD", "4K", "Gaming", "Waterproof", "Bluetooth", "Slim"]
+NOUNS = ["Headphones", "Speaker", "Camera", "Laptop", "Monitor", "Phone", "Tablet", "Watch",
+         "Router", "Keyboard", "Mouse", "Television", "Soundbar", "Projector", "Drone"]
+FIRST_NAMES = ["Caroline", "Liam", "Christian", "Tanya", "John", "Amira", "Priya", "Oliver",
+               "Sophie", "Mohammed", "Grace", "Jack", "Chloe", "Harry", "Aisha", "Noah"]
+SURNAMES = ["Bradley", "Charlesworth", "Lovett", "Divine", "Smith", "Khan", "Patel", "Jones",
+            "Taylor", "Brown", "Williams", "Evans", "Wilson", "Thomas", "Roberts", "Walker"]
+COUNTIES = ["Kent", "Surrey", "Essex", "Devon", "Yorkshire", "Lancashire", "Norfolk", "Dorset"]
+COMMENTS = ["Great product, would buy again.", "Arrived quickly and well packed.",
+            "Does what it says.", "Not as described.", "Excellent value for money.",
+            "Seller was slow to respond.", "Five stars, highly recommend."]
+
+FIRST_ORDER_DATE = date(2019, 1, 1)
+ORDER_DAYS = 7 * 365
+CHUNK_SIZE = 50_000
+OFFERS_PER_PRODUCT = 4
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(conn, sql, rows, label):
+    """Insert rows with chunked executemany, one transaction per chunk"""
+    started = time.perf_counter()
+    count = 0
+    for chunk in chunks(rows):
+        conn.execute("BEGIN")
+        conn.executemany(sql, chunk)
+        conn.commit()
+        count += len(chunk)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<18} {count:>12,} rows  {count / max(elapsed, 1e-9):>12,.0f} rows/s")
+    return count
+
+
+def create_schema(conn):
+    """Create the shipped tables and their own indexes, at schema version 0"""
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("PRAGMA user_version = 0")
+
+
+# Deterministic helpers so related tables agree without keeping lookups in memory
+def offer_seller(product_id, offer, sellers):
+    return (product_id * 31 + offer) % sellers + 1
+
+
+def offer_price(product_id, offer):
+    base = 5 + (product_id * 2654435761 % 150_000) / 100
+    return round(base * (1 + 0.03 * offer), 2)
+
+
+def generate(conn, seed, shoppers, sellers, products, lines, baskets, reviews):
+    """Fill an empty database built from the shipped schema"""
+    rng = random.Random(seed)
+    offers = min(OFFERS_PER_PRODUCT, sellers)
+    today = date.today()
+
+    bulk_insert(conn, "INSERT INTO categories VALUES (?, ?, ?)",
+                ((i, f"CAT{i:03d}", name) for i, name in enumerate(CATEGORIES, 1)), "categories")
+
+    bulk_insert(conn, "INSERT INTO sellers VALUES (?, ?, ?, ?, NULL, NULL, ?, ?, ?)",
+                ((i, f"SE{i:08d}", f"{rng.choice(SURNAMES)} {rng.choice(NOUNS)} Ltd {i}",
+                  f"{rng.randint(1, 300)} High Street", rng.choice(COUNTIES),
+                  f"AB{rng.randint(1, 99)} {rng.randint(1, 9)}CD", f"sales{i}@seller.example")
+                 for i in range(1, sellers + 1)), "sellers")
+
+    bulk_insert(conn, "INSERT INTO shoppers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((i, f"SH{i:08d}", rng.choice(FIRST_NAMES), rng.choice(SURNAMES),
+                  f"shopper{i}@example.com",
+                  (date(1940, 1, 1) + timedelta(days=rng.randrange(60 * 365))).isoformat(),
+                  rng.choice("MF"),
+                  (FIRST_ORDER_DATE + timedelta(days=rng.randrange(ORDER_DAYS))).isoformat())
+                 for i in range(1, shoppers + 1)), "shoppers")
+
+    def product_rows():
+        for i in range(1, products + 1):
+            status = rng.choices(("Available", "Temporarily Unavailable", "Discontinued"), (90, 5, 5))[0]
+            yield (i, rng.randint(1, len(CATEGORIES)), f"P{i:08d}",
+                   f"{rng.choice(MANUFACTURERS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                   rng.choice(MANUFACTURERS), f"M{rng.randint(100, 9999)}", status)
+    bulk_insert(conn, "INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", product_rows(), "products")
+
+    bulk_insert(conn, "INSERT INTO product_sellers VALUES (?, ?, ?)",
+                ((p, offer_seller(p, k, sellers), offer_price(p, k))
+                 for p in range(1, products + 1) for k in range(offers)), "product_sellers")
+
+    def order_lines():
+        """Yield (order row, [line rows]) until the line budget is spent"""
+        order_id = 0
+        remaining = lines
+        while remaining > 0:
+            order_id += 1
+            count = min(remaining, rng.randint(1, 5))
+            remaining -= count
+            order_date = FIRST_ORDER_DATE + timedelta(days=rng.randrange(ORDER_DAYS))
+            recent = (today - order_date).days < 30
+            status = "Placed" if recent else rng.choices(("Complete", "Cancelled"), (95, 5))[0]
+            order = (order_id, rng.randint(1, shoppers), order_date.isoformat(), status)
+            line_rows = []
+            for product_id in rng.sample(range(1, products + 1), count):
+                offer = rng.randrange(offers)
+                line_status = "Placed" if recent else ("Cancelled" if status == "Cancelled" else "Delivered")
+                line_rows.append((order_id, product_id, offer_seller(product_id, offer, sellers),
+                                  rng.randint(1, 4), offer_price(product_id, offer), line_status))
+            yield order, line_rows
+
+    # Orders and lines are generated together, so stream them in step
+    started = time.perf_counter()
+    order_count = line_count = 0
+    for chunk in chunks(order_lines(), CHUNK_SIZE // 3):
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO shopper_orders VALUES (?, ?, ?, ?)", [order for order, _ in chunk])
+        conn.executemany("INSERT INTO ordered_products VALUES (?, ?, ?, ?, ?, ?)",
+                         [line for _, line_rows in chunk for line in line_rows])
+        conn.commit()
+        order_count += len(chunk)
+        line_count += sum(len(line_rows) for _, line_rows in chunk)
+    elapsed = time.perf_counter() - started
+    print(f"  {'orders':<18} {order_count:>12,} rows")
+    print(f"  {'ordered_products':<18} {line_count:>12,} rows  {line_count / max(elapsed, 1e-9):>12,.0f} rows/s")
+
+    now = datetime.now().replace(microsecond=0)
+    bulk_insert(conn, "INSERT INTO shopper_baskets VALUES (?, ?, ?)",
+                ((i, rng.randint(1, shoppers),
+                  (now - timedelta(minutes=rng.randrange(60 * 24 * 60))).isoformat(" "))
+                 for i in range(1, baskets + 1)), "shopper_baskets")
+
+    def basket_rows():
+        for basket_id in range(1, baskets + 1):
+            for product_id in rng.sample(range(1, products + 1), rng.randint(1, 4)):
+                offer = rng.randrange(offers)
+                yield (basket_id, product_id, offer_seller(product_id, offer, sellers),
+                       rng.randint(1, 3), offer_price(product_id, offer))
+    bulk_insert(conn, "INSERT INTO basket_contents VALUES (?, ?, ?, ?, ?)", basket_rows(), "basket_contents")
+
+    # review_date is offset by the review number so the UNIQUE constraints always hold
+    first_review = datetime(2019, 1, 1)
+    bulk_insert(conn, "INSERT INTO product_reviews (product_id, shopper_id, rating, comment, review_date) "
+                      "VALUES (?, ?, ?, ?, ?)",
+                ((rng.randint(1, products), rng.randint(1, shoppers), rng.randint(1, 5),
+                  rng.choice(COMMENTS), (first_review + timedelta(seconds=i)).isoformat(" "))
+                 for i in range(reviews)), "product_reviews")
+    bulk_insert(conn, "INSERT INTO seller_reviews (seller_id, shopper_id, rating, comment, review_date) "
+                      "VALUES (?, ?, ?, ?, ?)",
+                ((rng.randint(1, sellers), rng.randint(1, shoppers), str(rng.randint(1, 5)),
+                  rng.choice(COMMENTS), (first_review + timedelta(seconds=i)).isoformat(" "))
+                 for i in range(reviews // 4)), "seller_reviews")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic Orinoco database")
+    parser.add_argument("target", help="database file to create (must not exist)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"override the number of {name}")
+    args = parser.parse_args()
+
+    if os.path.exists(args.target):
+        parser.error(f"{args.target} already exists")
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+
+    print(f"Generating {args.target} (seed {args.seed}): "
+          + ", ".join(f"{name}={value:,}" for name, value in sizes.items()))
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(args.target, isolation_level=None)
+    # Nothing to protect while loading a throwaway file, so skip the journal and fsyncs
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    create_schema(conn)
+    generate(conn, args.seed, **sizes)
+    conn.close()
+
+    # Build the app's indexes, summaries and search index once, after the bulk load
+    conn = connect(args.target)
+    print("Applying migrations...")
+    retry_on_busy(migrate, conn, verbose=True)
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import OrderedDict
+
+from database import connect, retry_on_busy
+from migrations import migrate
+from money import sql_pounds
+
+CATEGORIES_SQL = """
+    SELECT category_id, category_description
+    FROM categories
+    ORDER BY category_description
+"""
+
+CATEGORY_PRODUCTS_SQL = f"""
+    SELECT p.product_id,
+           p.product_description ||
+           IFNULL(' (from ' || {sql_pounds('ps.min_price')} || ')', '') as product_info
+    FROM products p
+    LEFT JOIN product_summary ps ON ps.product_id = p.product_id
+    WHERE p.category_id = ?
+    ORDER BY p.product_description
+"""
+
+# The seller's average rating comes from the seller_ratings aggregate, not the reviews
+PRODUCT_SELLERS_SQL = f"""
+    SELECT ps.seller_id,
+           s.seller_name || ' - ' || {sql_pounds('ps.price')} ||
+           CASE WHEN sr.rating_count > 0
+                THEN printf(' (%.1f/5 from %d reviews)', 1.0 * sr.rating_sum / sr.rating_count, sr.rating_count)
+                ELSE ''
+           END as seller_info,
+           ps.price
+    FROM product_sellers ps
+    JOIN sellers s ON ps.seller_id = s.seller_id
+    LEFT JOIN seller_ratings sr ON sr.seller_id = ps.seller_id
+    WHERE ps.product_id = ?
+    ORDER BY s.seller_name
+"""
+
+DEFAULT_MAX_ENTRIES = 1024
+
+# Serve lookups from a memory-mapped snapshot file instead of SQL (off unless set)
+SNAPSHOT_PATH = os.environ.get('ORINOCO_CATALOG_SNAPSHOT')
+
+
+class CatalogVersion:
+    """Watches a connection for catalog changes.
+
+    ``PRAGMA data_version`` only changes when another connection commits, so
+    while nothing has been written a check touches no tables at all. When it
+    does change, the catalog_version counter (bumped by triggers on the
+    catalog tables) tells us whether the commit touched the catalog or
+    something else.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.version = None
+        self._data_version = None
+
+    def changed(self):
+        """Return True if the catalog changed since the last call (always True on the first)"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        version = self.conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+
+class CatalogCache:
+    """Bounded LRU cache of catalog lookups, invalidated when the catalog changes.
+
+    The cache reads through its own connection and checks it with a
+    CatalogVersion before every lookup.
+    """
+
+    def __init__(self, conn=None, max_entries=DEFAULT_MAX_ENTRIES):
+        if conn is None:
+            conn = connect()
+            retry_on_busy(migrate, conn)
+        self.conn = conn
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = CatalogVersion(conn)
+
+    def _check_version(self):
+        if self._version.changed():
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def _lookup(self, key, sql, params=()):
+        with self._lock:
+            self._check_version()
+            rows = self._entries.get(key)
+            if rows is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+            rows = [tuple(row) for row in self.conn.execute(sql, params)]
+            self._entries[key] = rows
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return rows
+
+    def categories(self):
+        """Return [(category_id, category_description)] sorted by description"""
+        return self._lookup(('categories',), CATEGORIES_SQL)
+
+    def category_products(self, category_id):
+        """Return [(product_id, description with cheapest price)] for a category"""
+        return self._lookup(('products', category_id), CATEGORY_PRODUCTS_SQL, (category_id,))
+
+    def product_sellers(self, product_id):
+        """Return [(seller_id, seller_info, price in pence)] for a product"""
+        return self._lookup(('sellers', product_id), PRODUCT_SELLERS_SQL, (product_id,))
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'invalidations': self.invalidations,
+            }
+
+    def close(self):
+        """Close the cache's connection"""
+        with self._lock:
+            self._entries.clear()
+            self.conn.close()
+
+
+_catalog_cache = None
+_catalog_cache_lock = threading.Lock()
+
+
+def get_catalog_cache():
+    """Return the process-wide catalog cache, creating it on first use.
+
+    With ORINOCO_CATALOG_SNAPSHOT set, lookups are served from the
+    memory-mapped snapshot at that path instead (see catalog_snapshot.py).
+    """
+    global _catalog_cache
+    with _catalog_cache_lock:
+        if _catalog_cache is None:
+            if SNAPSHOT_PATH:
+                from catalog_snapshot import SnapshotCatalog
+                _catalog_cache = SnapshotCatalog(SNAPSHOT_PATH)
+            else:
+                _catalog_cache = CatalogCache()
+        return _catalog_cache
@@ -0,0 +1,399 @@
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+from catalog import CATEGORIES_SQL, CatalogCache, CatalogVersion
+from database import DB_PATH, connect, retry_on_busy
+from migrations import migrate
+from money import sql_pounds
+
+try:
+    import fcntl
+except ImportError:     # no cross-process lock: processes may rebuild at the same time, harmlessly
+    fcntl = None
+
+# A read-only copy of the browse catalog (categories, products, sellers and
+# their offers) in one binary file that processes memory-map and share.
+# Every table is a set of fixed-width int64 columns; text is stored once in
+# an interned UTF-8 string table and referred to by index. Products are
+# sorted by id with an offsets column into the offers, so a lookup is a
+# binary search and a slice, with no SQL and nothing to load at start-up.
+# Display text is formatted when the file is built, and each category's
+# product list is one string, so listing a category is a single decode.
+# The header records the catalog_version the file was built from; when the
+# catalog changes the file is rebuilt and swapped in with os.replace().
+
+MAGIC = b"OCAT"
+FORMAT_VERSION = 1
+LISTING_SEPARATOR = "\0"
+
+# Sections in file order; all are int64 columns except string_data (bytes)
+SECTIONS = (
+    'string_offsets', 'string_data',
+    'category_ids', 'category_names', 'category_listings', 'category_product_offsets', 'category_product_ids',
+    'product_ids', 'product_offer_offsets',
+    'offer_seller_ids', 'offer_infos', 'offer_prices',
+)
+HEADER = struct.Struct(f"<4sIq{2 * len(SECTIONS)}q")
+
+# Read in one transaction so the columns agree with the recorded version.
+# These are catalog.py's lookups for every key at once, in the same order
+# and with the same text.
+SNAPSHOT_CATEGORIES_SQL = CATEGORIES_SQL
+
+SNAPSHOT_PRODUCTS_SQL = f"""
+    SELECT p.category_id, p.product_id,
+           p.product_description ||
+           IFNULL(' (from ' || {sql_pounds('ps.min_price')} || ')', '') as product_info
+    FROM products p
+    LEFT JOIN product_summary ps ON ps.product_id = p.product_id
+    WHERE p.category_id IS NOT NULL
+    ORDER BY p.category_id, p.product_description
+"""
+
+SNAPSHOT_OFFERS_SQL = f"""
+    SELECT ps.product_id, ps.seller_id,
+           s.seller_name || ' - ' || {sql_pounds('ps.price')} ||
+           CASE WHEN sr.rating_count > 0
+                THEN printf(' (%.1f/5 from %d reviews)', 1.0 * sr.rating_sum / sr.rating_count, sr.rating_count)
+                ELSE ''
+           END as seller_info,
+           ps.price
+    FROM product_sellers ps
+    JOIN sellers s ON ps.seller_id = s.seller_id
+    LEFT JOIN seller_ratings sr ON sr.seller_id = ps.seller_id
+    ORDER BY ps.product_id, s.seller_name
+"""
+
+
+class _Strings:
+    """Interning string table: each distinct string is stored once"""
+
+    def __init__(self):
+        self.index = {}
+        self.offsets = array('q', [0])
+        self.data = bytearray()
+
+    def add(self, text):
+        text = text or ""
+        position = self.index.get(text)
+        if position is None:
+            position = self.index[text] = len(self.offsets) - 1
+            self.data += text.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return position
+
+
+def read_catalog(conn):
+    """Return (catalog_version, {section: array or bytes}) read in one transaction"""
+    strings = _Strings()
+    columns = {name: array('q') for name in SECTIONS if name not in ('string_offsets', 'string_data')}
+    conn.execute("BEGIN")
+    try:
+        version = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+        listings = {}
+        for category_id, product_id, info in conn.execute(SNAPSHOT_PRODUCTS_SQL):
+            ids, infos = listings.setdefault(category_id, (array('q'), []))
+            ids.append(product_id)
+            # The separator cannot appear inside an entry
+            infos.append(info.replace(LISTING_SEPARATOR, "\ufffd"))
+        columns['category_product_offsets'].append(0)
+        for category_id, description in conn.execute(SNAPSHOT_CATEGORIES_SQL):
+            ids, infos = listings.get(category_id, (array('q'), []))
+            columns['category_ids'].append(category_id)
+            columns['category_names'].append(strings.add(description))
+            columns['category_listings'].append(strings.add(LISTING_SEPARATOR.join(infos)))
+            columns['category_product_ids'].extend(ids)
+            columns['category_product_offsets'].append(len(columns['category_product_ids']))
+
+        # Offers come grouped by product id, so the product index fills in as we go
+        for product_id, seller_id, info, price in conn.execute(SNAPSHOT_OFFERS_SQL):
+            if not columns['product_ids'] or columns['product_ids'][-1] != product_id:
+                columns['product_ids'].append(product_id)
+                columns['product_offer_offsets'].append(len(columns['offer_seller_ids']))
+            columns['offer_seller_ids'].append(seller_id)
+            columns['offer_infos'].append(strings.add(info))
+            columns['offer_prices'].append(price)
+        columns['product_offer_offsets'].append(len(columns['offer_seller_ids']))
+    finally:
+        conn.rollback()
+
+    columns['string_offsets'] = strings.offsets
+    columns['string_data'] = bytes(strings.data)
+    return version, columns
+
+
+def _pad(size):
+    return -size % 8
+
+
+def write_snapshot(path, version, columns):
+    """Write a snapshot file atomically: to a temporary file, then os.replace() over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            placements = []
+            position = HEADER.size
+            for name in SECTIONS:
+                data = columns[name]
+                size = len(data) * (1 if name == 'string_data' else 8)
+                placements += [position, len(data)]
+                position += size + _pad(size)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, *placements))
+            for name in SECTIONS:
+                data = columns[name]
+                raw = data if isinstance(data, bytes) else data.tobytes()
+                f.write(raw)
+                f.write(b"\0" * _pad(len(raw)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return position
+
+
+def build_snapshot(conn, path):
+    """Write the current catalog to path; return its catalog_version"""
+    version, columns = read_catalog(conn)
+    write_snapshot(path, version, columns)
+    return version
+
+
+class CatalogSnapshot:
+    """A memory-mapped snapshot file. Columns are int64 views of the mapping, so nothing is copied."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap.size() < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        magic, format_version, self.catalog_version, *placements = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"Not a catalog snapshot (or an old format): {path}")
+        self.size = self._mmap.size()
+        view = memoryview(self._mmap)
+        self._views = [view]
+        for name, offset, count in zip(SECTIONS, placements[::2], placements[1::2]):
+            if name == 'string_data':
+                section = view[offset:offset + count]
+            else:
+                section = view[offset:offset + 8 * count].cast('q')
+            self._views.append(section)
+            setattr(self, name, section)
+        self._category_rows = {category_id: row for row, category_id in enumerate(self.category_ids)}
+
+    def string(self, index):
+        return str(self.string_data[self.string_offsets[index]:self.string_offsets[index + 1]], 'utf-8')
+
+    def categories(self):
+        """Return [(category_id, category_description)] sorted by description"""
+        return [(category_id, self.string(name)) for category_id, name in zip(self.category_ids, self.category_names)]
+
+    def category_products(self, category_id):
+        """Return [(product_id, description with cheapest price)] for a category"""
+        row = self._category_rows.get(category_id)
+        if row is None:
+            return []
+        ids = self.category_product_ids[self.category_product_offsets[row]:self.category_product_offsets[row + 1]]
+        if not len(ids):
+            return []
+        return list(zip(ids.tolist(), self.string(self.category_listings[row]).split(LISTING_SEPARATOR)))
+
+    def product_sellers(self, product_id):
+        """Return [(seller_id, seller_info, price in pence)] for a product"""
+        row = bisect.bisect_left(self.product_ids, product_id)
+        if row == len(self.product_ids) or self.product_ids[row] != product_id:
+            return []
+        start, end = self.product_offer_offsets[row], self.product_offer_offsets[row + 1]
+        return [(seller_id, self.string(info), price)
+                for seller_id, info, price in zip(self.offer_seller_ids[start:end], self.offer_infos[start:end],
+                                                  self.offer_prices[start:end])]
+
+    def counts(self):
+        return {'categories': len(self.category_ids), 'products': len(self.category_product_ids),
+                'offers': len(self.offer_seller_ids), 'strings': len(self.string_offsets) - 1}
+
+    def close(self):
+        # Views must be released before the mapping can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+class SnapshotCatalog:
+    """Catalog lookups served from a snapshot file, rebuilt when the catalog changes.
+
+    Has the same lookups as CatalogCache. Before each one, a CatalogVersion
+    check on our connection (no table reads unless something committed)
+    tells us whether the catalog moved on; if it did, we map the newer file
+    another process already wrote, or rebuild it ourselves.
+    """
+
+    def __init__(self, path, conn=None):
+        if conn is None:
+            conn = connect()
+            retry_on_busy(migrate, conn)
+        self.path = path
+        self.conn = conn
+        self.snapshot = None
+        self.rebuilds = 0
+        self.reloads = 0
+        self.lookups = 0
+        self._version = CatalogVersion(conn)
+        self._lock = threading.Lock()
+
+    def _open_current(self, version):
+        """Map the file on disk if it is at least this catalog version, else return None"""
+        try:
+            snapshot = CatalogSnapshot(self.path)
+        except (OSError, ValueError):
+            return None
+        if snapshot.catalog_version < version:
+            snapshot.close()
+            return None
+        return snapshot
+
+    def _refresh(self):
+        if not self._version.changed() and self.snapshot is not None:
+            return
+        version = self._version.version
+        if self.snapshot is not None and self.snapshot.catalog_version >= version:
+            return
+        built = False
+        snapshot = self._open_current(version)
+        if snapshot is None:
+            with _rebuild_lock(self.path):
+                # Someone else may have rebuilt it while we waited for the lock
+                snapshot = self._open_current(version)
+                if snapshot is None:
+                    retry_on_busy(build_snapshot, self.conn, self.path)
+                    snapshot = CatalogSnapshot(self.path)
+                    built = True
+        if built:
+            self.rebuilds += 1
+        else:
+            self.reloads += 1
+        # Lists handed out earlier are plain Python objects, so the old mapping can go
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = snapshot
+
+    def _lookup(self, name, *args):
+        with self._lock:
+            self._refresh()
+            self.lookups += 1
+            return getattr(self.snapshot, name)(*args)
+
+    def categories(self):
+        """Return [(category_id, category_description)] sorted by description"""
+        return self._lookup('categories')
+
+    def category_products(self, category_id):
+        """Return [(product_id, description with cheapest price)] for a category"""
+        return self._lookup('category_products', category_id)
+
+    def product_sellers(self, product_id):
+        """Return [(seller_id, seller_info, price in pence)] for a product"""
+        return self._lookup('product_sellers', product_id)
+
+    def clear(self):
+        """Nothing is cached beyond the file itself"""
+
+    def stats(self):
+        """Return snapshot version, size and rebuild counters"""
+        with self._lock:
+            snapshot = self.snapshot
+            return {
+                'lookups': self.lookups,
+                'rebuilds': self.rebuilds,
+                'reloads': self.reloads,
+                'catalog_version': snapshot.catalog_version if snapshot else None,
+                'size_bytes': snapshot.size if snapshot else 0,
+            }
+
+    def close(self):
+        """Unmap the snapshot and close the connection"""
+        with self._lock:
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+            self.conn.close()
+
+
+@contextmanager
+def _rebuild_lock(path):
+    """Hold an exclusive lock on path + '.lock' so only one process rebuilds a snapshot at a time"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def verify(conn, snapshot):
+    """Compare every lookup in the snapshot with CatalogCache's SQL; return the mismatched keys"""
+    cache = CatalogCache(conn, max_entries=1)
+    mismatched = []
+    if cache.categories() != snapshot.categories():
+        mismatched.append(('categories',))
+    for category_id, _ in snapshot.categories():
+        if cache.category_products(category_id) != snapshot.category_products(category_id):
+            mismatched.append(('products', category_id))
+    for product_id in snapshot.category_product_ids:
+        if cache.product_sellers(product_id) != snapshot.product_sellers(product_id):
+            mismatched.append(('sellers', product_id))
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped catalog snapshot")
+    parser.add_argument("output", nargs="?", default=DB_PATH + ".catalog", help="snapshot file to write")
+    parser.add_argument("--verify", action="store_true", help="check every lookup against SQL afterwards")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        retry_on_busy(migrate, conn)
+        started = time.perf_counter()
+        version = retry_on_busy(build_snapshot, conn, args.output)
+        elapsed = time.perf_counter() - started
+        snapshot = CatalogSnapshot(args.output)
+        counts = ", ".join(f"{count} {name}" for name, count in snapshot.counts().items())
+        print(f"Wrote {args.output} ({snapshot.size / 1024 / 1024:.1f} MiB, catalog version {version}) "
+              f"in {elapsed:.2f}s: {counts}")
+        if args.verify:
+            mismatched = verify(conn, snapshot)
+            if mismatched:
+                print(f"{len(mismatched)} lookups differ from SQL, e.g. {mismatched[:5]}")
+                snapshot.close()
+                return 1
+            print("Every lookup matches SQL")
+        snapshot.close()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
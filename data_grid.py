@@ -0,0 +1,278 @@
+import tkinter as tk
+from tkinter import ttk
+
+from db_worker import DbWorker
+
+PAGE_SIZE = 100
+MAX_ROWS = 500          # rows kept in the widget at once
+FILTER_DELAY_MS = 300
+
+
+class GridSource:
+    """Describes a keyset-pageable query for PagedGrid.
+
+    columns is a list of (heading, sql expression, width), optionally with a
+    fourth item giving a different expression to sort on (for example a raw
+    number behind a formatted string). key is a unique
+    expression (normally the primary key) used to break ties so keyset
+    paging never skips or repeats rows. filter_columns are the expressions
+    matched with LIKE when the user types in the filter box. not_null lists
+    the sort expressions that are never NULL; they page with a plain
+    (sort, key) comparison that an index can serve, while the others need
+    their NULLs handled separately.
+    """
+
+    def __init__(self, from_sql, columns, key, filter_columns=(), default_sort=None, not_null=()):
+        self.from_sql = from_sql
+        self.columns = columns
+        self.key = key
+        self.filter_columns = filter_columns
+        self.default_sort = default_sort if default_sort is not None else 0
+        self.not_null = set(not_null) | {key}
+
+    def sort_expression(self, index):
+        """SQL to sort on for a column"""
+        column = self.columns[index]
+        return column[3] if len(column) > 3 else column[1]
+
+    def keyset_condition(self, sort_expr, descending, after):
+        """WHERE condition and params for the rows after a (sort value, key) cursor"""
+        value, key = after
+        op = "<" if descending else ">"
+        if sort_expr == self.key:
+            return f"{self.key} {op} ?", [key]
+        if sort_expr in self.not_null:
+            return f"({sort_expr}, {self.key}) {op} (?, ?)", [value, key]
+        # NULLs sort first ascending and last descending, and never compare equal, so spell them out
+        if value is None:
+            condition = f"{sort_expr} IS NULL AND {self.key} {op} ?"
+            if not descending:
+                condition += f" OR {sort_expr} IS NOT NULL"
+            return f"({condition})", [key]
+        condition = f"({sort_expr}, {self.key}) {op} (?, ?)"
+        if descending:
+            condition = f"({condition} OR {sort_expr} IS NULL)"
+        return condition, [value, key]
+
+    def page_query(self, sort_index, descending, filter_text, after=None, backwards=False, limit=PAGE_SIZE):
+        """Build (sql, params) for one page starting after the (sort value, key) cursor"""
+        sort_expr = self.sort_expression(sort_index)
+        select = ", ".join(column[1] for column in self.columns)
+        where = []
+        params = []
+
+        if filter_text and self.filter_columns:
+            where.append("(" + " OR ".join(f"{expr} LIKE ?" for expr in self.filter_columns) + ")")
+            params.extend([f"%{filter_text}%"] * len(self.filter_columns))
+
+        # Walking backwards is the same query with the direction flipped
+        forward_desc = descending != backwards
+        if after is not None:
+            condition, cursor_params = self.keyset_condition(sort_expr, forward_desc, after)
+            where.append(condition)
+            params.extend(cursor_params)
+
+        direction = "DESC" if forward_desc else "ASC"
+        sql = f"SELECT {self.key}, {sort_expr}, {select} FROM {self.from_sql}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if sort_expr == self.key:
+            sql += f" ORDER BY {self.key} {direction} LIMIT ?"
+        else:
+            sql += f" ORDER BY {sort_expr} {direction}, {self.key} {direction} LIMIT ?"
+        params.append(limit)
+        return sql, params
+
+
+class PagedGrid(tk.Frame):
+    """Treeview that pages rows in from SQL as the user scrolls.
+
+    Only a bounded window of rows is kept in the widget; scrolling near
+    either end fetches the adjacent page through a DbWorker and trims
+    the far end. Sorting (click a heading) and the filter box are pushed
+    down into the query's ORDER BY and WHERE. Pass the application's worker
+    to share it; otherwise the grid runs its own.
+    """
+
+    def __init__(self, parent, source, worker=None, page_size=PAGE_SIZE, max_rows=MAX_ROWS, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.source = source
+        self._own_worker = worker is None
+        self.worker = worker or DbWorker(self)
+        self.page_size = page_size
+        self.max_rows = max(max_rows, page_size * 2)
+
+        self.sort_index = source.default_sort
+        self.descending = False
+        self.filter_text = ""
+
+        self._loading = False
+        self._has_before = False
+        self._has_after = False
+        self._cursors = {}          # iid -> (sort value, key)
+        self._filter_job = None
+
+        self._build()
+        # Closing the window with the window manager destroys the grid in Tk
+        # without going through destroy(), so its requests are dropped here too
+        self.bind("<Destroy>", self._on_destroy)
+        self.reload()
+
+    def _build(self):
+        top = tk.Frame(self, bg=self["bg"])
+        top.pack(fill=tk.X, pady=(0, 5))
+        tk.Label(top, text="Filter:", bg=self["bg"]).pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(top, textvariable=self.filter_var, width=30)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind("<KeyRelease>", self._schedule_filter)
+        self.status_label = tk.Label(top, text="", bg=self["bg"], fg="#7f8c8d")
+        self.status_label.pack(side=tk.RIGHT)
+
+        tree_frame = tk.Frame(self, bg=self["bg"])
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
+
+        headings = [column[0] for column in self.source.columns]
+        self.tree = ttk.Treeview(tree_frame, columns=headings, show='headings',
+                                 yscrollcommand=self._on_yscroll, xscrollcommand=hsb.set)
+
+        self.vsb.config(command=self.tree.yview)
+        hsb.config(command=self.tree.xview)
+
+        for index, (heading, _, width, *_) in enumerate(self.source.columns):
+            self.tree.heading(heading, text=heading, command=lambda i=index: self.sort_by(i))
+            self.tree.column(heading, width=width)
+
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.vsb.grid(row=0, column=1, sticky='ns')
+        hsb.grid(row=1, column=0, sticky='ew')
+
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        self._update_headings()
+
+    def _update_headings(self):
+        for index, column in enumerate(self.source.columns):
+            heading = column[0]
+            arrow = ""
+            if index == self.sort_index:
+                arrow = " ▼" if self.descending else " ▲"
+            self.tree.heading(heading, text=heading + arrow)
+
+    def sort_by(self, index):
+        """Sort on a column, toggling direction if it is already the sort column"""
+        if index == self.sort_index:
+            self.descending = not self.descending
+        else:
+            self.sort_index = index
+            self.descending = False
+        self._update_headings()
+        self.reload()
+
+    def _schedule_filter(self, event=None):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_job = None
+        text = self.filter_var.get().strip()
+        if text != self.filter_text:
+            self.filter_text = text
+            self.reload()
+
+    def reload(self):
+        """Discard loaded rows and fetch the first page for the current sort and filter"""
+        # Pages still loading belong to the old sort/filter
+        self.worker.cancel(self)
+        self.tree.delete(*self.tree.get_children())
+        self._cursors.clear()
+        self._has_before = False
+        self._has_after = False
+        self._fetch(None, backwards=False)
+
+    def _fetch(self, after, backwards):
+        self._loading = True
+        self.status_label.config(text="Loading...")
+        sql, params = self.source.page_query(self.sort_index, self.descending, self.filter_text,
+                                             after, backwards, self.page_size + 1)
+        self.worker.submit(lambda conn: conn.execute(sql, params).fetchall(),
+                           lambda rows: self._show_page(rows, backwards),
+                           self._show_error, tag=self)
+
+    def _show_error(self, error):
+        self._loading = False
+        self.status_label.config(text=f"Error: {error}")
+
+    def _release_worker(self):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+            self._filter_job = None
+        if self._own_worker:
+            self.worker.close()
+        else:
+            self.worker.cancel(self)
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self._release_worker()
+
+    def destroy(self):
+        self._release_worker()
+        super().destroy()
+
+    def _show_page(self, rows, backwards):
+        self._loading = False
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        children = self.tree.get_children()
+        anchor = (children[0] if backwards else children[-1]) if children else None
+
+        if backwards:
+            self._has_before = more
+            for row in rows:
+                self._insert(row, 0)
+        else:
+            self._has_after = more
+            for row in rows:
+                self._insert(row, tk.END)
+
+        self._trim(from_end=backwards)
+        if anchor is not None and self.tree.exists(anchor):
+            self.tree.see(anchor)
+        self.status_label.config(text=f"{len(self.tree.get_children())} rows loaded")
+
+    def _insert(self, row, index):
+        key, sort_value = row[0], row[1]
+        values = ["" if value is None else value for value in tuple(row)[2:]]
+        iid = self.tree.insert("", index, values=values)
+        self._cursors[iid] = (sort_value, key)
+
+    def _trim(self, from_end):
+        children = self.tree.get_children()
+        excess = len(children) - self.max_rows
+        if excess <= 0:
+            return
+        doomed = children[-excess:] if from_end else children[:excess]
+        for iid in doomed:
+            self._cursors.pop(iid, None)
+        self.tree.delete(*doomed)
+        if from_end:
+            self._has_after = True
+        else:
+            self._has_before = True
+
+    def _on_yscroll(self, first, last):
+        self.vsb.set(first, last)
+        if self._loading:
+            return
+        children = self.tree.get_children()
+        if not children:
+            return
+        if float(last) >= 0.95 and self._has_after:
+            self._fetch(self._cursors[children[-1]], backwards=False)
+        elif float(first) <= 0.05 and self._has_before:
+            self._fetch(self._cursors[children[0]], backwards=True)
@@ -0,0 +1,196 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from migrations import migrate
+from sql_trace import TracedConnection, enable_from_settings, tracer
+
+# Database settings (override with environment variables)
+DB_PATH = os.environ.get('ORINOCO_DB', 'Orinoco.db')
+BUSY_TIMEOUT_MS = int(os.environ.get('ORINOCO_BUSY_TIMEOUT_MS', '5000'))
+POOL_SIZE = int(os.environ.get('ORINOCO_POOL_SIZE', '5'))
+CACHE_SIZE_KIB = 16 * 1024          # page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024       # memory-mapped I/O window
+STATEMENT_CACHE_SIZE = 256          # prepared statements kept per connection
+
+# SQL tracing (see sql_trace.py): off unless ORINOCO_TRACE_SQL=1
+TRACE_SQL = os.environ.get('ORINOCO_TRACE_SQL', '0') not in ('', '0')
+SLOW_QUERY_MS = float(os.environ.get('ORINOCO_SLOW_QUERY_MS', '50'))
+TRACE_SQL_OUT = os.environ.get('ORINOCO_TRACE_SQL_OUT')
+
+BUSY_RETRIES = 5
+BUSY_BACKOFF_SECONDS = 0.05
+
+_BUSY_CODES = {getattr(sqlite3, 'SQLITE_BUSY', 5), getattr(sqlite3, 'SQLITE_LOCKED', 6)}
+
+
+def is_busy_error(error):
+    """Return True if the error means another connection holds the lock"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return (code & 0xff) in _BUSY_CODES
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_busy(func, *args, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF_SECONDS, **kwargs):
+    """Call func, retrying with jittered exponential backoff while the database is busy"""
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt >= retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+def configure_connection(conn, busy_timeout_ms=BUSY_TIMEOUT_MS):
+    """Apply the shared performance settings to an open connection"""
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    # WAL lets readers carry on while a shopper checks out
+    retry_on_busy(conn.execute, "PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def connect(path=None, busy_timeout_ms=BUSY_TIMEOUT_MS):
+    """Open a tuned connection to the SQLite database"""
+    conn = sqlite3.connect(path or DB_PATH,
+                           timeout=busy_timeout_ms / 1000,
+                           cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False,
+                           factory=TracedConnection if tracer.enabled else sqlite3.Connection)
+    try:
+        return configure_connection(conn, busy_timeout_ms)
+    except sqlite3.Error:
+        conn.close()
+        raise
+
+
+if TRACE_SQL:
+    enable_from_settings(SLOW_QUERY_MS, TRACE_SQL_OUT)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of tuned SQLite connections"""
+
+    def __init__(self, path=None, size=POOL_SIZE, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        self.path = path or DB_PATH
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._migrated = False
+
+    def _open(self):
+        conn = retry_on_busy(connect, self.path, self.busy_timeout_ms)
+        if not self._migrated:
+            # First connection brings the schema up to date for the whole pool
+            retry_on_busy(migrate, conn)
+            self._migrated = True
+        return conn
+
+    def acquire(self, timeout=None):
+        """Take a connection from the pool, opening one if the pool is not full"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = len(self._all) < self.size
+            if can_open:
+                # Reserve the slot before the (slow) open so other threads see it
+                self._all.append(None)
+        if can_open:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._all.remove(None)
+                raise
+            with self._lock:
+                self._all[self._all.index(None)] = conn
+            return conn
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No database connection free after {timeout}s")
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        with self._lock:
+            if not self._closed:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+                return
+            if conn in self._all:
+                self._all.remove(conn)
+        # The pool was closed while this connection was borrowed; closing it rolls back
+        conn.close()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection for the duration of the block"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close the idle connections; borrowed ones are closed when they are released"""
+        with self._lock:
+            self._closed = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for conn in idle:
+                self._all.remove(conn)
+        for conn in idle:
+            conn.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
+
+
+def close_pool():
+    """Close the process-wide connection pool"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+            _default_pool = None
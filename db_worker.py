@@ -0,0 +1,156 @@
+import queue
+import threading
+import traceback
+
+from database import get_pool
+
+POLL_MS = 30
+
+
+class DbRequest:
+    """A call queued on a DbWorker; cancel() drops its result"""
+
+    def __init__(self, worker, func, on_done, on_error, tag):
+        self.worker = worker
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.tag = tag
+        self.cancelled = False
+
+    def cancel(self):
+        """Skip the call if it has not started, otherwise interrupt it and discard the result"""
+        self.worker._cancel(self)
+
+
+class DbWorker:
+    """Runs database calls off the Tk thread and hands results back on it.
+
+    submit(func, on_done) queues func(conn) for a background thread that
+    owns one pooled connection. Results are collected by a root.after poll,
+    so on_done and on_error always run on the Tk thread and may touch
+    widgets. Requests carry a tag (normally the screen or widget that asked
+    for them) so everything a screen started can be cancelled when the user
+    navigates away; a cancelled call that is already running is interrupted.
+    """
+
+    def __init__(self, widget, pool=None, on_busy=None, poll_ms=POLL_MS):
+        self.widget = widget
+        self.pool = pool or get_pool()
+        self.on_busy = on_busy
+        self.poll_ms = poll_ms
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._running = None
+        self._conn = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self._thread.start()
+        self._poll_job = widget.after(poll_ms, self._poll)
+
+    @property
+    def busy(self):
+        """True while any request is queued, running or waiting to be delivered"""
+        return bool(self._pending)
+
+    def submit(self, func, on_done=None, on_error=None, tag=None):
+        """Queue func(conn) and return its DbRequest"""
+        if self._closed:
+            raise RuntimeError("Database worker is closed")
+        request = DbRequest(self, func, on_done, on_error, tag)
+        was_busy = self.busy
+        self._pending.add(request)
+        self._requests.put(request)
+        if not was_busy and self.on_busy:
+            self.on_busy(True)
+        return request
+
+    def cancel(self, tag=None):
+        """Cancel every outstanding request with this tag (all of them if tag is None)"""
+        for request in list(self._pending):
+            if tag is None or request.tag == tag:
+                self._cancel(request)
+
+    def _cancel(self, request):
+        request.cancelled = True
+        with self._lock:
+            if request is self._running and self._conn is not None:
+                self._conn.interrupt()
+        self._finish(request)
+
+    def _finish(self, request):
+        if request in self._pending:
+            self._pending.discard(request)
+            if not self._pending and self.on_busy:
+                self.on_busy(False)
+
+    # Background thread
+    def _run(self):
+        connect_error = None
+        try:
+            self._conn = self.pool.acquire()
+        except Exception as e:
+            connect_error = e
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            if request.cancelled:
+                continue
+            if self._conn is None:
+                self._results.put((request, None, connect_error))
+                continue
+            with self._lock:
+                self._running = request
+            try:
+                result, error = request.func(self._conn), None
+            except Exception as e:
+                result, error = None, e
+            finally:
+                with self._lock:
+                    self._running = None
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+            self._results.put((request, result, error))
+        if self._conn is not None:
+            self.pool.release(self._conn)
+
+    # Tk thread
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    request, result, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if request.cancelled:
+                    continue
+                self._finish(request)
+                self._deliver(request, result, error)
+        finally:
+            if not self._closed:
+                self._poll_job = self.widget.after(self.poll_ms, self._poll)
+
+    def _deliver(self, request, result, error):
+        # A failing callback (say its window was closed under it) is reported
+        # and must not stop the results queued behind it
+        try:
+            if error is not None:
+                if request.on_error:
+                    request.on_error(error)
+            elif request.on_done:
+                request.on_done(result)
+        except Exception:
+            traceback.print_exc()
+
+    def close(self):
+        """Cancel everything, stop the thread and return its connection to the pool"""
+        if self._closed:
+            return
+        self.cancel()
+        self._closed = True
+        self.widget.after_cancel(self._poll_job)
+        self._requests.put(None)
+        self._thread.join(timeout=5)
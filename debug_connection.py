@@ -1,51 +1,271 @@
+import argparse
+import json
+import os
+import re
 import sqlite3
+import sys
+from pathlib import Path
 
-def inspect_database():
+from database import DB_PATH
+from query_plans import HOT_QUERIES, full_scans
+
+_USED_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\S+)")
+
+
+def open_database(path=None, writable=False):
+    """Open the database for inspection (read-only unless writable, never creates it)"""
+    uri = Path(path or DB_PATH).resolve().as_uri() + ("?mode=rw" if writable else "?mode=ro")
+    conn = sqlite3.connect(uri, uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def table_columns(conn):
+    """Return {table: [column rows]} for every table in one query"""
+    tables = {}
+    for row in conn.execute("""
+        SELECT m.name AS table_name, c.name, c.type, c."notnull", c.pk
+        FROM sqlite_master m
+        JOIN pragma_table_info(m.name) c
+        WHERE m.type = 'table'
+        ORDER BY m.name, c.cid
+    """):
+        tables.setdefault(row['table_name'], []).append(row)
+    return tables
+
+
+def inspect_database(path=None, sample_rows=0):
     """Inspect the database to find actual table names and structures"""
     try:
-        conn = sqlite3.connect('orinoco.db')
-        cursor = conn.cursor()
-        
-        # Get all table names
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
+        conn = open_database(path)
+
         print("Tables in the database:")
         print("=" * 50)
-        for table in tables:
-            table_name = table[0]
+        for table_name, columns in table_columns(conn).items():
             print(f"\nTable: {table_name}")
-            
-            # Get column information for each table
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            
+
             print("Columns:")
             for col in columns:
-                col_id, col_name, col_type, not_null, default_val, pk = col
-                pk_indicator = " (PRIMARY KEY)" if pk else ""
-                null_indicator = " NOT NULL" if not_null else ""
-                print(f"  - {col_name}: {col_type}{pk_indicator}{null_indicator}")
-            
-            # Show sample data (first 3 rows)
-            try:
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 3")
-                sample_data = cursor.fetchall()
-                if sample_data:
-                    print("Sample data (first 3 rows):")
-                    for i, row in enumerate(sample_data, 1):
-                        print(f"  Row {i}: {row}")
-                else:
-                    print("No data in this table")
-            except Exception as e:
-                print(f"Could not fetch sample data: {e}")
-        
+                pk_indicator = " (PRIMARY KEY)" if col['pk'] else ""
+                null_indicator = " NOT NULL" if col['notnull'] else ""
+                print(f"  - {col['name']}: {col['type']}{pk_indicator}{null_indicator}")
+
+            # Show sample data only when asked for
+            if sample_rows:
+                try:
+                    sample_data = conn.execute(f'SELECT * FROM "{table_name}" LIMIT ?', (sample_rows,)).fetchall()
+                    if sample_data:
+                        print(f"Sample data (first {sample_rows} rows):")
+                        for i, row in enumerate(sample_data, 1):
+                            print(f"  Row {i}: {tuple(row)}")
+                    else:
+                        print("No data in this table")
+                except sqlite3.Error as e:
+                    print(f"Could not fetch sample data: {e}")
+
         conn.close()
-        
+
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-    except Exception as e:
-        print(f"Error: {e}")
+
+# Storage
+def storage_stats(conn):
+    """Row counts and page usage for every table and index, read from dbstat"""
+    stats = []
+    for row in conn.execute("""
+        SELECT d.name, IFNULL(m.type, 'table') AS type, IFNULL(m.tbl_name, d.name) AS table_name,
+               COUNT(*) AS pages,
+               SUM(d.pgsize) AS bytes,
+               SUM(d.unused) AS unused_bytes,
+               SUM(CASE WHEN d.pagetype = 'leaf' OR m.type = 'index' THEN d.ncell ELSE 0 END) AS entries
+        FROM dbstat d
+        LEFT JOIN sqlite_master m ON m.name = d.name
+        GROUP BY d.name
+        ORDER BY bytes DESC
+    """):
+        item = dict(row)
+        item['unused_pct'] = 100.0 * item['unused_bytes'] / item['bytes'] if item['bytes'] else 0.0
+        stats.append(item)
+    return stats
+
+
+def file_health(conn, path=None):
+    """Page counts, freelist and WAL size for the database file"""
+    path = path or DB_PATH
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_path = path + "-wal"
+    return {
+        'path': path,
+        'file_bytes': os.path.getsize(path),
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_pages': freelist,
+        'freelist_pct': 100.0 * freelist / page_count if page_count else 0.0,
+        'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+        'auto_vacuum': conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+    }
+
+# Planner statistics
+def planner_statistics(conn):
+    """Rows of sqlite_stat1 (empty until ANALYZE has been run)"""
+    exists = conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'
+    """).fetchone()
+    if not exists:
+        return []
+    return [dict(row) for row in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1 ORDER BY tbl, idx")]
+
+# Indexes
+def index_usage(conn, queries=HOT_QUERIES):
+    """Check the app's known queries against the indexes.
+
+    Returns (unused, scans): explicit indexes no known query plan uses, and
+    {query name: full table scans} for queries that would need a new index.
+    A query that cannot be planned (e.g. the schema is not migrated yet) is
+    reported as a scan with the error text.
+    """
+    used = set()
+    scans = {}
+    for name, sql, params, allowed in queries:
+        try:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as e:
+            scans[name] = [f"cannot plan: {e}"]
+            continue
+        for detail in plan:
+            used.update(_USED_INDEX_RE.findall(detail))
+        found = full_scans(plan, allowed)
+        if found:
+            scans[name] = found
+    indexes = conn.execute("""
+        SELECT name, tbl_name FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL
+        ORDER BY tbl_name, name
+    """).fetchall()
+    unused = [{'index': row['name'], 'table': row['tbl_name']} for row in indexes if row['name'] not in used]
+    return unused, scans
+
+
+def _rowid_alias(conn, table):
+    """The table's INTEGER PRIMARY KEY column (an alias for the rowid), or None"""
+    columns = conn.execute("SELECT name, type, pk FROM pragma_table_info(?)", (table,)).fetchall()
+    keys = [column for column in columns if column[2]]
+    if len(keys) == 1 and keys[0][1].upper() == "INTEGER":
+        without_rowid = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+        if "WITHOUT ROWID" not in (without_rowid or "").upper():
+            return keys[0][0]
+    return None
+
+
+def unindexed_foreign_keys(conn):
+    """Foreign keys whose columns do not lead any index (joins and deletes scan).
+
+    A composite key counts as indexed when its columns, in any order, are
+    the leading columns of one index; an INTEGER PRIMARY KEY is the rowid,
+    so it is always indexed.
+    """
+    missing = []
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    for table in tables:
+        keys = {}
+        for fk in conn.execute('SELECT id, seq, "table", "from" FROM pragma_foreign_key_list(?) ORDER BY id, seq',
+                               (table,)):
+            keys.setdefault(fk[0], (fk[2], []))[1].append(fk[3])
+        if not keys:
+            continue
+        indexes = [[row[0] for row in conn.execute(
+                       "SELECT name FROM pragma_index_info(?) ORDER BY seqno", (index[0],))]
+                   for index in conn.execute("SELECT name FROM pragma_index_list(?)", (table,))]
+        rowid = _rowid_alias(conn, table)
+        if rowid is not None:
+            indexes.append([rowid])
+        for parent, columns in keys.values():
+            if not any(set(index[:len(columns)]) == set(columns) for index in indexes):
+                missing.append({'table_name': table, 'column_name': ", ".join(columns), 'parent_table': parent})
+    return missing
+
+
+def health_report(conn, path=None):
+    """Collect the whole performance report as plain data"""
+    unused, scans = index_usage(conn)
+    return {
+        'file': file_health(conn, path),
+        'storage': storage_stats(conn),
+        'sqlite_stat1': planner_statistics(conn),
+        'unused_indexes': unused,
+        'full_scans': scans,
+        'unindexed_foreign_keys': unindexed_foreign_keys(conn),
+    }
+
+
+def print_report(report):
+    """Print health_report() for a person to read"""
+    f = report['file']
+    print(f"Database: {f['path']} ({f['file_bytes'] / 1024:.0f} KiB, journal {f['journal_mode']}, "
+          f"auto_vacuum {f['auto_vacuum']})")
+    print(f"Pages: {f['page_count']} x {f['page_size']} bytes, "
+          f"{f['freelist_pages']} free ({f['freelist_pct']:.1f}%), WAL {f['wal_bytes'] / 1024:.0f} KiB")
+
+    print(f"\n{'name':<40} {'type':<6} {'entries':>9} {'pages':>7} {'KiB':>8} {'unused':>7}")
+    for item in report['storage']:
+        print(f"{item['name']:<40} {item['type']:<6} {item['entries']:>9} {item['pages']:>7} "
+              f"{item['bytes'] / 1024:>8.1f} {item['unused_pct']:>6.1f}%")
+
+    print("\nPlanner statistics (sqlite_stat1):")
+    if not report['sqlite_stat1']:
+        print("  none - run with --analyze")
+    for row in report['sqlite_stat1']:
+        print(f"  {row['tbl']}.{row['idx'] or '-'}: {row['stat']}")
+
+    print("\nIndexes not used by any known query:")
+    for item in report['unused_indexes'] or [{'index': 'none', 'table': '-'}]:
+        print(f"  {item['index']} on {item['table']}")
+
+    print("\nKnown queries doing full table scans:")
+    if not report['full_scans']:
+        print("  none")
+    for name, scans in report['full_scans'].items():
+        print(f"  {name}: {'; '.join(scans)}")
+
+    print("\nForeign keys without an index:")
+    if not report['unindexed_foreign_keys']:
+        print("  none")
+    for item in report['unindexed_foreign_keys']:
+        print(f"  {item['table_name']}({item['column_name']}) -> {item['parent_table']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database structure and performance inspector")
+    parser.add_argument("--db", default=DB_PATH, help="database file to inspect")
+    parser.add_argument("--schema", action="store_true", help="list tables and columns instead")
+    parser.add_argument("--samples", type=int, default=0, help="with --schema, show this many rows per table")
+    parser.add_argument("--analyze", action="store_true", help="run ANALYZE first to refresh sqlite_stat1")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON for monitoring")
+    args = parser.parse_args()
+
+    if args.schema:
+        inspect_database(args.db, args.samples)
+        return 0
+
+    try:
+        conn = open_database(args.db, writable=args.analyze)
+        if args.analyze:
+            conn.execute("ANALYZE")
+            conn.commit()
+        report = health_report(conn, args.db)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
 
 if __name__ == "__main__":
-    inspect_database()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from database import connect, retry_on_busy
+
+# Housekeeping for long-lived databases. Shoppers only ever reach the basket
+# they created today (see shopper_session.get_current_basket), so older
+# baskets that were never checked out, and their basket_contents lines, are
+# dead rows. sweep_baskets() deletes them a small batch per transaction with
+# a pause in between, so the write lock is never held for long, and then
+# hands the freed pages back with PRAGMA incremental_vacuum.
+
+DEFAULT_RETENTION_DAYS = 1      # a basket is kept until it is at least this many days old
+DEFAULT_BATCH_SIZE = 500        # baskets deleted per transaction
+DEFAULT_PAUSE_SECONDS = 0.05    # between transactions, so other writers get the lock
+VACUUM_STEP_PAGES = 2000        # pages returned per incremental_vacuum transaction
+SWEEP_INTERVAL_MINUTES = float(os.environ.get('ORINOCO_SWEEP_MINUTES', '0'))
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Walk the baskets in basket_id order from where the last batch stopped, so
+# the whole sweep reads the table once rather than once per batch
+EXPIRED_BASKETS_SQL = """
+    SELECT basket_id FROM shopper_baskets
+    WHERE basket_id > ? AND basket_created_date_time < DATE('now', ?)
+    ORDER BY basket_id
+    LIMIT ?
+"""
+
+# Lines whose basket is already gone (e.g. deleted by hand)
+ORPHAN_LINES_SQL = """
+    SELECT DISTINCT bc.basket_id FROM basket_contents bc
+    WHERE bc.basket_id > ?
+      AND NOT EXISTS (SELECT 1 FROM shopper_baskets sb WHERE sb.basket_id = bc.basket_id)
+    ORDER BY bc.basket_id
+    LIMIT ?
+"""
+
+
+class SweepReport:
+    """What a sweep removed and how long it held the write lock"""
+
+    def __init__(self):
+        self.baskets = 0
+        self.lines = 0
+        self.orphan_lines = 0
+        self.batches = 0
+        self.longest_batch = 0.0
+        self.pages_freed = 0
+        self.free_pages = 0
+        self.auto_vacuum = None
+        self.file_bytes_before = 0
+        self.file_bytes_after = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            'baskets_deleted': self.baskets,
+            'lines_deleted': self.lines,
+            'orphan_lines_deleted': self.orphan_lines,
+            'batches': self.batches,
+            'longest_batch_ms': self.longest_batch * 1000,
+            'pages_freed': self.pages_freed,
+            'free_pages_left': self.free_pages,
+            'incremental_vacuum': self.auto_vacuum == AUTO_VACUUM_INCREMENTAL,
+            'file_bytes_before': self.file_bytes_before,
+            'file_bytes_after': self.file_bytes_after,
+            'seconds': self.elapsed,
+        }
+
+    def summary(self):
+        """One line for a person to read"""
+        return (f"Deleted {self.baskets} baskets ({self.lines} lines) and {self.orphan_lines} orphaned lines "
+                f"in {self.batches} batches (longest {self.longest_batch * 1000:.1f} ms); "
+                f"freed {self.pages_freed} pages, file {self.file_bytes_before / 1024 / 1024:.1f} -> "
+                f"{self.file_bytes_after / 1024 / 1024:.1f} MiB in {self.elapsed:.2f}s")
+
+
+def _file_bytes(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+
+
+def _delete_batch(conn, basket_ids, baskets_too):
+    """Delete one batch in its own short IMMEDIATE transaction; return lines deleted"""
+    if conn.in_transaction:
+        conn.commit()
+    placeholders = ", ".join("?" * len(basket_ids))
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f"DELETE FROM basket_contents WHERE basket_id IN ({placeholders})", basket_ids)
+        lines = cursor.rowcount
+        if baskets_too:
+            cursor.execute(f"DELETE FROM shopper_baskets WHERE basket_id IN ({placeholders})", basket_ids)
+        conn.commit()
+        return lines
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _sweep(conn, sql, params, baskets_too, report, batch_size, pause, stop):
+    after = 0
+    while stop is None or not stop.is_set():
+        basket_ids = [row[0] for row in conn.execute(sql, (after, *params, batch_size))]
+        if not basket_ids:
+            return
+        started = time.perf_counter()
+        lines = retry_on_busy(_delete_batch, conn, basket_ids, baskets_too)
+        report.longest_batch = max(report.longest_batch, time.perf_counter() - started)
+        report.batches += 1
+        if baskets_too:
+            report.baskets += len(basket_ids)
+            report.lines += lines
+        else:
+            report.orphan_lines += lines
+        after = basket_ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES, pause=DEFAULT_PAUSE_SECONDS):
+    """Return free pages to the file system a step at a time; return pages freed.
+
+    Does nothing unless the database uses auto_vacuum = INCREMENTAL (see
+    enable_incremental_vacuum).
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    freed = 0
+    while True:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not before:
+            break
+        if conn.in_transaction:
+            conn.commit()
+        # execute() only steps the pragma once (one page); executescript() runs it to completion
+        retry_on_busy(conn.executescript, f"PRAGMA incremental_vacuum({int(step_pages)});")
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if after >= before:
+            break
+        freed += before - after
+        if pause:
+            time.sleep(pause)
+    # In WAL mode the file only shrinks when the WAL is checkpointed; PASSIVE never waits on readers
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return freed
+
+
+def sweep_baskets(conn, retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                  pause=DEFAULT_PAUSE_SECONDS, vacuum=True, stop=None):
+    """Delete baskets at least retention_days old (and orphaned lines), then vacuum; return a SweepReport.
+
+    Setting the optional threading.Event stop ends the sweep after the current batch.
+    """
+    report = SweepReport()
+    started = time.perf_counter()
+    if conn.in_transaction:
+        conn.commit()
+    report.auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    report.file_bytes_before = _file_bytes(conn)
+    _sweep(conn, EXPIRED_BASKETS_SQL, (f"-{int(retention_days)} days",), True, report, batch_size, pause, stop)
+    _sweep(conn, ORPHAN_LINES_SQL, (), False, report, batch_size, pause, stop)
+    if vacuum and (stop is None or not stop.is_set()):
+        report.pages_freed = incremental_vacuum(conn, pause=pause)
+    report.free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    report.file_bytes_after = _file_bytes(conn)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def enable_incremental_vacuum(conn):
+    """Switch the database to auto_vacuum = INCREMENTAL.
+
+    This needs a full VACUUM, which rewrites the whole file under an
+    exclusive lock, so run it once while the app is stopped.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+
+class MaintenanceTimer:
+    """Runs sweep_baskets every interval on a background thread with its own connection.
+
+    For long-running processes such as the API server; start() and stop()
+    bracket the process's lifetime. A failed sweep is reported and retried
+    at the next interval.
+    """
+
+    def __init__(self, interval_seconds, path=None, **options):
+        self.interval_seconds = interval_seconds
+        self.path = path
+        self.options = options
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while not self._stop.wait(self.interval_seconds):
+                try:
+                    self.last_report = sweep_baskets(conn, stop=self._stop, **self.options)
+                    print(f"Maintenance: {self.last_report.summary()}", file=sys.stderr, flush=True)
+                except sqlite3.Error as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    print(f"Maintenance sweep failed: {e}", file=sys.stderr, flush=True)
+        finally:
+            conn.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop after the current batch at the latest"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete abandoned baskets and return the space")
+    parser.add_argument("--retention-days", type=int, default=DEFAULT_RETENTION_DAYS,
+                        help="keep baskets created fewer than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="baskets per transaction")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE_SECONDS,
+                        help="seconds to wait between transactions")
+    parser.add_argument("--no-vacuum", action="store_true", help="delete only, keep the free pages")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch the database to auto_vacuum=INCREMENTAL first (full VACUUM; app stopped)")
+    parser.add_argument("--every", type=float, metavar="MINUTES", help="keep running, sweeping this often")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    options = {'retention_days': max(0, args.retention_days), 'batch_size': max(1, args.batch_size),
+               'pause': max(0.0, args.pause), 'vacuum': not args.no_vacuum}
+    conn = connect()
+    try:
+        if args.enable_incremental_vacuum:
+            started = time.perf_counter()
+            enable_incremental_vacuum(conn)
+            print(f"auto_vacuum is now INCREMENTAL (VACUUM took {time.perf_counter() - started:.1f}s)")
+        while True:
+            report = sweep_baskets(conn, **options)
+            print(json.dumps(report.as_dict(), indent=2) if args.json else report.summary(), flush=True)
+            if options['vacuum'] and report.auto_vacuum != AUTO_VACUUM_INCREMENTAL and report.free_pages:
+                print(f"{report.free_pages} free pages stay in the file: auto_vacuum is not INCREMENTAL "
+                      f"(run once with --enable-incremental-vacuum)", file=sys.stderr)
+            if not args.every:
+                break
+            time.sleep(args.every * 60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,430 @@
+import re
+import sqlite3
+
+CATALOG_TABLES = ("categories", "products", "product_sellers", "sellers")
+
+
+def _catalog_version_triggers(tables=CATALOG_TABLES):
+    """Triggers that bump catalog_version on any change to a catalog table"""
+    return [f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_catalog_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                END"""
+            for table in tables
+            for event in ("INSERT", "UPDATE", "DELETE")]
+
+
+def _summary_refresh(row):
+    """Trigger statement recomputing the product_summary row of {row}.product_id.
+
+    An UPSERT rather than INSERT OR REPLACE: inside a trigger the OR clause
+    is overridden by the conflict mode of the statement that fired it, so an
+    outer UPSERT (ABORT) would fail on the existing summary row.
+    """
+    return f"""INSERT INTO product_summary (product_id, seller_count, min_price, max_price)
+               SELECT {row}.product_id, COUNT(*), MIN(price), MAX(price)
+               FROM product_sellers WHERE product_id = {row}.product_id
+               ON CONFLICT (product_id) DO UPDATE SET
+                   seller_count = excluded.seller_count,
+                   min_price = excluded.min_price,
+                   max_price = excluded.max_price;"""
+
+
+# Rating aggregates: count, sum and a 1-5 star histogram per product and per
+# seller, kept up to date by triggers on the review tables
+def _rating_table(table, key):
+    return f"""CREATE TABLE IF NOT EXISTS {table}
+           ({key} INTEGER PRIMARY KEY,
+            rating_count INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            stars_1 INTEGER NOT NULL,
+            stars_2 INTEGER NOT NULL,
+            stars_3 INTEGER NOT NULL,
+            stars_4 INTEGER NOT NULL,
+            stars_5 INTEGER NOT NULL
+           )"""
+
+
+def _rating_rebuild(table, key, reviews):
+    return f"""INSERT OR REPLACE INTO {table}
+           ({key}, rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+           SELECT {key}, COUNT(*), SUM(rating),
+                  SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+           FROM {reviews}
+           GROUP BY {key}"""
+
+
+def _rating_triggers(table, key, reviews):
+    add = f"""INSERT INTO {table}
+                   ({key}, rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+               VALUES (NEW.{key}, 1, NEW.rating, NEW.rating = 1, NEW.rating = 2, NEW.rating = 3,
+                       NEW.rating = 4, NEW.rating = 5)
+               ON CONFLICT ({key}) DO UPDATE SET
+                   rating_count = rating_count + 1,
+                   rating_sum = rating_sum + excluded.rating_sum,
+                   stars_1 = stars_1 + excluded.stars_1,
+                   stars_2 = stars_2 + excluded.stars_2,
+                   stars_3 = stars_3 + excluded.stars_3,
+                   stars_4 = stars_4 + excluded.stars_4,
+                   stars_5 = stars_5 + excluded.stars_5;"""
+    remove = f"""UPDATE {table} SET
+                   rating_count = rating_count - 1,
+                   rating_sum = rating_sum - OLD.rating,
+                   stars_1 = stars_1 - (OLD.rating = 1),
+                   stars_2 = stars_2 - (OLD.rating = 2),
+                   stars_3 = stars_3 - (OLD.rating = 3),
+                   stars_4 = stars_4 - (OLD.rating = 4),
+                   stars_5 = stars_5 - (OLD.rating = 5)
+               WHERE {key} = OLD.{key};"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {reviews}_insert_ratings
+           AFTER INSERT ON {reviews}
+           BEGIN
+               {add}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {reviews}_update_ratings
+           AFTER UPDATE OF {key}, rating ON {reviews}
+           BEGIN
+               {remove}
+               {add}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {reviews}_delete_ratings
+           AFTER DELETE ON {reviews}
+           BEGIN
+               {remove}
+           END""",
+    ]
+
+
+def consolidate_seller_reviews(conn):
+    """Merge SellerReviews ('*'..'*****') and seller_reviews ('1'..'5') into one integer-rated seller_reviews"""
+    conn.execute("""CREATE TABLE seller_reviews_new
+           (review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seller_id INTEGER NOT NULL,
+            shopper_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+            comment TEXT CHECK (comment IS NULL OR LENGTH(TRIM(comment)) > 0),
+            review_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (seller_id) REFERENCES sellers(seller_id),
+            FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id),
+            UNIQUE (seller_id, shopper_id, review_date)
+           )""")
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "seller_reviews" in tables:
+        conn.execute("""INSERT INTO seller_reviews_new (review_id, seller_id, shopper_id, rating, comment, review_date)
+                        SELECT review_id, seller_id, shopper_id, CAST(rating AS INTEGER), comment, review_date
+                        FROM seller_reviews""")
+        conn.execute("DROP TABLE seller_reviews")
+    if "SellerReviews" in tables:
+        # Star-only reviews may have no comment; an exact duplicate of a review
+        # already copied (same seller, shopper and time) is dropped
+        conn.execute("""INSERT OR IGNORE INTO seller_reviews_new (seller_id, shopper_id, rating, comment, review_date)
+                        SELECT SellerID, ShopperID, LENGTH(Rating), NULLIF(TRIM(Comment), ''),
+                               IFNULL(ReviewDateTime, CURRENT_TIMESTAMP)
+                        FROM SellerReviews""")
+        conn.execute("DROP TABLE SellerReviews")
+    conn.execute("ALTER TABLE seller_reviews_new RENAME TO seller_reviews")
+
+
+# Rollup definitions, shared by migration 5 and summaries.verify_rollups():
+# cancelled lines and cancelled orders do not count.
+ORDER_ROLLUPS_SQL = """
+    SELECT o.order_id,
+           IFNULL(SUM(op.quantity), 0) as item_count,
+           IFNULL(SUM(op.quantity * op.price), 0) as order_value
+    FROM shopper_orders o
+    LEFT JOIN ordered_products op
+        ON op.order_id = o.order_id
+        AND op.ordered_product_status IS NOT 'Cancelled'
+    GROUP BY o.order_id
+"""
+
+SHOPPER_ROLLUPS_SQL = f"""
+    SELECT o.shopper_id,
+           COUNT(*) as order_count,
+           IFNULL(SUM(r.order_value), 0) as lifetime_spend
+    FROM shopper_orders o
+    JOIN ({ORDER_ROLLUPS_SQL}) r ON r.order_id = o.order_id
+    WHERE o.order_status != 'Cancelled'
+    GROUP BY o.shopper_id
+"""
+
+
+def rebuild_rollups(conn):
+    """Recompute order_rollups and shopper_rollups (caller owns the transaction)"""
+    conn.execute("DELETE FROM order_rollups")
+    conn.execute("INSERT INTO order_rollups (order_id, item_count, order_value) " + ORDER_ROLLUPS_SQL)
+    conn.execute("DELETE FROM shopper_rollups")
+    conn.execute("INSERT INTO shopper_rollups (shopper_id, order_count, lifetime_spend) " + SHOPPER_ROLLUPS_SQL)
+
+
+# Money columns, converted from REAL pounds to INTEGER pence by migration 9
+MONEY_COLUMNS = {
+    "product_sellers": ("price",),
+    "basket_contents": ("price",),
+    "ordered_products": ("price",),
+    "product_summary": ("min_price", "max_price"),
+    "order_rollups": ("order_value",),
+    "shopper_rollups": ("lifetime_spend",),
+}
+
+
+def _rebuild_in_pence(conn, table, columns):
+    """Recreate a table with its money columns as INTEGER pence, keeping its indexes and triggers.
+
+    SQLite cannot change a column's type in place, so this is the usual
+    create-copy-drop-rename, with the table's own DDL edited rather than
+    restated so every other constraint survives as it was.
+    """
+    ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    dependents = [row[0] for row in conn.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """, (table,))]
+    new_table = f"{table}_pence"
+    ddl, renamed = re.subn(rf'^CREATE TABLE\s+"?{table}"?', f"CREATE TABLE {new_table}", ddl)
+    for column in columns:
+        ddl, changed = re.subn(rf"\b{column}\s+(REAL|INTEGER)\b", f"{column} INTEGER", ddl)
+        if renamed != 1 or changed != 1:
+            raise sqlite3.DatabaseError(f"Unexpected definition for {table}.{column}")
+
+    names = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    values = [f"CAST(ROUND({name} * 100) AS INTEGER)" if name in columns else name for name in names]
+    conn.execute(ddl)
+    conn.execute(f"INSERT INTO {new_table} ({', '.join(names)}) SELECT {', '.join(values)} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for sql in dependents:
+        conn.execute(sql)
+
+
+def convert_money_to_pence(conn):
+    """Store every money column as whole pence, then recompute the rollups from the converted lines"""
+    # Triggers on other tables name tables that are briefly missing while
+    # they are rebuilt; legacy renames do not re-check them
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        for table, columns in MONEY_COLUMNS.items():
+            _rebuild_in_pence(conn, table, columns)
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    # Sums of rounded lines, not rounded sums, so they match the lines exactly
+    rebuild_rollups(conn)
+
+
+# Versioned schema migrations, tracked with PRAGMA user_version
+#
+# Each migration is (version, description, steps). A step is either a SQL
+# string or a callable taking the connection. Versions must only ever be
+# appended - never edit a migration that has shipped.
+def rekey_shopper_emails(conn):
+    """Set every login email key with auth.normalize_email, the same keying a login looks up.
+
+    Where shoppers share a key, one with a password keeps it, then the
+    oldest; the rest get none until they are given an address of their own
+    (auth.issue_setup_code).
+    """
+    from auth import normalize_email
+    rows = conn.execute("""
+        SELECT shopper_id, shopper_email_address FROM shoppers
+        ORDER BY password_hash IS NULL, shopper_id
+    """).fetchall()
+    keys = {}
+    for shopper_id, email in rows:
+        keys.setdefault(normalize_email(email), shopper_id)
+    conn.execute("UPDATE shoppers SET email_key = NULL")
+    conn.executemany("UPDATE shoppers SET email_key = ? WHERE shopper_id = ?",
+                     [(key, shopper_id) for key, shopper_id in keys.items() if key])
+
+
+MIGRATIONS = [
+    (1, "Indexes for the shopper CLI lookups", [
+        """CREATE INDEX IF NOT EXISTS idx_shopper_baskets_shopper_created
+           ON shopper_baskets (shopper_id, basket_created_date_time)""",
+        """CREATE INDEX IF NOT EXISTS idx_shopper_orders_shopper_date
+           ON shopper_orders (shopper_id, order_date)""",
+        """CREATE INDEX IF NOT EXISTS idx_ordered_products_seller
+           ON ordered_products (seller_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_products_category_description
+           ON products (category_id, product_description)""",
+    ]),
+    (2, "Idempotency keys for checkout", [
+        """CREATE TABLE IF NOT EXISTS checkout_requests
+           (shopper_id INTEGER NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            basket_id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL,
+            created_date_time TEXT NOT NULL,
+            PRIMARY KEY (shopper_id, idempotency_key),
+            CONSTRAINT checkout_requests_shoppers_fk FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id),
+            CONSTRAINT checkout_requests_shopper_orders_fk FOREIGN KEY (order_id) REFERENCES shopper_orders(order_id)
+           )""",
+    ]),
+    (3, "Catalog version counter for cache invalidation", [
+        """CREATE TABLE IF NOT EXISTS catalog_version
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+        *_catalog_version_triggers(),
+    ]),
+    (4, "Materialized product summary maintained by triggers", [
+        """CREATE TABLE IF NOT EXISTS product_summary
+           (product_id INTEGER PRIMARY KEY,
+            seller_count INTEGER NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            CONSTRAINT product_summary_products_fk FOREIGN KEY (product_id) REFERENCES products(product_id)
+           )""",
+        """INSERT OR REPLACE INTO product_summary (product_id, seller_count, min_price, max_price)
+           SELECT p.product_id, COUNT(ps.seller_id), MIN(ps.price), MAX(ps.price)
+           FROM products p
+           LEFT JOIN product_sellers ps ON ps.product_id = p.product_id
+           GROUP BY p.product_id""",
+        f"""CREATE TRIGGER IF NOT EXISTS product_sellers_insert_summary
+           AFTER INSERT ON product_sellers
+           BEGIN
+               {_summary_refresh("NEW")}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS product_sellers_update_summary
+           AFTER UPDATE OF product_id, price ON product_sellers
+           BEGIN
+               {_summary_refresh("OLD")}
+               {_summary_refresh("NEW")}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS product_sellers_delete_summary
+           AFTER DELETE ON product_sellers
+           BEGIN
+               {_summary_refresh("OLD")}
+           END""",
+    ]),
+    (5, "Per-order and per-shopper rollups", [
+        """CREATE TABLE IF NOT EXISTS order_rollups
+           (order_id INTEGER PRIMARY KEY,
+            item_count INTEGER NOT NULL,
+            order_value REAL NOT NULL,
+            CONSTRAINT order_rollups_shopper_orders_fk FOREIGN KEY (order_id) REFERENCES shopper_orders(order_id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS shopper_rollups
+           (shopper_id INTEGER PRIMARY KEY,
+            order_count INTEGER NOT NULL,
+            lifetime_spend REAL NOT NULL,
+            CONSTRAINT shopper_rollups_shoppers_fk FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id)
+           )""",
+        rebuild_rollups,
+    ]),
+    (6, "Full-text product search index", [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5
+           (product_description, product_manufacturer, product_model, product_code,
+            content='products', content_rowid='product_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        "INSERT INTO product_search (product_search) VALUES ('rebuild')",
+        """CREATE TRIGGER IF NOT EXISTS products_insert_search
+           AFTER INSERT ON products
+           BEGIN
+               INSERT INTO product_search (rowid, product_description, product_manufacturer, product_model, product_code)
+               VALUES (NEW.product_id, NEW.product_description, NEW.product_manufacturer, NEW.product_model, NEW.product_code);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS products_delete_search
+           AFTER DELETE ON products
+           BEGIN
+               INSERT INTO product_search (product_search, rowid, product_description, product_manufacturer, product_model, product_code)
+               VALUES ('delete', OLD.product_id, OLD.product_description, OLD.product_manufacturer, OLD.product_model, OLD.product_code);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS products_update_search
+           AFTER UPDATE OF product_description, product_manufacturer, product_model, product_code ON products
+           BEGIN
+               INSERT INTO product_search (product_search, rowid, product_description, product_manufacturer, product_model, product_code)
+               VALUES ('delete', OLD.product_id, OLD.product_description, OLD.product_manufacturer, OLD.product_model, OLD.product_code);
+               INSERT INTO product_search (rowid, product_description, product_manufacturer, product_model, product_code)
+               VALUES (NEW.product_id, NEW.product_description, NEW.product_manufacturer, NEW.product_model, NEW.product_code);
+           END""",
+    ]),
+    (7, "Order date index for exports", [
+        """CREATE INDEX IF NOT EXISTS idx_shopper_orders_date_status
+           ON shopper_orders (order_date, order_status)""",
+    ]),
+    (8, "One integer-rated seller review table and rating aggregates", [
+        consolidate_seller_reviews,
+        """CREATE INDEX IF NOT EXISTS idx_seller_reviews_seller_date
+           ON seller_reviews (seller_id, review_date)""",
+        """CREATE INDEX IF NOT EXISTS idx_product_reviews_product_date
+           ON product_reviews (product_id, review_date)""",
+        # Covered by the (product_id, review_date) index
+        "DROP INDEX IF EXISTS idx_product_reviews_product_id",
+        _rating_table("product_ratings", "product_id"),
+        _rating_table("seller_ratings", "seller_id"),
+        _rating_rebuild("product_ratings", "product_id", "product_reviews"),
+        _rating_rebuild("seller_ratings", "seller_id", "seller_reviews"),
+        *_rating_triggers("product_ratings", "product_id", "product_reviews"),
+        *_rating_triggers("seller_ratings", "seller_id", "seller_reviews"),
+        # Seller ratings are shown in the cached seller lists
+        *_catalog_version_triggers(("seller_ratings",)),
+    ]),
+    (9, "Money in integer pence", [
+        convert_money_to_pence,
+    ]),
+    (10, "Login email key and password hashes", [
+        "ALTER TABLE shoppers ADD COLUMN email_key TEXT",
+        "ALTER TABLE shoppers ADD COLUMN password_hash TEXT",
+        rekey_shopper_emails,
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_shoppers_email_key
+           ON shoppers (email_key)""",
+    ]),
+    (11, "Password setup codes", [
+        """CREATE TABLE IF NOT EXISTS password_setup_codes
+           (shopper_id INTEGER PRIMARY KEY,
+            code_hash TEXT NOT NULL,
+            expires_date_time TEXT NOT NULL,
+            CONSTRAINT password_setup_codes_shoppers_fk FOREIGN KEY (shopper_id) REFERENCES shoppers(shopper_id)
+           )""",
+    ]),
+]
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(conn):
+    """Return the migrations that have not been applied yet"""
+    current = schema_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def migrate(conn, verbose=False):
+    """Apply every pending migration, one transaction per version"""
+    applied = []
+    for version, description, steps in pending_migrations(conn):
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check inside the write lock in case another process got here first
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        if verbose:
+            print(f"Applied migration {version}: {description}")
+    return applied
+
+
+if __name__ == "__main__":
+    from database import connect
+    conn = connect()
+    if not migrate(conn, verbose=True):
+        print(f"Schema is up to date (version {schema_version(conn)})")
+    conn.close()
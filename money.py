@@ -0,0 +1,99 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Amounts are whole pence everywhere: in the database (INTEGER columns since
+# migration 9), in Python and in the JSON API. Pounds only appear when an
+# amount is parsed from or shown to a person.
+
+CURRENCY_SYMBOL = "£"
+
+
+class Money(int):
+    """An amount in pence that prints as pounds, e.g. Money(1234) -> £12.34.
+
+    Money is an int, so it goes into SQLite and JSON as the plain number of
+    pence and sums exactly. Adding or subtracting Money, or multiplying it by
+    a quantity, gives Money again.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_pounds(cls, value, exact=False):
+        """Parse pounds (str, int, float or Decimal) to the nearest penny, halves rounded up.
+
+        With exact=True, amounts with fractions of a penny raise ValueError instead.
+        """
+        if isinstance(value, str):
+            value = value.strip().lstrip(CURRENCY_SYMBOL).replace(",", "")
+        try:
+            pounds = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+            pence = (pounds * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError(f"Not an amount of money: {value!r}")
+        if not pence.is_finite():
+            raise ValueError(f"Not an amount of money: {value!r}")
+        if exact and pence != pounds * 100:
+            raise ValueError(f"Not a whole number of pence: {value!r}")
+        return cls(int(pence))
+
+    @property
+    def pence(self):
+        return int(self)
+
+    @property
+    def pounds(self):
+        """The exact amount in pounds as a Decimal"""
+        return Decimal(int(self)).scaleb(-2)
+
+    def __str__(self):
+        sign = "-" if self < 0 else ""
+        pounds, pence = divmod(abs(int(self)), 100)
+        return f"{sign}{CURRENCY_SYMBOL}{pounds}.{pence:02d}"
+
+    def __repr__(self):
+        return f"Money({int(self)})"
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def __add__(self, other):
+        result = int.__add__(self, other)
+        return result if result is NotImplemented else Money(result)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        result = int.__sub__(self, other)
+        return result if result is NotImplemented else Money(result)
+
+    def __rsub__(self, other):
+        result = int.__rsub__(self, other)
+        return result if result is NotImplemented else Money(result)
+
+    def __mul__(self, other):
+        # Only whole quantities keep the result in pence
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int.__mul__(self, other))
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-int(self))
+
+
+def money_or_none(pence):
+    """Money for a nullable pence column"""
+    return None if pence is None else Money(pence)
+
+
+def sql_pounds(expression):
+    """SQL that formats an integer pence expression as '£12.34' (NULL stays NULL)"""
+    return (f"CASE WHEN {expression} IS NOT NULL THEN "
+            f"printf('{CURRENCY_SYMBOL}%d.%02d', ({expression}) / 100, ({expression}) % 100) END")
+
+
+def sql_decimal(expression):
+    """SQL that formats an integer pence expression as an exact decimal string, e.g. '12.34'"""
+    return (f"CASE WHEN {expression} < 0 THEN '-' ELSE '' END || "
+            f"printf('%d.%02d', abs({expression}) / 100, abs({expression}) % 100)")
@@ -1,7 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, font, filedialog
-import sqlite3
 from datetime import datetime
+
+from analytics import (DIMENSIONS, group_labels, grouped_sales, label, load_sales,
+                       sales_summary, status_breakdown)
+from auth import AuthError, get_session_store, log_in, register_shopper, set_password_with_code
+from basket import BasketService
+from catalog import get_catalog_cache
+from data_grid import GridSource, PagedGrid
+from db_worker import DbWorker
+from money import Money, sql_pounds
+from orders import checkout_key, order_history_page, place_order
+from product_import import import_file, import_rows
+from screen_manager import ScreenManager
+from search import search_products
+from shopper_session import get_current_basket
 #from reportlab.lib.pagesizes import letter     #will be used in future versions
 #from reportlab.pdfgen import canvas
 #from reportlab.lib import colors
@@ -9,23 +22,88 @@ from datetime import datetime
 #from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 #from reportlab.lib.units import inch
 
+# Admin grids - rows are paged in from SQL as the user scrolls
+PRODUCTS_GRID = GridSource(
+    "products p LEFT JOIN categories c ON p.category_id = c.category_id "
+    "LEFT JOIN product_summary ps ON ps.product_id = p.product_id",
+    [("ID", "p.product_id", 100),
+     ("Description", "p.product_description", 250),
+     ("Category", "c.category_description", 150),
+     ("Sellers", "IFNULL(ps.seller_count, 0)", 100),
+     ("Price Range", f"CASE WHEN ps.seller_count > 0 "
+                     f"THEN {sql_pounds('ps.min_price')} || ' - ' || {sql_pounds('ps.max_price')} END",
+      150, "ps.min_price")],
+    key="p.product_id",
+    filter_columns=("p.product_description", "p.product_code", "c.category_description"),
+    default_sort=1,
+    not_null=("p.product_description", "IFNULL(ps.seller_count, 0)"))
+
+CUSTOMERS_GRID = GridSource(
+    "shoppers sh LEFT JOIN shopper_rollups r ON r.shopper_id = sh.shopper_id",
+    [("ID", "sh.shopper_id", 80),
+     ("Name", "sh.shopper_first_name || ' ' || sh.shopper_surname", 180),
+     ("Email", "sh.shopper_email_address", 220),
+     ("Account Ref", "sh.shopper_account_ref", 120),
+     ("Date Joined", "sh.date_joined", 120),
+     ("Total Orders", "IFNULL(r.order_count, 0)", 100)],
+    key="sh.shopper_id",
+    filter_columns=("sh.shopper_first_name", "sh.shopper_surname", "sh.shopper_email_address"),
+    default_sort=0,
+    not_null=("sh.shopper_first_name || ' ' || sh.shopper_surname", "sh.shopper_email_address",
+              "sh.shopper_account_ref", "sh.date_joined", "IFNULL(r.order_count, 0)"))
+
+ORDERS_GRID = GridSource(
+    "shopper_orders o JOIN shoppers sh ON o.shopper_id = sh.shopper_id "
+    "LEFT JOIN order_rollups r ON r.order_id = o.order_id",
+    [("Order ID", "o.order_id", 100),
+     ("Customer", "sh.shopper_first_name || ' ' || sh.shopper_surname", 200),
+     ("Date", "o.order_date", 140),
+     ("Total Items", "r.item_count", 100),
+     ("Total Value", sql_pounds("r.order_value"), 120, "r.order_value"),
+     ("Status", "o.order_status", 100)],
+    key="o.order_id",
+    filter_columns=("sh.shopper_first_name", "sh.shopper_surname", "o.order_status"),
+    default_sort=2,
+    not_null=("sh.shopper_first_name || ' ' || sh.shopper_surname", "o.order_date", "o.order_status"))
+
+# Largest groups shown on the reports screen
+REPORT_ROWS = 500
+
+
 class OnlineShoppingApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Online Shopping Application V2")
         self.root.geometry("1300x700")
         
-        # Configure styles
+        # Configure styles and fonts (once, shared by every screen)
         self.setup_styles()
         
         # Variables
+        self.session = None
         self.shopper_id = None
         self.shopper_details = {}
         self.basket_id = None
+        self.baskets = None         # the shopper's BasketService, used only on the worker
         self.is_admin = False
-        self.conn = None
+        self.loading_labels = {}
+        
+        # All database work runs on this worker, never on the Tk thread
+        self.db = DbWorker(self.root, on_busy=self.show_busy)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
+        # Screens are built the first time they are shown and then raised
+        self.screens = ScreenManager(self.root, bg=self.bg_color)
+        self.screens.container.pack(fill=tk.BOTH, expand=True)
+        self.screens.register("welcome", self.build_welcome_screen)
+        self.screens.register("login", self.build_login_screen)
+        self.screens.register("admin_login", self.build_admin_login)
+        self.screens.register("admin", self.build_admin_panel)
+        self.screens.register("reports", self.build_reports_screen)
+        self.screens.register("register", self.build_register_screen)
+        self.screens.register("set_password", self.build_set_password_screen)
+        self.screens.register("main", self.build_main_screen)
         
-        # Initialize database connection
         self.create_connection()
         
         # Create initial screen with login/register options
@@ -45,6 +123,22 @@ class OnlineShoppingApp:
         
         self.root.configure(bg=self.bg_color)
         
+        self.fonts = {
+            'app_title': font.Font(family="Helvetica", size=28, weight="bold"),
+            'screen_title': font.Font(family="Helvetica", size=24, weight="bold"),
+            'banner': font.Font(family="Helvetica", size=20, weight="bold"),
+            'window_title': font.Font(family="Helvetica", size=18, weight="bold"),
+            'section': font.Font(family="Helvetica", size=16, weight="bold"),
+            'big_button': font.Font(family="Helvetica", size=14, weight="bold"),
+            'subtitle': font.Font(family="Helvetica", size=14),
+            'strong': font.Font(family="Helvetica", size=12, weight="bold"),
+            'normal': font.Font(family="Helvetica", size=12),
+            'label': font.Font(family="Helvetica", size=11, weight="bold"),
+            'detail': font.Font(family="Helvetica", size=11),
+            'small': font.Font(family="Helvetica", size=10),
+            'status': font.Font(family="Arial", size=10, weight="bold"),
+        }
+        
         style.configure("Primary.TButton",
                        background=self.primary_color,
                        foreground="white",
@@ -71,39 +165,75 @@ class OnlineShoppingApp:
                        padding=(10, 8))
         
     def create_connection(self):
-        """Establish database connection and ensure tables exist"""
-        try:
-            self.conn = sqlite3.connect('shopping_app.db')
-            self.conn.row_factory = sqlite3.Row
-            self.show_connection_status()
-        except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Failed to connect: {e}")
+        """Check the worker's database connection without blocking the window"""
+        self.db.submit(lambda conn: conn.execute("SELECT 1").fetchone(),
+                       lambda result: self.show_connection_status(),
+                       lambda error: messagebox.showerror("Database Error", f"Failed to connect: {error}"))
             
     def show_connection_status(self):
         """Display connection successful message"""
         status_label = tk.Label(self.root, 
                                text="✓ Database Connection Successful", 
                                fg="green", 
-                               font=("Arial", 10, "bold"),
+                               font=self.fonts['status'],
                                bg=self.bg_color)
-        status_label.pack(pady=5)
+        status_label.place(relx=0.5, y=5, anchor='n')
         self.root.after(2000, status_label.destroy)
         
+    def show_busy(self, busy):
+        """Show the busy cursor while database requests are outstanding"""
+        self.root.config(cursor="watch" if busy else "")
+        
+    def show_db_error(self, error):
+        """Report a failed database request"""
+        messagebox.showerror("Database Error", str(error))
+        
+    def run_db(self, func, on_done, parent=None):
+        """Run func(conn) on the worker for the current screen, with a loading message in parent"""
+        loading = None
+        if parent is not None:
+            # Screens are kept, so drop the label a cancelled load left behind
+            stale = self.loading_labels.pop(parent, None)
+            if stale is not None:
+                stale.destroy()
+            loading = self.loading_labels[parent] = tk.Label(parent, text="Loading...", bg="white", fg="#7f8c8d")
+            loading.pack(pady=5)
+        
+        def done(result):
+            if loading is not None:
+                self.loading_labels.pop(parent, None)
+                loading.destroy()
+            on_done(result)
+        
+        def failed(error):
+            if loading is not None:
+                self.loading_labels.pop(parent, None)
+                loading.destroy()
+            self.show_db_error(error)
+        
+        return self.db.submit(func, done, failed, tag="screen")
+        
+    def show_screen(self, name):
+        """Switch to a top-level screen, cancelling anything the old one was loading"""
+        self.db.cancel("screen")
+        self.db.cancel("search")
+        return self.screens.show(name)
+        
     def create_welcome_screen(self):
+        """Show the welcome screen with login and register options"""
+        self.show_screen("welcome")
+        
+    def build_welcome_screen(self, frame):
         """Create welcome screen with login and register options"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        main_frame = tk.Frame(self.root, bg=self.bg_color)
+        main_frame = tk.Frame(frame, bg=self.bg_color)
         main_frame.place(relx=0.5, rely=0.5, anchor='center')
         
-        title_font = font.Font(family="Helvetica", size=28, weight="bold")
         title_label = tk.Label(main_frame, text="Orinoco Shopping System V2",
-                               font=title_font, bg=self.bg_color, fg=self.primary_color)
+                               font=self.fonts['app_title'], bg=self.bg_color, fg=self.primary_color)
         title_label.grid(row=0, column=0, columnspan=2, pady=30)
         
         subtitle_label = tk.Label(main_frame, text="Your One-Stop Shopping Solution",
-                                 font=("Helvetica", 14), bg=self.bg_color, fg="#7f8c8d")
+                                 font=self.fonts['subtitle'], bg=self.bg_color, fg="#7f8c8d")
         subtitle_label.grid(row=1, column=0, columnspan=2, pady=(0, 30))
         
         button_frame = tk.Frame(main_frame, bg=self.bg_color)
@@ -112,7 +242,7 @@ class OnlineShoppingApp:
         login_btn = tk.Button(button_frame, text="Login", 
                              command=self.show_login_screen,
                              bg=self.primary_color, fg="white",
-                             font=("Helvetica", 12, "bold"),
+                             font=self.fonts['strong'],
                              padx=40, pady=15,
                              relief=tk.FLAT, cursor="hand2")
         login_btn.grid(row=0, column=0, padx=20)
@@ -120,7 +250,7 @@ class OnlineShoppingApp:
         register_btn = tk.Button(button_frame, text="Register New Customer", 
                                 command=self.show_register_screen,
                                 bg=self.success_color, fg="white",
-                                font=("Helvetica", 12, "bold"),
+                                font=self.fonts['strong'],
                                 padx=25, pady=15,
                                 relief=tk.FLAT, cursor="hand2")
         register_btn.grid(row=0, column=1, padx=20)
@@ -128,34 +258,34 @@ class OnlineShoppingApp:
         admin_btn = tk.Button(main_frame, text="Admin Login", 
                              command=self.show_admin_login,
                              bg=self.info_color, fg="white",
-                             font=("Helvetica", 10),
+                             font=self.fonts['small'],
                              padx=20, pady=8,
                              relief=tk.FLAT, cursor="hand2")
         admin_btn.grid(row=3, column=0, columnspan=2, pady=30)
         
     def show_login_screen(self):
         """Show login screen"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        login_frame = tk.Frame(self.root, bg=self.bg_color)
+        self.show_screen("login")
+        
+    def build_login_screen(self, frame):
+        """Create the customer login screen"""
+        login_frame = tk.Frame(frame, bg=self.bg_color)
         login_frame.place(relx=0.5, rely=0.5, anchor='center')
         
-        title_font = font.Font(family="Helvetica", size=24, weight="bold")
         title_label = tk.Label(login_frame, text="Customer Login",
-                               font=title_font, bg=self.bg_color, fg=self.primary_color)
+                               font=self.fonts['screen_title'], bg=self.bg_color, fg=self.primary_color)
         title_label.grid(row=0, column=0, columnspan=2, pady=20)
         
         tk.Label(login_frame, text="Email:", bg=self.bg_color,
-                font=("Helvetica", 12)).grid(row=1, column=0, padx=10, pady=10, sticky='e')
+                font=self.fonts['normal']).grid(row=1, column=0, padx=10, pady=10, sticky='e')
         
-        self.login_email_entry = tk.Entry(login_frame, font=("Helvetica", 12), width=25)
+        self.login_email_entry = tk.Entry(login_frame, font=self.fonts['normal'], width=25)
         self.login_email_entry.grid(row=1, column=1, padx=10, pady=10)
         
         tk.Label(login_frame, text="Password:", bg=self.bg_color,
-                font=("Helvetica", 12)).grid(row=2, column=0, padx=10, pady=10, sticky='e')
+                font=self.fonts['normal']).grid(row=2, column=0, padx=10, pady=10, sticky='e')
         
-        self.login_password_entry = tk.Entry(login_frame, font=("Helvetica", 12), width=25, show="*")
+        self.login_password_entry = tk.Entry(login_frame, font=self.fonts['normal'], width=25, show="*")
         self.login_password_entry.grid(row=2, column=1, padx=10, pady=10)
         
         button_frame = tk.Frame(login_frame, bg=self.bg_color)
@@ -169,27 +299,37 @@ class OnlineShoppingApp:
                              command=self.create_welcome_screen)
         back_btn.pack(side=tk.LEFT, padx=5)
         
+        setup_btn = tk.Button(login_frame, text="Have a password setup code? Set your password",
+                              command=lambda: self.show_screen("set_password"),
+                              bg=self.bg_color, fg=self.info_color, font=self.fonts['small'],
+                              relief=tk.FLAT, cursor="hand2")
+        setup_btn.grid(row=4, column=0, columnspan=2)
+        
         self.login_email_entry.bind('<Return>', lambda e: self.login())
         self.login_password_entry.bind('<Return>', lambda e: self.login())
-        self.login_email_entry.focus()
+        
+        def refresh():
+            self.login_password_entry.delete(0, tk.END)
+            self.login_email_entry.focus()
+        return refresh
         
     def show_admin_login(self):
         """Show admin login screen"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        login_frame = tk.Frame(self.root, bg=self.bg_color)
+        self.show_screen("admin_login")
+        
+    def build_admin_login(self, frame):
+        """Create the admin login screen"""
+        login_frame = tk.Frame(frame, bg=self.bg_color)
         login_frame.place(relx=0.5, rely=0.5, anchor='center')
         
-        title_font = font.Font(family="Helvetica", size=24, weight="bold")
         title_label = tk.Label(login_frame, text="Admin Login",
-                               font=title_font, bg=self.bg_color, fg=self.info_color)
+                               font=self.fonts['screen_title'], bg=self.bg_color, fg=self.info_color)
         title_label.grid(row=0, column=0, columnspan=2, pady=20)
         
         tk.Label(login_frame, text="Admin Code:", bg=self.bg_color,
-                font=("Helvetica", 12)).grid(row=1, column=0, padx=10, pady=10, sticky='e')
+                font=self.fonts['normal']).grid(row=1, column=0, padx=10, pady=10, sticky='e')
         
-        self.admin_code_entry = tk.Entry(login_frame, font=("Helvetica", 12), width=25, show="*")
+        self.admin_code_entry = tk.Entry(login_frame, font=self.fonts['normal'], width=25, show="*")
         self.admin_code_entry.grid(row=1, column=1, padx=10, pady=10)
         
         button_frame = tk.Frame(login_frame, bg=self.bg_color)
@@ -204,7 +344,11 @@ class OnlineShoppingApp:
         back_btn.pack(side=tk.LEFT, padx=5)
         
         self.admin_code_entry.bind('<Return>', lambda e: self.admin_login())
-        self.admin_code_entry.focus()
+        
+        def refresh():
+            self.admin_code_entry.delete(0, tk.END)
+            self.admin_code_entry.focus()
+        return refresh
         
     def admin_login(self):
         """Process admin login"""
@@ -218,25 +362,26 @@ class OnlineShoppingApp:
             
     def show_admin_panel(self):
         """Show admin control panel"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        header = tk.Frame(self.root, bg=self.info_color, height=80)
+        self.show_screen("admin")
+        
+    def build_admin_panel(self, frame):
+        """Create the admin control panel"""
+        header = tk.Frame(frame, bg=self.info_color, height=80)
         header.pack(fill=tk.X)
         header.pack_propagate(False)
         
         header_label = tk.Label(header, text="Admin Control Panel",
-                               font=("Helvetica", 20, "bold"),
+                               font=self.fonts['banner'],
                                bg=self.info_color, fg="white")
         header_label.pack(pady=20)
         
         logout_btn = tk.Button(header, text="Logout", command=self.logout,
                               bg=self.danger_color, fg="white",
-                              font=("Helvetica", 10), padx=15, pady=5,
+                              font=self.fonts['small'], padx=15, pady=5,
                               relief=tk.FLAT, cursor="hand2")
         logout_btn.place(relx=0.95, rely=0.5, anchor='e')
         
-        content = tk.Frame(self.root, bg="white")
+        content = tk.Frame(frame, bg="white")
         content.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         options_frame = tk.Frame(content, bg="white")
@@ -245,7 +390,7 @@ class OnlineShoppingApp:
         add_product_btn = tk.Button(options_frame, text="Add New Product",
                                    command=self.show_add_product_form,
                                    bg=self.success_color, fg="white",
-                                   font=("Helvetica", 14, "bold"),
+                                   font=self.fonts['big_button'],
                                    padx=30, pady=20,
                                    relief=tk.FLAT, cursor="hand2",
                                    width=20)
@@ -254,7 +399,7 @@ class OnlineShoppingApp:
         view_products_btn = tk.Button(options_frame, text="View All Products",
                                      command=self.show_all_products,
                                      bg=self.primary_color, fg="white",
-                                     font=("Helvetica", 14, "bold"),
+                                     font=self.fonts['big_button'],
                                      padx=30, pady=20,
                                      relief=tk.FLAT, cursor="hand2",
                                      width=20)
@@ -263,7 +408,7 @@ class OnlineShoppingApp:
         view_customers_btn = tk.Button(options_frame, text="View All Customers",
                                       command=self.show_all_customers,
                                       bg=self.secondary_color, fg="white",
-                                      font=("Helvetica", 14, "bold"),
+                                      font=self.fonts['big_button'],
                                       padx=30, pady=20,
                                       relief=tk.FLAT, cursor="hand2",
                                       width=20)
@@ -272,12 +417,30 @@ class OnlineShoppingApp:
         view_orders_btn = tk.Button(options_frame, text="View All Orders",
                                    command=self.show_all_orders_admin,
                                    bg=self.info_color, fg="white",
-                                   font=("Helvetica", 14, "bold"),
+                                   font=self.fonts['big_button'],
                                    padx=30, pady=20,
                                    relief=tk.FLAT, cursor="hand2",
                                    width=20)
         view_orders_btn.grid(row=1, column=1, padx=20, pady=10)
         
+        import_btn = tk.Button(options_frame, text="Import Products",
+                              command=self.import_products,
+                              bg=self.success_color, fg="white",
+                              font=self.fonts['big_button'],
+                              padx=30, pady=20,
+                              relief=tk.FLAT, cursor="hand2",
+                              width=20)
+        import_btn.grid(row=2, column=0, padx=20, pady=10)
+        
+        reports_btn = tk.Button(options_frame, text="Sales Reports",
+                               command=self.show_reports,
+                               bg=self.primary_color, fg="white",
+                               font=self.fonts['big_button'],
+                               padx=30, pady=20,
+                               relief=tk.FLAT, cursor="hand2",
+                               width=20)
+        reports_btn.grid(row=2, column=1, padx=20, pady=10)
+        
     def show_add_product_form(self):
         """Show form to add new product"""
         add_window = tk.Toplevel(self.root)
@@ -286,16 +449,19 @@ class OnlineShoppingApp:
         add_window.configure(bg="white")
         
         tk.Label(add_window, text="Add New Product",
-                font=("Helvetica", 18, "bold"), bg="white",
+                font=self.fonts['window_title'], bg="white",
                 fg=self.primary_color).pack(pady=20)
         
         form_frame = tk.Frame(add_window, bg="white")
         form_frame.pack(padx=30, pady=20)
         
         fields = [
-            ("Product Description:", "product_desc"),
-            ("Category:", "category"),
-            ("Seller:", "seller"),
+            ("Product Code:", "product_code"),
+            ("Product Description:", "description"),
+            ("Manufacturer:", "manufacturer"),
+            ("Model:", "model"),
+            ("Category Code:", "category_code"),
+            ("Seller Account Ref:", "seller_ref"),
             ("Price (£):", "price")
         ]
         
@@ -308,17 +474,175 @@ class OnlineShoppingApp:
             entries[field] = entry
         
         def save_product():
-            messagebox.showinfo("Success", "Product saved successfully!")
-            add_window.destroy()
+            row = {field: entry.get() for field, entry in entries.items()}
+            
+            def saved(report):
+                if report.reject_samples:
+                    messagebox.showerror("Error", report.reject_samples[0][1], parent=add_window)
+                    return
+                messagebox.showinfo("Success", "Product saved successfully!")
+                add_window.destroy()
+            
+            # Goes through the importer so a single product is validated the same way as a file
+            self.db.submit(lambda conn: import_rows(conn, [(1, row)]), saved, self.show_db_error)
         
         save_btn = tk.Button(add_window, text="Save Product",
                             command=save_product,
                             bg=self.success_color, fg="white",
-                            font=("Helvetica", 12, "bold"),
+                            font=self.fonts['strong'],
                             padx=20, pady=10,
                             relief=tk.FLAT, cursor="hand2")
         save_btn.pack(pady=20)
         
+    def import_products(self):
+        """Bulk import products and seller offers from a CSV or JSONL file"""
+        path = filedialog.askopenfilename(title="Import Products",
+                                          filetypes=[("Product files", "*.csv *.jsonl"), ("All files", "*")])
+        if not path:
+            return
+        
+        def imported(report):
+            lines = [report.summary()]
+            lines += [f"line {line_no}: {reason}" for line_no, reason in report.reject_samples[:10]]
+            messagebox.showinfo("Import Products", "\n".join(lines))
+        
+        # Untagged, so leaving the admin screen does not abandon a half-finished import
+        self.db.submit(lambda conn: import_file(conn, path), imported,
+                       lambda error: messagebox.showerror("Error", f"Import failed: {error}"))
+        
+    def show_reports(self):
+        """Show sales reports for the admin"""
+        self.show_screen("reports")
+        
+    def build_reports_screen(self, frame):
+        """Create the sales reports screen.
+        
+        Order lines for the chosen dates are loaded once into columns; changing
+        the grouping recomputes from those columns instead of querying again.
+        """
+        header = tk.Frame(frame, bg=self.info_color, height=80)
+        header.pack(fill=tk.X)
+        header.pack_propagate(False)
+        
+        tk.Label(header, text="Sales Reports", font=self.fonts['banner'],
+                bg=self.info_color, fg="white").pack(pady=20)
+        
+        back_btn = tk.Button(header, text="Back", command=self.show_admin_panel,
+                            bg=self.secondary_color, fg="white",
+                            font=self.fonts['small'], padx=15, pady=5,
+                            relief=tk.FLAT, cursor="hand2")
+        back_btn.place(relx=0.95, rely=0.5, anchor='e')
+        
+        content = tk.Frame(frame, bg="white")
+        content.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        filter_frame = tk.Frame(content, bg="white")
+        filter_frame.pack(fill=tk.X)
+        
+        tk.Label(filter_frame, text="From (YYYY-MM-DD):", bg="white").pack(side=tk.LEFT, padx=5)
+        from_entry = tk.Entry(filter_frame, font=self.fonts['normal'], width=12)
+        from_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(filter_frame, text="To:", bg="white").pack(side=tk.LEFT, padx=5)
+        to_entry = tk.Entry(filter_frame, font=self.fonts['normal'], width=12)
+        to_entry.pack(side=tk.LEFT, padx=5)
+        
+        load_btn = ttk.Button(filter_frame, text="Load", style="Info.TButton")
+        load_btn.pack(side=tk.LEFT, padx=10)
+        
+        tk.Label(filter_frame, text="Group by:", bg="white").pack(side=tk.LEFT, padx=5)
+        group_var = tk.StringVar(value=DIMENSIONS[0])
+        group_box = ttk.Combobox(filter_frame, textvariable=group_var, values=DIMENSIONS,
+                                 state="readonly", width=10)
+        group_box.pack(side=tk.LEFT, padx=5)
+        
+        summary_label = tk.Label(content, text="", font=self.fonts['strong'], bg="white", anchor='w')
+        summary_label.pack(fill=tk.X, pady=10)
+        
+        tables = tk.Frame(content, bg="white")
+        tables.pack(fill=tk.BOTH, expand=True)
+        
+        group_columns = ("Revenue", "Units", "Orders", "Avg Order")
+        group_tree = ttk.Treeview(tables, columns=group_columns, height=15)
+        group_tree.column("#0", width=300)
+        for col in group_columns:
+            group_tree.heading(col, text=col)
+            group_tree.column(col, width=110, anchor='e')
+        group_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
+        
+        status_columns = ("Lines", "Units", "Value")
+        status_tree = ttk.Treeview(tables, columns=status_columns, height=15)
+        status_tree.heading("#0", text="Status")
+        status_tree.column("#0", width=160)
+        for col in status_columns:
+            status_tree.heading(col, text=col)
+            status_tree.column(col, width=100, anchor='e')
+        status_tree.pack(side=tk.LEFT, fill=tk.BOTH)
+        
+        # The loaded lines and the group labels for them
+        state = {'sales': None, 'labels': {}}
+        
+        def show_groups(result):
+            key, report = result
+            group_tree.delete(*group_tree.get_children())
+            group_tree.heading("#0", text=key.capitalize())
+            labels = state['labels'].get(key, {})
+            for row in report[:REPORT_ROWS]:
+                group_tree.insert("", tk.END, text=label(labels, key, row['key']),
+                                  values=(str(row['revenue']), row['units'], row['orders'],
+                                          str(row['average_order_value'])))
+            if len(report) > REPORT_ROWS:
+                group_tree.insert("", tk.END, text=f"... {len(report) - REPORT_ROWS} smaller groups")
+        
+        def regroup(event=None):
+            sales, key = state['sales'], group_var.get()
+            if sales is not None:
+                # The columns are already loaded; only the group-by runs on the worker
+                self.run_db(lambda conn: (key, grouped_sales(sales, key)), show_groups, content)
+        
+        def show_loaded(result):
+            state['sales'], state['labels'], summary, breakdowns = result
+            summary_label.config(
+                text=f"Revenue {summary['revenue']} from {summary['orders']} orders, "
+                     f"{summary['units']} units, average order {summary['average_order_value']} "
+                     f"({summary['lines']} lines loaded in {state['sales'].load_seconds:.1f}s)")
+            status_tree.delete(*status_tree.get_children())
+            for title, rows in breakdowns:
+                parent = status_tree.insert("", tk.END, text=title, open=True)
+                for row in rows:
+                    status_tree.insert(parent, tk.END, text=row['status'],
+                                       values=(row['lines'], row['units'], str(row['value'])))
+            regroup()
+        
+        def load():
+            filters = (from_entry.get().strip() or None, to_entry.get().strip() or None)
+            for value in filters:
+                if value is not None:
+                    try:
+                        datetime.strptime(value, "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showerror("Error", f"Dates must be YYYY-MM-DD, not {value}")
+                        return
+            
+            def load_reports(conn):
+                sales = load_sales(conn, *filters)
+                labels = {key: group_labels(conn, key) for key in DIMENSIONS}
+                breakdowns = [("Line status", status_breakdown(sales, 'line_status')),
+                              ("Order status", status_breakdown(sales, 'order_status'))]
+                return sales, labels, sales_summary(sales), breakdowns
+            
+            state['sales'] = None
+            group_tree.delete(*group_tree.get_children())
+            self.run_db(load_reports, show_loaded, content)
+        
+        load_btn.config(command=load)
+        group_box.bind("<<ComboboxSelected>>", regroup)
+        
+        def refresh():
+            # Keep what was loaded; a load cancelled by leaving the screen starts again
+            if state['sales'] is None:
+                load()
+        return refresh
+        
     def show_all_products(self):
         """Display all products for admin"""
         products_window = tk.Toplevel(self.root)
@@ -327,34 +651,11 @@ class OnlineShoppingApp:
         products_window.configure(bg="white")
         
         tk.Label(products_window, text="All Products",
-                font=("Helvetica", 18, "bold"), bg="white",
+                font=self.fonts['window_title'], bg="white",
                 fg=self.primary_color).pack(pady=10)
         
-        tree_frame = tk.Frame(products_window, bg="white")
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
-        
-        columns = ("ID", "Description", "Category", "Sellers", "Price Range")
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
-                           yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        vsb.config(command=tree.yview)
-        hsb.config(command=tree.xview)
-        
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=150)
-        
-        tree.column("Description", width=250)
-        
-        tree.grid(row=0, column=0, sticky='nsew')
-        vsb.grid(row=0, column=1, sticky='ns')
-        hsb.grid(row=1, column=0, sticky='ew')
-        
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
+        grid = PagedGrid(products_window, PRODUCTS_GRID, worker=self.db, bg="white")
+        grid.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
     def show_all_customers(self):
         """Display all customers for admin"""
@@ -364,35 +665,11 @@ class OnlineShoppingApp:
         customers_window.configure(bg="white")
         
         tk.Label(customers_window, text="All Customers",
-                font=("Helvetica", 18, "bold"), bg="white",
+                font=self.fonts['window_title'], bg="white",
                 fg=self.primary_color).pack(pady=10)
         
-        tree_frame = tk.Frame(customers_window, bg="white")
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
-        
-        columns = ("ID", "Name", "Email", "Phone", "Address", "Total Orders")
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
-                           yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        vsb.config(command=tree.yview)
-        hsb.config(command=tree.xview)
-        
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=120)
-        
-        tree.column("Email", width=200)
-        tree.column("Address", width=250)
-        
-        tree.grid(row=0, column=0, sticky='nsew')
-        vsb.grid(row=0, column=1, sticky='ns')
-        hsb.grid(row=1, column=0, sticky='ew')
-        
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
+        grid = PagedGrid(customers_window, CUSTOMERS_GRID, worker=self.db, bg="white")
+        grid.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
     def show_all_orders_admin(self):
         """Display all orders for admin"""
@@ -402,42 +679,20 @@ class OnlineShoppingApp:
         orders_window.configure(bg="white")
         
         tk.Label(orders_window, text="All Orders",
-                font=("Helvetica", 18, "bold"), bg="white",
+                font=self.fonts['window_title'], bg="white",
                 fg=self.primary_color).pack(pady=10)
         
-        tree_frame = tk.Frame(orders_window, bg="white")
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
-        
-        columns = ("Order ID", "Customer", "Date", "Total Items", "Total Value", "Status")
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
-                           yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        vsb.config(command=tree.yview)
-        hsb.config(command=tree.xview)
-        
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=140)
-        
-        tree.column("Customer", width=200)
-        
-        tree.grid(row=0, column=0, sticky='nsew')
-        vsb.grid(row=0, column=1, sticky='ns')
-        hsb.grid(row=1, column=0, sticky='ew')
-        
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
+        grid = PagedGrid(orders_window, ORDERS_GRID, worker=self.db, bg="white")
+        grid.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
     def show_register_screen(self):
         """Show registration screen for new customers"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        canvas = tk.Canvas(self.root, bg=self.bg_color)
-        scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=canvas.yview)
+        self.show_screen("register")
+        
+    def build_register_screen(self, frame):
+        """Create the registration screen"""
+        canvas = tk.Canvas(frame, bg=self.bg_color)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
         scrollable_frame = tk.Frame(canvas, bg=self.bg_color)
         
         scrollable_frame.bind(
@@ -451,9 +706,8 @@ class OnlineShoppingApp:
         register_frame = tk.Frame(scrollable_frame, bg=self.bg_color)
         register_frame.pack(pady=30)
         
-        title_font = font.Font(family="Helvetica", size=24, weight="bold")
         title_label = tk.Label(register_frame, text="Customer Registration",
-                               font=title_font, bg=self.bg_color, fg=self.primary_color)
+                               font=self.fonts['screen_title'], bg=self.bg_color, fg=self.primary_color)
         title_label.grid(row=0, column=0, columnspan=2, pady=20)
         
         fields = [
@@ -461,9 +715,7 @@ class OnlineShoppingApp:
             ("Last Name:", "surname", False),
             ("Email:", "email", False),
             ("Password:", "password", True),
-            ("Confirm Password:", "confirm_password", True),
-            ("Phone:", "phone", False),
-            ("Address:", "address", False)
+            ("Confirm Password:", "confirm_password", True)
         ]
         
         self.register_entries = {}
@@ -488,26 +740,101 @@ class OnlineShoppingApp:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-    def register_customer(self):
-        """Process customer registration"""
-        try:
-            data = {field: self.register_entries[field].get().strip() for field in self.register_entries}
-            
-            if not all([data['first_name'], data['email'], data['password']]):
-                messagebox.showerror("Error", "Please fill all required fields")
-                return
+        def refresh():
+            for entry in self.register_entries.values():
+                entry.delete(0, tk.END)
+            self.register_entries['first_name'].focus()
+        return refresh
+        
+    def build_set_password_screen(self, frame):
+        """Create the screen where a shopper redeems a password setup code"""
+        setup_frame = tk.Frame(frame, bg=self.bg_color)
+        setup_frame.place(relx=0.5, rely=0.5, anchor='center')
+        
+        title_label = tk.Label(setup_frame, text="Set Your Password",
+                               font=self.fonts['screen_title'], bg=self.bg_color, fg=self.primary_color)
+        title_label.grid(row=0, column=0, columnspan=2, pady=20)
+        
+        fields = [
+            ("Email:", "email", False),
+            ("Setup Code:", "code", False),
+            ("New Password:", "password", True),
+            ("Confirm Password:", "confirm_password", True)
+        ]
+        
+        self.setup_entries = {}
+        
+        for i, (label, field, is_password) in enumerate(fields, start=1):
+            tk.Label(setup_frame, text=label, bg=self.bg_color,
+                    font=self.fonts['normal']).grid(row=i, column=0, padx=10, pady=10, sticky='e')
+            entry = tk.Entry(setup_frame, font=self.fonts['normal'], width=25, show="*" if is_password else "")
+            entry.grid(row=i, column=1, padx=10, pady=10)
+            self.setup_entries[field] = entry
+        
+        button_frame = tk.Frame(setup_frame, bg=self.bg_color)
+        button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=20)
+        
+        save_btn = ttk.Button(button_frame, text="Set Password", style="Primary.TButton",
+                             command=self.set_password)
+        save_btn.pack(side=tk.LEFT, padx=5)
+        
+        back_btn = ttk.Button(button_frame, text="Back", 
+                             command=self.show_login_screen)
+        back_btn.pack(side=tk.LEFT, padx=5)
+        
+        def refresh():
+            for entry in self.setup_entries.values():
+                entry.delete(0, tk.END)
+            self.setup_entries['email'].focus()
+        return refresh
+        
+    def set_password(self):
+        """Redeem the setup code on the worker, then log the shopper straight in"""
+        data = {field: self.setup_entries[field].get() for field in self.setup_entries}
+        
+        if not all([data['email'].strip(), data['code'].strip(), data['password']]):
+            messagebox.showerror("Error", "Please fill all required fields")
+            return
+        
+        if data['password'] != data['confirm_password']:
+            messagebox.showerror("Error", "Passwords don't match")
+            return
+        
+        def redeem(conn):
+            set_password_with_code(conn, data['email'], data['code'], data['password'])
+            return self.open_shopper(conn, log_in(conn, data['email'], data['password']))
+        
+        self.db.submit(redeem, lambda result: self.start_session(*result), self.show_auth_error, tag="screen")
             
-            if data['password'] != data['confirm_password']:
-                messagebox.showerror("Error", "Passwords don't match")
-                return
+    def show_auth_error(self, error):
+        """Show why a login or registration was refused (or that the database failed)"""
+        if isinstance(error, AuthError):
+            messagebox.showerror("Error", str(error))
+        else:
+            self.show_db_error(error)
             
+    def register_customer(self):
+        """Create the shopper's account on the worker (password hashing is deliberately slow)"""
+        data = {field: self.register_entries[field].get() for field in self.register_entries}
+        
+        if not all([data['first_name'].strip(), data['surname'].strip(), data['email'].strip(), data['password']]):
+            messagebox.showerror("Error", "Please fill all required fields")
+            return
+        
+        if data['password'] != data['confirm_password']:
+            messagebox.showerror("Error", "Passwords don't match")
+            return
+        
+        def registered(shopper_id):
             messagebox.showinfo("Success", "Registration successful! Please login.")
-            self.create_welcome_screen()
-        except Exception as e:
-            messagebox.showerror("Error", f"Registration failed: {e}")
+            self.show_login_screen()
+        
+        self.db.submit(lambda conn: register_shopper(conn, data['first_name'], data['surname'],
+                                                     data['email'], data['password']),
+                       registered, self.show_auth_error, tag="screen")
             
     def login(self):
-        """Handle user login"""
+        """Check the email and password on the worker, then start the shopper's session"""
         email = self.login_email_entry.get().strip()
         password = self.login_password_entry.get()
         
@@ -515,73 +842,87 @@ class OnlineShoppingApp:
             messagebox.showerror("Error", "Please enter email and password")
             return
         
-        self.shopper_id = 1
-        self.shopper_details = {
-            'first_name': 'John',
-            'surname': 'Doe',
-            'email': email,
-            'phone': '01234567890',
-            'address': '123 Main Street'
-        }
+        self.db.submit(lambda conn: self.open_shopper(conn, log_in(conn, email, password)), lambda result: self.start_session(*result), self.show_auth_error, tag="screen")
         
-        self.basket_id = 1
-        self.create_main_screen()
+    def open_shopper(self, conn, session):
+        """Worker side of a login: the shopper's current basket and one basket cache for the session"""
+        return session, get_current_basket(conn, session.shopper_id), BasketService(conn)
         
-    def get_current_basket(self):
-        """Get current basket for the shopper"""
-        return 1
+    def start_session(self, session, basket_id, baskets):
+        """Open the main screen for a logged-in shopper"""
+        self.session = session
+        self.shopper_id = session.shopper_id
+        self.shopper_details = dict(session.shopper)
+        self.basket_id = basket_id
+        self.baskets = baskets
+        self.create_main_screen()
         
     def create_main_screen(self):
+        """Show the main application screen for the logged-in shopper"""
+        self.show_screen("main")
+        
+    def build_main_screen(self, frame):
         """Create main application screen"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-            
-        self.create_header()
+        self.create_header(frame)
         
-        profile_frame = tk.Frame(self.root, bg="white", relief=tk.RAISED, bd=1)
+        profile_frame = tk.Frame(frame, bg="white", relief=tk.RAISED, bd=1)
         profile_frame.pack(fill=tk.X, padx=20, pady=10)
         
         tk.Label(profile_frame, text="Customer Profile",
-                font=("Helvetica", 14, "bold"), bg="white",
+                font=self.fonts['big_button'], bg="white",
                 fg=self.primary_color).pack(pady=10)
         
         details_frame = tk.Frame(profile_frame, bg="white")
         details_frame.pack(padx=20, pady=10)
         
-        profile_info = [
-            ("Name:", f"{self.shopper_details['first_name']} {self.shopper_details['surname']}"),
-            ("Email:", self.shopper_details['email']),
-            ("Phone:", self.shopper_details['phone'] or 'Not provided'),
-            ("Address:", self.shopper_details['address'] or 'Not provided')
-        ]
-        
-        for i, (label, value) in enumerate(profile_info):
-            tk.Label(details_frame, text=label, font=("Helvetica", 11, "bold"), bg="white").grid(row=i, column=0, sticky='e', padx=10)
-            tk.Label(details_frame, text=value, bg="white").grid(row=i, column=1, sticky='w', padx=10)
-        
-        self.main_content = tk.Frame(self.root, bg="white")
-        self.main_content.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        self.show_welcome()
-        
-    def create_header(self):
+        self.profile_labels = []
+        for i, label in enumerate(("Name:", "Email:", "Account Ref:", "Member Since:")):
+            tk.Label(details_frame, text=label, font=self.fonts['label'], bg="white").grid(row=i, column=0, sticky='e', padx=10)
+            value_label = tk.Label(details_frame, text="", bg="white")
+            value_label.grid(row=i, column=1, sticky='w', padx=10)
+            self.profile_labels.append(value_label)
+        
+        # The views below the profile are screens too
+        self.content = ScreenManager(frame, bg="white")
+        self.content.container.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        self.content.register("home", self.build_welcome)
+        self.content.register("history", self.build_order_history)
+        self.content.register("add_item", self.build_add_item)
+        self.content.register("basket", self.build_basket)
+        
+        def refresh():
+            details = self.shopper_details
+            self.welcome_label.config(text=f"Welcome, {details['first_name']}!")
+            self.update_basket_label()
+            profile_info = [
+                f"{details['first_name']} {details['surname']}",
+                details['email'],
+                details['account_ref'],
+                details['date_joined'],
+            ]
+            for value_label, value in zip(self.profile_labels, profile_info):
+                value_label.config(text=value)
+            self.show_welcome()
+        return refresh
+        
+    def create_header(self, parent):
         """Create header with navigation"""
-        header = tk.Frame(self.root, bg=self.primary_color, height=100)
+        header = tk.Frame(parent, bg=self.primary_color, height=100)
         header.pack(fill=tk.X)
         header.pack_propagate(False)
         
         welcome_frame = tk.Frame(header, bg=self.primary_color)
         welcome_frame.pack(side=tk.LEFT, padx=20, pady=10)
         
-        tk.Label(welcome_frame, 
-                text=f"Welcome, {self.shopper_details['first_name']}!",
-                font=("Helvetica", 16, "bold"), bg=self.primary_color,
-                fg="white").pack(anchor='w')
+        self.welcome_label = tk.Label(welcome_frame, text="",
+                                      font=self.fonts['section'], bg=self.primary_color,
+                                      fg="white")
+        self.welcome_label.pack(anchor='w')
         
-        basket_text = f"Basket ID: {self.basket_id}" if self.basket_id else "No active basket"
-        tk.Label(welcome_frame, text=basket_text,
-                font=("Helvetica", 11), bg=self.primary_color,
-                fg="white").pack(anchor='w')
+        self.basket_label = tk.Label(welcome_frame, text="",
+                                     font=self.fonts['detail'], bg=self.primary_color,
+                                     fg="white")
+        self.basket_label.pack(anchor='w')
         
         nav_frame = tk.Frame(header, bg=self.primary_color)
         nav_frame.pack(side=tk.RIGHT, padx=20)
@@ -597,47 +938,297 @@ class OnlineShoppingApp:
         for text, command in buttons:
             btn = tk.Button(nav_frame, text=text, command=command,
                            bg=self.secondary_color, fg="white",
-                           font=("Helvetica", 10), padx=10, pady=5,
+                           font=self.fonts['small'], padx=10, pady=5,
                            relief=tk.FLAT, cursor="hand2")
             btn.pack(side=tk.LEFT, padx=5)
             
+    def update_basket_label(self):
+        """Show the current basket id in the header"""
+        basket_text = f"Basket ID: {self.basket_id}" if self.basket_id else "No active basket"
+        self.basket_label.config(text=basket_text)
+        
+    def show_content(self, name):
+        """Switch the view under the header, cancelling anything the old view was loading"""
+        # The session store is in memory, so this check costs no database work
+        if self.session is not None and get_session_store().get(self.session.token) is None:
+            messagebox.showinfo("Session Expired", "You were logged out after a period of inactivity.")
+            self.logout()
+            return None
+        self.db.cancel("screen")
+        self.db.cancel("search")
+        return self.content.show(name)
+        
     def show_welcome(self):
         """Show welcome message"""
-        self.main_content.destroy()
-        self.main_content = tk.Frame(self.root, bg="white")
-        self.main_content.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        self.show_content("home")
         
-        welcome_label = tk.Label(self.main_content, text="Welcome to Shopping System",
-                                font=("Helvetica", 18, "bold"), bg="white")
+    def build_welcome(self, frame):
+        """Create the welcome view"""
+        welcome_label = tk.Label(frame, text="Welcome to Shopping System",
+                                font=self.fonts['window_title'], bg="white")
         welcome_label.pack(pady=30)
         
     def show_order_history(self):
-        """Show order history"""
-        messagebox.showinfo("Order History", "Your order history will be displayed here")
+        """Show the shopper's orders, newest first, a page at a time"""
+        self.show_content("history")
+        
+    def build_order_history(self, frame):
+        """Create the order history view"""
+        tk.Label(frame, text="Order History",
+                font=self.fonts['section'], bg="white",
+                fg=self.primary_color).pack(pady=10)
+        
+        columns = ("Date", "Seller", "Price", "Quantity", "Status")
+        history_tree = ttk.Treeview(frame, columns=columns, height=15)
+        history_tree.heading("#0", text="Order / Product")
+        history_tree.column("#0", width=400)
+        for col in columns:
+            history_tree.heading(col, text=col)
+            history_tree.column(col, width=130)
+        history_tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        more_btn = ttk.Button(frame, text="Load more", state=tk.DISABLED)
+        more_btn.pack(pady=5)
+        state = {'after': None}
+        
+        def show_page(page):
+            orders, state['after'] = page
+            if not orders and not history_tree.get_children():
+                history_tree.insert("", tk.END, text="No orders placed yet")
+            for order in orders:
+                parent = history_tree.insert("", tk.END, text=f"Order {order['order_id']}", open=True,
+                                             values=(order['order_date'], "", "", "", order['order_status']))
+                for line in order['lines']:
+                    history_tree.insert(parent, tk.END, text=line['product_description'],
+                                        values=("", line['seller_name'], str(Money(line['price'])),
+                                                line['quantity'], line['ordered_product_status']))
+            more_btn.config(state=tk.NORMAL if state['after'] else tk.DISABLED)
+        
+        def load_page():
+            more_btn.config(state=tk.DISABLED)
+            shopper_id, after = self.shopper_id, state['after']
+            self.run_db(lambda conn: order_history_page(conn, shopper_id, after=after),
+                        show_page, frame)
+        
+        def refresh():
+            # Orders may have been placed since the view was last shown
+            history_tree.delete(*history_tree.get_children())
+            state['after'] = None
+            load_page()
+        
+        more_btn.config(command=load_page)
+        return refresh
         
     def show_add_item(self):
-        """Show add item to basket"""
-        messagebox.showinfo("Add Item", "Add item to basket functionality coming soon")
+        """Show product search for adding items to the basket"""
+        self.show_content("add_item")
+        
+    def build_add_item(self, frame):
+        """Create the product search view"""
+        tk.Label(frame, text="Add Item",
+                font=self.fonts['section'], bg="white",
+                fg=self.primary_color).pack(pady=10)
+        
+        search_frame = tk.Frame(frame, bg="white")
+        search_frame.pack(fill=tk.X)
+        
+        tk.Label(search_frame, text="Search:", bg="white").pack(side=tk.LEFT, padx=5)
+        search_entry = tk.Entry(search_frame, font=self.fonts['normal'], width=40)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        
+        columns = ("Product", "Manufacturer", "Model", "From")
+        results_tree = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        for col in columns:
+            results_tree.heading(col, text=col)
+            results_tree.column(col, width=150)
+        results_tree.column("Product", width=400)
+        results_tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        order_frame = tk.Frame(frame, bg="white")
+        order_frame.pack(fill=tk.X)
+        
+        tk.Label(order_frame, text="Seller:", bg="white").pack(side=tk.LEFT, padx=5)
+        seller_combo = ttk.Combobox(order_frame, state="readonly", width=40)
+        seller_combo.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(order_frame, text="Quantity:", bg="white").pack(side=tk.LEFT, padx=5)
+        quantity_spin = tk.Spinbox(order_frame, from_=1, to=999, width=5)
+        quantity_spin.pack(side=tk.LEFT, padx=5)
+        
+        state = {'page': 0, 'sellers': []}
+        
+        def run_search(page=0):
+            text = search_entry.get()
+            self.db.cancel("search")
+            self.db.submit(lambda conn: search_products(conn, text, page),
+                           lambda result: show_results(page, *result),
+                           self.show_db_error, tag="search")
+        
+        def show_results(page, results, has_more):
+            state['page'] = page
+            results_tree.delete(*results_tree.get_children())
+            for row in results:
+                price = str(Money(row['min_price'])) if row['min_price'] is not None else ""
+                results_tree.insert("", tk.END, iid=row['product_id'],
+                                    values=(row['product_description'], row['product_manufacturer'],
+                                            row['product_model'] or "", price))
+            next_btn.config(state=tk.NORMAL if has_more else tk.DISABLED)
+            prev_btn.config(state=tk.NORMAL if page > 0 else tk.DISABLED)
+        
+        def on_select(event=None):
+            selection = results_tree.selection()
+            if not selection:
+                return
+            product_id = int(selection[0])
+            seller_combo.set("Loading...")
+            self.run_db(lambda conn: get_catalog_cache().product_sellers(product_id), show_sellers)
+        
+        def show_sellers(sellers):
+            state['sellers'] = sellers
+            seller_combo['values'] = [seller[1] for seller in state['sellers']]
+            if state['sellers']:
+                seller_combo.current(0)
+            else:
+                seller_combo.set("")
+        
+        def add_to_basket():
+            selection = results_tree.selection()
+            if not selection or seller_combo.current() < 0:
+                messagebox.showerror("Error", "Please choose a product and seller")
+                return
+            try:
+                quantity = int(quantity_spin.get())
+                if quantity <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "The quantity must be greater than 0")
+                return
+            seller_id, _, price = state['sellers'][seller_combo.current()]
+            shopper_id, basket_id, product_id = self.shopper_id, self.basket_id, int(selection[0])
+            baskets = self.baskets
+            
+            def added(basket_id):
+                self.basket_id = basket_id
+                self.update_basket_label()
+                messagebox.showinfo("Add Item", "Item added to your basket")
+            
+            # Not tagged with the screen: an add the user asked for should still happen
+            self.db.submit(lambda conn: baskets.add_item(
+                               shopper_id, basket_id, product_id, seller_id, quantity, price),
+                           added,
+                           lambda error: messagebox.showerror("Error", f"Could not add item: {error}"))
+        
+        search_btn = ttk.Button(search_frame, text="Search", style="Primary.TButton",
+                               command=run_search)
+        search_btn.pack(side=tk.LEFT, padx=5)
+        prev_btn = ttk.Button(search_frame, text="< Prev", state=tk.DISABLED,
+                             command=lambda: run_search(state['page'] - 1))
+        prev_btn.pack(side=tk.LEFT, padx=5)
+        next_btn = ttk.Button(search_frame, text="Next >", state=tk.DISABLED,
+                             command=lambda: run_search(state['page'] + 1))
+        next_btn.pack(side=tk.LEFT, padx=5)
+        
+        add_btn = ttk.Button(order_frame, text="Add to Basket", style="Success.TButton",
+                            command=add_to_basket)
+        add_btn.pack(side=tk.LEFT, padx=10)
+        
+        search_entry.bind('<Return>', lambda e: run_search())
+        results_tree.bind('<<TreeviewSelect>>', on_select)
+        return search_entry.focus
         
     def show_basket(self):
         """Show basket contents"""
-        messagebox.showinfo("View Basket", "Your basket contents will be displayed here")
+        self.show_content("basket")
+        
+    def build_basket(self, frame):
+        """Create the basket view"""
+        tk.Label(frame, text="Your Basket",
+                font=self.fonts['section'], bg="white",
+                fg=self.primary_color).pack(pady=10)
+        
+        columns = ("Product", "Seller", "Quantity", "Price", "Total")
+        basket_tree = ttk.Treeview(frame, columns=columns, show='headings', height=12)
+        for col in columns:
+            basket_tree.heading(col, text=col)
+            basket_tree.column(col, width=130)
+        basket_tree.column("Product", width=400)
+        basket_tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        total_label = tk.Label(frame, text="", font=self.fonts['strong'], bg="white")
+        total_label.pack(pady=5)
+        
+        def show_contents(basket):
+            basket_tree.delete(*basket_tree.get_children())
+            for line in basket.lines:
+                basket_tree.insert("", tk.END, iid=line['product_id'],
+                                   values=(line['product_description'], line['seller_name'], line['quantity'],
+                                           str(line['price']), str(line['line_total'])))
+            total_label.config(text=f"Total: {basket.total}" if basket.lines else "Your basket is empty")
+        
+        def remove_selected():
+            selection = basket_tree.selection()
+            if not selection:
+                return
+            baskets, basket_id, product_id = self.baskets, self.basket_id, int(selection[0])
+            self.run_db(lambda conn: baskets.remove_item(basket_id, product_id), show_contents)
+        
+        button_frame = tk.Frame(frame, bg="white")
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="Remove Selected", style="Danger.TButton",
+                   command=remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Checkout", style="Success.TButton",
+                   command=self.checkout).pack(side=tk.LEFT, padx=5)
+        
+        def refresh():
+            basket_tree.delete(*basket_tree.get_children())
+            total_label.config(text="")
+            baskets, basket_id = self.baskets, self.basket_id
+            self.run_db(lambda conn: baskets.get(basket_id), show_contents, frame)
+        return refresh
         
     def checkout(self):
         """Process checkout"""
-        messagebox.showinfo("Checkout", "Checkout functionality coming soon")
+        if not self.basket_id:
+            messagebox.showinfo("Checkout", "Your basket is empty")
+            return
+        if not messagebox.askyesno("Checkout", "Do you wish to proceed with the checkout?"):
+            return
+        shopper_id, basket_id, baskets = self.shopper_id, self.basket_id, self.baskets
+        
+        def check_out(conn):
+            # Retrying with the same key can never place the order twice
+            order_id = place_order(conn, shopper_id, basket_id, checkout_key(basket_id))
+            baskets.forget(basket_id)
+            return order_id
+        
+        def placed(order_id):
+            if order_id is None:
+                messagebox.showinfo("Checkout", "Your basket is empty")
+                return
+            self.basket_id = None
+            self.update_basket_label()
+            messagebox.showinfo("Checkout", f"Your order has been placed (order ID {order_id})")
+            self.show_welcome()
+        
+        self.db.submit(check_out, placed,
+                       lambda error: messagebox.showerror("Error", f"Error during checkout: {error}"))
         
     def logout(self):
         """Logout user"""
+        if self.session is not None:
+            get_session_store().end(self.session.token)
+        self.session = None
         self.shopper_id = None
         self.shopper_details = {}
+        self.basket_id = None
+        self.baskets = None
         self.is_admin = False
         self.create_welcome_screen()
         
-    def __del__(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+    def close(self):
+        """Stop the database worker and close the window"""
+        self.db.close()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -645,4 +1236,4 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
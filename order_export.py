@@ -0,0 +1,165 @@
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+
+from database import get_pool
+from money import sql_decimal
+
+# Streams order lines for finance without holding the result in memory.
+# Rows come off the cursor fetchmany() at a time and are written straight
+# out, and the query reads shopper_orders through the (order_date,
+# order_status) index so SQLite never has to sort the whole result first.
+
+DEFAULT_BATCH_SIZE = 2000
+PROGRESS_EVERY = 100000
+ORDER_STATUSES = ('Placed', 'Incomplete', 'Complete', 'Cancelled')
+
+EXPORT_COLUMNS = (
+    'order_id', 'order_date', 'order_status', 'shopper_id',
+    'product_id', 'product_code', 'product_description',
+    'seller_id', 'seller_name', 'quantity', 'price', 'line_total', 'ordered_product_status',
+)
+
+# Amounts are exact decimal pounds, e.g. "12.34", formatted from the pence columns
+EXPORT_SQL = f"""
+    SELECT o.order_id, o.order_date, o.order_status, o.shopper_id,
+           op.product_id, p.product_code, p.product_description,
+           op.seller_id, s.seller_name, op.quantity, {sql_decimal('op.price')} as price,
+           {sql_decimal('op.quantity * op.price')} as line_total, op.ordered_product_status
+    FROM shopper_orders o
+    JOIN ordered_products op ON op.order_id = o.order_id
+    JOIN products p ON p.product_id = op.product_id
+    JOIN sellers s ON s.seller_id = op.seller_id
+    WHERE {{order_filter}}
+    ORDER BY o.order_date, o.order_status, o.order_id, op.product_id
+"""
+
+# Open-ended ranges still go through the index
+MIN_DATE = ''
+MAX_DATE = '9999-12-31~'
+
+
+def order_filter(date_from=None, date_to=None, statuses=None):
+    """Return (WHERE condition on shopper_orders o, params) for date_from <= order_date < date_to"""
+    condition = "o.order_date >= ? AND o.order_date < ?"
+    params = [date_from or MIN_DATE, date_to or MAX_DATE]
+    if statuses:
+        unknown = [status for status in statuses if status not in ORDER_STATUSES]
+        if unknown:
+            raise ValueError(f"Unknown order status: {', '.join(unknown)}")
+        condition += f" AND o.order_status IN ({', '.join('?' * len(statuses))})"
+        params.extend(statuses)
+    return condition, params
+
+
+def export_query(date_from=None, date_to=None, statuses=None):
+    """Return (sql, params) for orders with date_from <= order_date < date_to"""
+    condition, params = order_filter(date_from, date_to, statuses)
+    return EXPORT_SQL.format(order_filter=condition), params
+
+
+def iter_export_rows(conn, date_from=None, date_to=None, statuses=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield export rows as tuples, fetching batch_size at a time"""
+    sql, params = export_query(date_from, date_to, statuses)
+    cursor = conn.cursor()
+    # Plain tuples: no sqlite3.Row per line, the writers only need the values
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+class CsvWriter:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class JsonLinesWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, row):
+        self.f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')))
+        self.f.write("\n")
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter}
+
+
+def open_output(path, compress=None):
+    """Open a text file for writing, gzip-compressed if asked or if the name ends in .gz"""
+    if path == "-":
+        return sys.stdout
+    if compress or (compress is None and path.endswith(".gz")):
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def export_orders(conn, f, fmt='csv', date_from=None, date_to=None, statuses=None,
+                  batch_size=DEFAULT_BATCH_SIZE, progress=None, progress_every=PROGRESS_EVERY):
+    """Write matching order lines to f; progress(rows, seconds) is called every progress_every rows.
+
+    Returns (rows written, seconds).
+    """
+    writer = WRITERS[fmt](f)
+    started = time.perf_counter()
+    count = 0
+    for row in iter_export_rows(conn, date_from, date_to, statuses, batch_size):
+        writer.write(row)
+        count += 1
+        if progress and count % progress_every == 0:
+            progress(count, time.perf_counter() - started)
+    return count, time.perf_counter() - started
+
+
+def format_from_path(path):
+    """'jsonl' for .jsonl/.jsonl.gz names, otherwise 'csv'"""
+    name = path[:-3] if path.endswith(".gz") else path
+    return 'jsonl' if name.endswith((".jsonl", ".json")) else 'csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export order lines to CSV or JSON Lines")
+    parser.add_argument("output", help="output file (.csv, .jsonl, add .gz to compress) or - for stdout")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="override the format from the file name")
+    parser.add_argument("--gzip", action="store_true", default=None, help="compress even without .gz")
+    parser.add_argument("--from", dest="date_from", help="first order date to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="order dates before this are included (YYYY-MM-DD)")
+    parser.add_argument("--status", action="append", choices=ORDER_STATUSES,
+                        help="only orders with this status (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per fetchmany")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args()
+
+    def progress(rows, seconds):
+        print(f"  {rows} rows ({rows / seconds:.0f} rows/s)", file=sys.stderr)
+
+    fmt = args.format or format_from_path(args.output)
+    f = open_output(args.output, args.gzip)
+    try:
+        with get_pool().connection() as conn:
+            rows, seconds = export_orders(conn, f, fmt, args.date_from, args.date_to, args.status,
+                                          max(1, args.batch_size), None if args.quiet else progress)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    print(f"Exported {rows} order lines in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import sqlite3
+
+from database import retry_on_busy
+
+
+class CheckoutConflict(Exception):
+    """An idempotency key the shopper already used for a different basket"""
+
+
+def _add_order_rollups(cursor, shopper_id, order_id, basket_id):
+    cursor.execute("""
+        INSERT INTO order_rollups (order_id, item_count, order_value)
+        SELECT ?, IFNULL(SUM(quantity), 0), IFNULL(SUM(quantity * price), 0)
+        FROM basket_contents
+        WHERE basket_id = ?
+    """, (order_id, basket_id))
+    cursor.execute("""
+        INSERT INTO shopper_rollups (shopper_id, order_count, lifetime_spend)
+        SELECT ?, 1, order_value FROM order_rollups WHERE order_id = ?
+        ON CONFLICT (shopper_id) DO UPDATE
+        SET order_count = order_count + 1,
+            lifetime_spend = lifetime_spend + excluded.lifetime_spend
+    """, (shopper_id, order_id))
+
+
+def _place_order(conn, shopper_id, basket_id, idempotency_key):
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+
+    # Take the write lock up front so we never fail half way on a lock upgrade
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if idempotency_key is not None:
+            # Keys are scoped to the shopper, so one shopper can never replay another's order
+            cursor.execute("""
+                SELECT order_id, basket_id
+                FROM checkout_requests
+                WHERE shopper_id = ? AND idempotency_key = ?
+            """, (shopper_id, idempotency_key))
+            existing = cursor.fetchone()
+            if existing:
+                conn.rollback()
+                # A replay comes after its basket is gone; a live, different basket is a reused key
+                if basket_id is not None and basket_id != existing[1]:
+                    raise CheckoutConflict(f"Idempotency key {idempotency_key!r} was already used for "
+                                           f"order {existing[0]}")
+                return existing[0]
+
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM basket_contents WHERE basket_id = ?)
+        """, (basket_id,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return None
+
+        cursor.execute("""
+            INSERT INTO shopper_orders (shopper_id, order_date, order_status)
+            VALUES (?, datetime('now'), 'Placed')
+        """, (shopper_id,))
+        order_id = cursor.lastrowid
+
+        # Move every basket line in one statement
+        cursor.execute("""
+            INSERT INTO ordered_products
+            (order_id, product_id, seller_id, quantity, price, ordered_product_status)
+            SELECT ?, product_id, seller_id, quantity, price, 'Placed'
+            FROM basket_contents
+            WHERE basket_id = ?
+        """, (order_id, basket_id))
+
+        _add_order_rollups(cursor, shopper_id, order_id, basket_id)
+
+        if idempotency_key is not None:
+            cursor.execute("""
+                INSERT INTO checkout_requests (shopper_id, idempotency_key, basket_id, order_id, created_date_time)
+                VALUES (?, ?, ?, ?, datetime('now'))
+            """, (shopper_id, idempotency_key, basket_id, order_id))
+
+        cursor.execute("DELETE FROM basket_contents WHERE basket_id = ?", (basket_id,))
+        cursor.execute("DELETE FROM shopper_baskets WHERE basket_id = ?", (basket_id,))
+
+        conn.commit()
+        return order_id
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def place_order(conn, shopper_id, basket_id, idempotency_key=None):
+    """Turn a basket into an order in one IMMEDIATE transaction.
+
+    Retries automatically while another writer holds the lock. If an
+    idempotency key is given and the shopper already placed an order with
+    it, that order's id is returned instead of creating a second order;
+    CheckoutConflict is raised if the key was used for a different basket
+    that still exists. Returns None if the basket is empty.
+    """
+    return retry_on_busy(_place_order, conn, shopper_id, basket_id, idempotency_key)
+
+
+def _adjust_shopper_rollup(cursor, shopper_id, orders, spend):
+    cursor.execute("""
+        INSERT INTO shopper_rollups (shopper_id, order_count, lifetime_spend)
+        VALUES (?, ?, ?)
+        ON CONFLICT (shopper_id) DO UPDATE
+        SET order_count = order_count + excluded.order_count,
+            lifetime_spend = lifetime_spend + excluded.lifetime_spend
+    """, (shopper_id, orders, spend))
+
+
+def _set_order_status(conn, order_id, status):
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            SELECT o.shopper_id, o.order_status, r.order_value
+            FROM shopper_orders o
+            JOIN order_rollups r ON r.order_id = o.order_id
+            WHERE o.order_id = ?
+        """, (order_id,))
+        order = cursor.fetchone()
+        if order is None:
+            conn.rollback()
+            return False
+
+        cursor.execute("UPDATE shopper_orders SET order_status = ? WHERE order_id = ?",
+                       (status, order_id))
+
+        # Cancelled orders drop out of the shopper's order count and spend
+        was_counted = order['order_status'] != 'Cancelled'
+        is_counted = status != 'Cancelled'
+        if was_counted != is_counted:
+            sign = 1 if is_counted else -1
+            _adjust_shopper_rollup(cursor, order['shopper_id'], sign, sign * order['order_value'])
+
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def set_order_status(conn, order_id, status):
+    """Change an order's status, keeping the shopper rollup in step.
+
+    Returns False if the order does not exist.
+    """
+    return retry_on_busy(_set_order_status, conn, order_id, status)
+
+
+def _set_line_status(conn, order_id, product_id, status):
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            SELECT o.shopper_id, o.order_status, op.ordered_product_status,
+                   op.quantity, op.quantity * op.price as line_value
+            FROM ordered_products op
+            JOIN shopper_orders o ON o.order_id = op.order_id
+            WHERE op.order_id = ? AND op.product_id = ?
+        """, (order_id, product_id))
+        line = cursor.fetchone()
+        if line is None:
+            conn.rollback()
+            return False
+
+        cursor.execute("""
+            UPDATE ordered_products
+            SET ordered_product_status = ?
+            WHERE order_id = ? AND product_id = ?
+        """, (status, order_id, product_id))
+
+        # Cancelled lines drop out of the order's item count and value
+        was_counted = line['ordered_product_status'] != 'Cancelled'
+        is_counted = status != 'Cancelled'
+        if was_counted != is_counted:
+            sign = 1 if is_counted else -1
+            cursor.execute("""
+                UPDATE order_rollups
+                SET item_count = item_count + ?,
+                    order_value = order_value + ?
+                WHERE order_id = ?
+            """, (sign * line['quantity'], sign * line['line_value'], order_id))
+            if line['order_status'] != 'Cancelled':
+                _adjust_shopper_rollup(cursor, line['shopper_id'], 0, sign * line['line_value'])
+
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def set_line_status(conn, order_id, product_id, status):
+    """Change an order line's status, keeping the order and shopper rollups in step.
+
+    Returns False if the line does not exist.
+    """
+    return retry_on_busy(_set_line_status, conn, order_id, product_id, status)
+
+
+def checkout_key(basket_id):
+    """Idempotency key for checking out a basket (basket ids are never reused)"""
+    return f"basket:{basket_id}"
+
+
+# Order history, keyset-paginated on (order_date, order_id) newest first
+ORDER_HISTORY_FIRST_PAGE_SQL = """
+    SELECT order_id, order_date, order_status
+    FROM shopper_orders
+    WHERE shopper_id = ?
+    ORDER BY order_date DESC, order_id DESC
+    LIMIT ?
+"""
+
+ORDER_HISTORY_NEXT_PAGE_SQL = """
+    SELECT order_id, order_date, order_status
+    FROM shopper_orders
+    WHERE shopper_id = ?
+    AND (order_date, order_id) < (?, ?)
+    ORDER BY order_date DESC, order_id DESC
+    LIMIT ?
+"""
+
+ORDER_LINES_SQL = """
+    SELECT op.order_id, p.product_description, s.seller_name,
+           op.price, op.quantity, op.ordered_product_status
+    FROM ordered_products op
+    JOIN products p ON op.product_id = p.product_id
+    JOIN sellers s ON op.seller_id = s.seller_id
+    WHERE op.order_id IN ({placeholders})
+    ORDER BY op.order_id, p.product_description
+"""
+
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
+def order_history_page(conn, shopper_id, page_size=ORDER_HISTORY_PAGE_SIZE, after=None):
+    """Return (orders, next_cursor) for one page of a shopper's order history.
+
+    Each order is a dict with order_id, order_date, order_status and a list
+    of lines. Pass the returned cursor as ``after`` to fetch the next page;
+    it is None once the history is exhausted.
+    """
+    cursor = conn.cursor()
+    if after is None:
+        cursor.execute(ORDER_HISTORY_FIRST_PAGE_SQL, (shopper_id, page_size))
+    else:
+        cursor.execute(ORDER_HISTORY_NEXT_PAGE_SQL, (shopper_id, after[0], after[1], page_size))
+
+    orders = [{'order_id': row[0], 'order_date': row[1], 'order_status': row[2], 'lines': []}
+              for row in cursor.fetchall()]
+    if not orders:
+        return [], None
+
+    by_id = {order['order_id']: order for order in orders}
+    placeholders = ", ".join("?" * len(orders))
+    cursor.execute(ORDER_LINES_SQL.format(placeholders=placeholders), list(by_id))
+    for line in cursor:
+        by_id[line['order_id']]['lines'].append(line)
+
+    next_cursor = None
+    if len(orders) == page_size:
+        last = orders[-1]
+        next_cursor = (last['order_date'], last['order_id'])
+    return orders, next_cursor
+
+
+def iter_order_history(conn, shopper_id, page_size=ORDER_HISTORY_PAGE_SIZE):
+    """Yield a shopper's orders newest first, one page in memory at a time"""
+    after = None
+    while True:
+        orders, after = order_history_page(conn, shopper_id, page_size, after)
+        yield from orders
+        if after is None:
+            return
@@ -1,17 +1,20 @@
 import sqlite3
 from datetime import datetime
-import sys
+
+from catalog import get_catalog_cache
+from database import get_pool
+from money import Money
+from search import describe, search_products
+from shopper_session import ShopperSession, find_shopper
 
 # Database connection
 def create_connection():
-    """Create a database connection to the SQLite database"""
+    """Borrow a connection to the SQLite database from the shared pool"""
     try:
-        conn = sqlite3.connect('orinoco.db')
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
+        return get_pool().acquire(timeout=10)
+    except Exception as e:
         print(f"Error connecting to database: {e}")
-        sys.exit(1)
+        return None
 
 # Display options function
 def display_options(all_options, title, type):
@@ -39,43 +42,10 @@ def display_options(all_options, title, type):
     
     return option_list[selected_option - 1]
 
-# Get current basket
-def get_current_basket(conn, shopper_id):
-    """Get or create current basket for the shopper"""
-    cursor = conn.cursor()
-    
-    # Check for existing basket created today
-    cursor.execute("""
-        SELECT basket_id
-        FROM shopper_baskets
-        WHERE shopper_id = ?
-        AND DATE(basket_created_date_time) = DATE('now')
-        ORDER BY basket_created_date_time DESC
-        LIMIT 1
-    """, (shopper_id,))
-    
-    result = cursor.fetchone()
-    if result:
-        return result['basket_id']
-    return None
-
 # Option 1: Display order history
-def display_order_history(conn, shopper_id):
-    """Display order history for the shopper"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT o.order_id, o.order_date, p.product_description, 
-               s.seller_name, op.price, op.quantity, op.ordered_product_status
-        FROM shopper_orders o
-        JOIN ordered_products op ON o.order_id = op.order_id
-        JOIN products p ON op.product_id = p.product_id
-        JOIN sellers s ON op.seller_id = s.seller_id
-        WHERE o.shopper_id = ?
-        ORDER BY o.order_date DESC
-    """, (shopper_id,))
-    
-    orders = cursor.fetchall()
+def display_order_history(session):
+    """Display order history for the shopper, one page at a time"""
+    orders, after = session.order_history()
     
     if not orders:
         print("\nNo orders placed by this customer")
@@ -84,52 +54,50 @@ def display_order_history(conn, shopper_id):
     print("\nYour Order History:")
     print("-" * 100)
     
-    current_order_id = None
-    for order in orders:
-        if order['order_id'] != current_order_id:
-            current_order_id = order['order_id']
+    while True:
+        for order in orders:
             print(f"\nOrder ID: {order['order_id']} - Date: {order['order_date']}")
             print("-" * 80)
+            
+            for line in order['lines']:
+                print(f"  {line['product_description']}")
+                print(f"  Seller: {line['seller_name']} | Price: {Money(line['price'])} | "
+                      f"Quantity: {line['quantity']} | Status: {line['ordered_product_status']}")
         
-        print(f"  {order['product_description']}")
-        print(f"  Seller: {order['seller_name']} | Price: £{order['price']:.2f} | "
-              f"Quantity: {order['quantity']} | Status: {order['ordered_product_status']}")
+        if after is None:
+            return
+        
+        more = input("\nPress Enter for the next page or Q to return to the menu: ").upper()
+        if more == 'Q':
+            return
+        orders, after = session.order_history(after)
 
 # Option 2: Add item to basket
-def add_item_to_basket(conn, shopper_id, basket_id):
+def add_item_to_basket(session):
     """Add an item to the shopper's basket"""
-    cursor = conn.cursor()
+    catalog = get_catalog_cache()
     
     # Display categories
-    cursor.execute("""
-        SELECT category_id, category_description
-        FROM categories
-        ORDER BY category_description
-    """)
-    categories = cursor.fetchall()
+    categories = catalog.categories()
     
     category_id = display_options(categories, "Product Categories", "category")
     
     # Display products in selected category
-    cursor.execute("""
-        SELECT product_id, product_description
-        FROM products
-        WHERE category_id = ?
-        ORDER BY product_description
-    """, (category_id,))
-    products = cursor.fetchall()
+    products = catalog.category_products(category_id)
     
     product_id = display_options(products, "Available Products", "product")
     
+    add_product_to_basket(session, product_id)
+
+# Choose a seller and quantity for a product and add it to the basket
+def add_product_to_basket(session, product_id):
+    """Ask for a seller and quantity, then add the product to the basket"""
     # Display sellers for selected product
-    cursor.execute("""
-        SELECT ps.seller_id, s.seller_name || ' - £' || ps.price as seller_info
-        FROM product_sellers ps
-        JOIN sellers s ON ps.seller_id = s.seller_id
-        WHERE ps.product_id = ?
-        ORDER BY s.seller_name
-    """, (product_id,))
-    sellers = cursor.fetchall()
+    sellers = get_catalog_cache().product_sellers(product_id)
+    
+    if not sellers:
+        print("\nThis product is not currently sold by any seller")
+        return
     
     seller_id = display_options(sellers, "Available Sellers", "seller")
     
@@ -144,108 +112,67 @@ def add_item_to_basket(conn, shopper_id, basket_id):
             print("Please enter a valid number")
             quantity = 0
     
-    # Get price
-    cursor.execute("""
-        SELECT price
-        FROM product_sellers
-        WHERE product_id = ? AND seller_id = ?
-    """, (product_id, seller_id))
-    price = cursor.fetchone()['price']
-    
-    # Create basket if needed
-    if basket_id is None:
-        cursor.execute("""
-            INSERT INTO shopper_baskets (shopper_id, basket_created_date_time)
-            VALUES (?, datetime('now'))
-        """, (shopper_id,))
-        basket_id = cursor.lastrowid
-    
-    # Add item to basket
-    cursor.execute("""
-        INSERT INTO basket_contents (basket_id, product_id, seller_id, quantity, price)
-        VALUES (?, ?, ?, ?, ?)
-    """, (basket_id, product_id, seller_id, quantity, price))
-    
-    conn.commit()
+    # Get price from the seller list we just displayed
+    price = next(seller[2] for seller in sellers if seller[0] == seller_id)
+    
+    # Add item to basket (creating the basket if needed)
+    session.add_item(product_id, seller_id, quantity, price)
+    
     print("\nItem added to your basket")
-    return basket_id
 
 # Option 3: View basket
-def view_basket(conn, basket_id):
+def view_basket(session):
     """Display the current basket contents"""
-    if basket_id is None:
-        print("\nYour basket is empty")
-        return
+    basket = session.basket()
     
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT bc.product_id, bc.seller_id, p.product_description, 
-               s.seller_name, bc.quantity, bc.price,
-               (bc.quantity * bc.price) as line_total
-        FROM basket_contents bc
-        JOIN products p ON bc.product_id = p.product_id
-        JOIN sellers s ON bc.seller_id = s.seller_id
-        WHERE bc.basket_id = ?
-        ORDER BY p.product_description
-    """, (basket_id,))
-    
-    items = cursor.fetchall()
-    
-    if not items:
+    if basket.is_empty():
         print("\nYour basket is empty")
         return
     
     print("\nYour Basket:")
     print("-" * 80)
     
-    total = 0
     item_no = 1
-    for item in items:
+    for item in basket.lines:
         print(f"{item_no}. {item['product_description']} from {item['seller_name']}")
-        print(f"   Quantity: {item['quantity']} | Price: £{item['price']:.2f} | "
-              f"Total: £{item['line_total']:.2f}")
-        total += item['line_total']
+        print(f"   Quantity: {item['quantity']} | Price: {item['price']} | "
+              f"Total: {item['line_total']}")
         item_no += 1
     
     print("-" * 80)
-    print(f"Total: £{total:.2f}")
+    print(f"Total: {basket.total}")
+
+# Select a basket line
+def select_basket_item(basket, action):
+    """Ask which basket line to act on and return it"""
+    items = basket.lines
+    if len(items) == 1:
+        return items[0]
+    
+    item_no = 0
+    while item_no < 1 or item_no > len(items):
+        try:
+            item_no = int(input(f"\nEnter the basket item no. to {action}: "))
+            if item_no < 1 or item_no > len(items):
+                print("The basket item no. you have entered is invalid")
+        except ValueError:
+            print("Please enter a valid number")
+            item_no = 0
+    return items[item_no - 1]
 
 # Option 4: Change quantity
-def change_quantity(conn, basket_id):
+def change_quantity(session):
     """Change the quantity of an item in the basket"""
-    if basket_id is None:
-        print("\nYour basket is empty")
-        return
-    
-    cursor = conn.cursor()
+    basket = session.basket()
     
     # Display basket first
-    view_basket(conn, basket_id)
-    
-    # Get basket items
-    cursor.execute("""
-        SELECT product_id, seller_id
-        FROM basket_contents
-        WHERE basket_id = ?
-    """, (basket_id,))
-    items = cursor.fetchall()
+    view_basket(session)
     
-    if not items:
+    if basket.is_empty():
         return
     
     # Get item to change
-    if len(items) > 1:
-        item_no = 0
-        while item_no < 1 or item_no > len(items):
-            try:
-                item_no = int(input("\nEnter the basket item no. to update: "))
-                if item_no < 1 or item_no > len(items):
-                    print("The basket item no. you have entered is invalid")
-            except ValueError:
-                print("Please enter a valid number")
-                item_no = 0
-    else:
-        item_no = 1
+    item = select_basket_item(basket, "update")
     
     # Get new quantity
     new_quantity = 0
@@ -259,53 +186,24 @@ def change_quantity(conn, basket_id):
             new_quantity = 0
     
     # Update quantity
-    item = items[item_no - 1]
-    cursor.execute("""
-        UPDATE basket_contents
-        SET quantity = ?
-        WHERE basket_id = ? AND product_id = ? AND seller_id = ?
-    """, (new_quantity, basket_id, item['product_id'], item['seller_id']))
-    
-    conn.commit()
+    session.change_quantity(item['product_id'], new_quantity)
+    
     print("\nQuantity updated")
-    view_basket(conn, basket_id)
+    view_basket(session)
 
 # Option 5: Remove item
-def remove_item(conn, basket_id):
+def remove_item(session):
     """Remove an item from the basket"""
-    if basket_id is None:
-        print("\nYour basket is empty")
-        return
-    
-    cursor = conn.cursor()
+    basket = session.basket()
     
     # Display basket first
-    view_basket(conn, basket_id)
-    
-    # Get basket items
-    cursor.execute("""
-        SELECT product_id, seller_id
-        FROM basket_contents
-        WHERE basket_id = ?
-    """, (basket_id,))
-    items = cursor.fetchall()
+    view_basket(session)
     
-    if not items:
+    if basket.is_empty():
         return
     
     # Get item to remove
-    if len(items) > 1:
-        item_no = 0
-        while item_no < 1 or item_no > len(items):
-            try:
-                item_no = int(input("\nEnter the basket item no. to remove: "))
-                if item_no < 1 or item_no > len(items):
-                    print("The basket item no. you have entered is invalid")
-            except ValueError:
-                print("Please enter a valid number")
-                item_no = 0
-    else:
-        item_no = 1
+    item = select_basket_item(basket, "remove")
     
     # Confirm removal
     confirm = input("Are you sure you want to remove this item? (Y/N): ").upper()
@@ -313,104 +211,76 @@ def remove_item(conn, basket_id):
         return
     
     # Remove item
-    item = items[item_no - 1]
-    cursor.execute("""
-        DELETE FROM basket_contents
-        WHERE basket_id = ? AND product_id = ? AND seller_id = ?
-    """, (basket_id, item['product_id'], item['seller_id']))
-    
-    conn.commit()
+    basket = session.remove_item(item['product_id'])
     print("\nItem removed from basket")
     
     # Check if basket is empty
-    cursor.execute("""
-        SELECT COUNT(*) as count
-        FROM basket_contents
-        WHERE basket_id = ?
-    """, (basket_id,))
-    
-    if cursor.fetchone()['count'] == 0:
+    if basket.is_empty():
         print("\nYour basket is empty")
     else:
-        view_basket(conn, basket_id)
+        view_basket(session)
 
 # Option 6: Checkout
-def checkout(conn, shopper_id, basket_id):
+def checkout(session):
     """Checkout the current basket"""
-    if basket_id is None:
-        print("\nYour basket is empty")
-        return None
-    
-    cursor = conn.cursor()
-    
-    # Check if basket has items
-    cursor.execute("""
-        SELECT COUNT(*) as count
-        FROM basket_contents
-        WHERE basket_id = ?
-    """, (basket_id,))
-    
-    if cursor.fetchone()['count'] == 0:
+    if session.basket().is_empty():
         print("\nYour basket is empty")
-        return None
+        return
     
     # Display basket
-    view_basket(conn, basket_id)
+    view_basket(session)
     
     # Confirm checkout
     confirm = input("\nDo you wish to proceed with the checkout (Y/N)? ").upper()
     if confirm != 'Y':
-        return basket_id
+        return
     
     try:
-        # Start transaction
-        conn.execute("BEGIN TRANSACTION")
-        
-        # Create order
-        cursor.execute("""
-            INSERT INTO shopper_orders (shopper_id, order_date, order_status)
-            VALUES (?, datetime('now'), 'Placed')
-        """, (shopper_id,))
-        order_id = cursor.lastrowid
-        
-        # Get basket items
-        cursor.execute("""
-            SELECT product_id, seller_id, quantity, price
-            FROM basket_contents
-            WHERE basket_id = ?
-        """, (basket_id,))
-        items = cursor.fetchall()
-        
-        # Create ordered products
-        for item in items:
-            cursor.execute("""
-                INSERT INTO ordered_products 
-                (order_id, product_id, seller_id, quantity, price, ordered_product_status)
-                VALUES (?, ?, ?, ?, ?, 'Placed')
-            """, (order_id, item['product_id'], item['seller_id'], 
-                  item['quantity'], item['price']))
-        
-        # Delete basket contents
-        cursor.execute("DELETE FROM basket_contents WHERE basket_id = ?", (basket_id,))
+        order_id = session.checkout()
+    except sqlite3.Error as e:
+        print(f"\nError during checkout: {e}")
+        return
+    
+    if order_id is None:
+        print("\nYour basket is empty")
+    else:
+        print(f"\nCheckout complete, your order has been placed (order ID {order_id})")
+
+# Option 7: Search for a product
+def search_for_product(session):
+    """Search the catalog by keyword and optionally add a result to the basket"""
+    text = input("\nEnter search words: ").strip()
+    
+    page = 0
+    while True:
+        results, has_more = search_products(session.conn, text, page)
+        if not results:
+            print("\nNo products match your search" if page == 0 else "\nNo more results")
+            return
         
-        # Delete basket
-        cursor.execute("DELETE FROM shopper_baskets WHERE basket_id = ?", (basket_id,))
+        print(f"\nSearch Results (page {page + 1})\n")
+        for result_no, result in enumerate(results, 1):
+            print(f"{result_no}.\t{describe(result)}")
         
-        # Commit transaction
-        conn.commit()
-        print("\nCheckout complete, your order has been placed")
-        return None
+        prompt = "\nEnter a result no. to add it to your basket"
+        prompt += ", N for the next page" if has_more else ""
+        choice = input(prompt + " or Enter to return: ").strip().upper()
         
-    except sqlite3.Error as e:
-        # Rollback on error
-        conn.rollback()
-        print(f"\nError during checkout: {e}")
-        return basket_id
+        if choice == 'N' and has_more:
+            page += 1
+        elif choice.isdigit() and 1 <= int(choice) <= len(results):
+            product_id = results[int(choice) - 1]['product_id']
+            add_product_to_basket(session, product_id)
+            return
+        else:
+            return
 
 # Main program
 def main():
     """Main program function"""
     conn = create_connection()
+    if conn is None:
+        return
     
     # Get shopper ID
     shopper_id = None
@@ -419,14 +289,7 @@ def main():
             shopper_id = int(input("Enter your shopper ID: "))
             
             # Verify shopper exists
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT shopper_first_name, shopper_surname
-                FROM shoppers
-                WHERE shopper_id = ?
-            """, (shopper_id,))
-            
-            shopper = cursor.fetchone()
+            shopper = find_shopper(conn, shopper_id)
             if not shopper:
                 print("Shopper ID not found. Please try again.")
                 shopper_id = None
@@ -436,8 +299,8 @@ def main():
         except ValueError:
             print("Please enter a valid number.")
     
-    # Get current basket
-    basket_id = get_current_basket(conn, shopper_id)
+    # Start the session (picks up today's basket if there is one)
+    session = ShopperSession(conn, shopper_id)
     
     # Main menu loop
     while True:
@@ -450,35 +313,38 @@ def main():
         print("4. Change the quantity of an item in your basket")
         print("5. Remove an item from your basket")
         print("6. Checkout")
-        print("7. Exit")
+        print("7. Search for a product")
+        print("8. Exit")
         
         try:
-            choice = int(input("\nSelect an option (1-7): "))
+            choice = int(input("\nSelect an option (1-8): "))
             
             if choice == 1:
-                display_order_history(conn, shopper_id)
+                display_order_history(session)
             elif choice == 2:
-                basket_id = add_item_to_basket(conn, shopper_id, basket_id)
+                add_item_to_basket(session)
             elif choice == 3:
-                view_basket(conn, basket_id)
+                view_basket(session)
             elif choice == 4:
-                change_quantity(conn, basket_id)
+                change_quantity(session)
             elif choice == 5:
-                remove_item(conn, basket_id)
+                remove_item(session)
             elif choice == 6:
-                basket_id = checkout(conn, shopper_id, basket_id)
+                checkout(session)
             elif choice == 7:
+                search_for_product(session)
+            elif choice == 8:
                 print("\nThank you for shopping with us!")
                 break
             else:
-                print("Invalid option. Please select 1-7.")
+                print("Invalid option. Please select 1-8.")
                 
         except ValueError:
             print("Please enter a valid number.")
         except Exception as e:
             print(f"An error occurred: {e}")
     
-    conn.close()
+    get_pool().release(conn)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
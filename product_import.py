@@ -0,0 +1,282 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+from database import get_pool, retry_on_busy
+from money import Money
+
+# Streams a seller's catalog into products and product_sellers. One row is
+# one product, optionally offered by one seller at one price, e.g. in CSV:
+#   product_code,category_code,description,manufacturer,model,status,seller_ref,price
+#   SKU-1,ELEC,Wireless headphones,Sony,WH-1000XM5,Available,SELL-9,279.99
+# or the same keys as JSONL. Products are matched on product_code and
+# offers on (product, seller), so importing a file again updates in place.
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_TRANSACTION_ROWS = 20000
+MAX_REPORTED_REJECTS = 20
+PRODUCT_STATUSES = ('Available', 'Temporarily Unavailable', 'Discontinued')
+
+# The WHERE clauses skip rows that have not changed, so re-importing a file
+# does not fire the search and catalog_version triggers for nothing
+PRODUCT_UPSERT_SQL = """
+    INSERT INTO products (category_id, product_code, product_description,
+                          product_manufacturer, product_model, product_status)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (product_code) DO UPDATE SET
+        category_id = excluded.category_id,
+        product_description = excluded.product_description,
+        product_manufacturer = excluded.product_manufacturer,
+        product_model = excluded.product_model,
+        product_status = excluded.product_status
+    WHERE products.category_id IS NOT excluded.category_id
+       OR products.product_description IS NOT excluded.product_description
+       OR products.product_manufacturer IS NOT excluded.product_manufacturer
+       OR products.product_model IS NOT excluded.product_model
+       OR products.product_status IS NOT excluded.product_status
+"""
+
+OFFER_UPSERT_SQL = """
+    INSERT INTO product_sellers (product_id, seller_id, price)
+    SELECT product_id, ?, ? FROM products WHERE product_code = ?
+    ON CONFLICT (product_id, seller_id) DO UPDATE SET price = excluded.price
+    WHERE product_sellers.price IS NOT excluded.price
+"""
+
+
+class ImportReport:
+    """Counts and timings from an import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.products = 0
+        self.offers = 0
+        self.rejected = Counter()
+        self.reject_samples = []
+        self.elapsed = 0.0
+
+    def reject(self, line_no, reason):
+        self.rejected[reason.split(":")[0]] += 1
+        if len(self.reject_samples) < MAX_REPORTED_REJECTS:
+            self.reject_samples.append((line_no, reason))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'products': self.products,
+            'offers': self.offers,
+            'rejected': sum(self.rejected.values()),
+            'seconds': self.elapsed,
+            'rows_per_second': self.rows / self.elapsed if self.elapsed else 0.0,
+            'rejected_by_reason': dict(self.rejected),
+            'reject_samples': self.reject_samples,
+        }
+
+    def summary(self):
+        """One line for a person to read"""
+        summary = self.as_dict()
+        return (f"{summary['rows']} rows in {summary['seconds']:.2f}s "
+                f"({summary['rows_per_second']:.0f} rows/s): {summary['products']} products, "
+                f"{summary['offers']} offers, {summary['rejected']} rejected")
+
+
+def read_rows(lines, fmt):
+    """Yield (line number, row dict) from CSV or JSONL text without loading it all"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, f"invalid JSON: {e}"
+
+
+def file_format(path):
+    """'csv' or 'jsonl' from the file name"""
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def load_lookups(conn):
+    """Category code and seller account ref maps, each read in one query"""
+    categories = dict(conn.execute("SELECT category_code, category_id FROM categories"))
+    sellers = dict(conn.execute("SELECT seller_account_ref, seller_id FROM sellers"))
+    return categories, sellers
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def clean_row(row, categories, sellers):
+    """Return (product params, offer params or None), or raise ValueError with the reason"""
+    if not isinstance(row, dict):
+        raise ValueError(row if isinstance(row, str) else "invalid row: not an object")
+    code = _text(row, 'product_code')
+    description = _text(row, 'description')
+    manufacturer = _text(row, 'manufacturer')
+    for key, value in (('product_code', code), ('description', description), ('manufacturer', manufacturer)):
+        if value is None:
+            raise ValueError(f"missing field: {key}")
+
+    category_code = _text(row, 'category_code')
+    category_id = categories.get(category_code)
+    if category_id is None:
+        raise ValueError(f"unknown category: {category_code}")
+
+    status = _text(row, 'status') or 'Available'
+    if status not in PRODUCT_STATUSES:
+        raise ValueError(f"invalid status: {status}")
+    product = (category_id, code, description, manufacturer, _text(row, 'model'), status)
+
+    seller_ref = _text(row, 'seller_ref')
+    if seller_ref is None:
+        return product, None
+    seller_id = sellers.get(seller_ref)
+    if seller_id is None:
+        raise ValueError(f"unknown seller: {seller_ref}")
+    # Only text (CSV, or a JSON string) or a JSON number; booleans and the like are not prices
+    value = row.get('price')
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"invalid price: {value}")
+    try:
+        price = Money.from_pounds(value, exact=True)
+    except ValueError:
+        raise ValueError(f"invalid price: {value}")
+    if price <= 0:
+        raise ValueError(f"invalid price: {row.get('price')}")
+    return product, (seller_id, price, code)
+
+
+def _write_chunk(conn, chunk, report):
+    """Upsert one chunk; if the database rejects it, retry row by row to find the bad rows"""
+    conn.execute("SAVEPOINT import_chunk")
+    try:
+        conn.executemany(PRODUCT_UPSERT_SQL, [product for _, product, _ in chunk])
+        conn.executemany(OFFER_UPSERT_SQL, [offer for _, _, offer in chunk if offer])
+        conn.execute("RELEASE import_chunk")
+        report.products += len(chunk)
+        report.offers += sum(1 for _, _, offer in chunk if offer)
+        return
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO import_chunk")
+        conn.execute("RELEASE import_chunk")
+
+    for line_no, product, offer in chunk:
+        conn.execute("SAVEPOINT import_row")
+        try:
+            conn.execute(PRODUCT_UPSERT_SQL, product)
+            if offer:
+                conn.execute(OFFER_UPSERT_SQL, offer)
+            conn.execute("RELEASE import_row")
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO import_row")
+            conn.execute("RELEASE import_row")
+            report.reject(line_no, f"rejected by database: {e}")
+            continue
+        report.products += 1
+        report.offers += 1 if offer else 0
+
+
+def import_rows(conn, rows, chunk_size=DEFAULT_CHUNK_SIZE, transaction_rows=DEFAULT_TRANSACTION_ROWS):
+    """Upsert (line number, row) pairs in chunks, committing every transaction_rows rows.
+
+    Rows are validated in Python against lookup maps loaded once, so the
+    database only sees rows that can be written and each chunk goes in with
+    two executemany calls. Bounded transactions keep the WAL and the write
+    lock short for everyone else while a big file streams in.
+    """
+    report = ImportReport()
+    categories, sellers = load_lookups(conn)
+    if conn.in_transaction:
+        conn.commit()
+    chunk = []
+    in_transaction = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal in_transaction
+        if not conn.in_transaction:
+            retry_on_busy(conn.execute, "BEGIN IMMEDIATE")
+        _write_chunk(conn, chunk, report)
+        in_transaction += len(chunk)
+        chunk.clear()
+        if in_transaction >= transaction_rows:
+            conn.commit()
+            in_transaction = 0
+
+    try:
+        for line_no, row in rows:
+            report.rows += 1
+            try:
+                product, offer = clean_row(row, categories, sellers)
+            except ValueError as e:
+                report.reject(line_no, str(e))
+                continue
+            chunk.append((line_no, product, offer))
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def import_file(conn, path, fmt=None, **options):
+    """Import a CSV or JSONL file (format from the extension unless given)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return import_rows(conn, read_rows(f, fmt or file_format(path)), **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import products and seller offers from CSV or JSONL")
+    parser.add_argument("file", help="CSV or JSONL file, or - for JSONL on stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="override the format from the file name")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per executemany")
+    parser.add_argument("--transaction-rows", type=int, default=DEFAULT_TRANSACTION_ROWS,
+                        help="rows per commit")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    options = {'chunk_size': max(1, args.chunk_size), 'transaction_rows': max(1, args.transaction_rows)}
+    if args.file != "-" and not os.path.exists(args.file):
+        print(f"No such file: {args.file}", file=sys.stderr)
+        return 2
+    with get_pool().connection() as conn:
+        if args.file == "-":
+            report = import_rows(conn, read_rows(sys.stdin, args.format or 'jsonl'), **options)
+        else:
+            report = import_file(conn, args.file, args.format, **options)
+
+    summary = report.as_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(report.summary())
+        for reason, count in report.rejected.most_common():
+            print(f"  {reason}: {count}")
+        for line_no, reason in report.reject_samples:
+            print(f"  line {line_no}: {reason}")
+    return 1 if summary['rejected'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import sys
+
+import auth
+import basket
+import catalog
+import order_export
+import orders
+import reviews
+import search
+import shopper_session
+from database import get_pool
+
+# Hot queries run on every shopper interaction: (name, sql, sample params, tables allowed to be scanned)
+# The category list reads the whole (tiny) table on purpose, so it may scan.
+HOT_QUERIES = [
+    ("login", auth.SHOPPER_BY_EMAIL_SQL, ("someone@example.com",), ()),
+    ("current basket", shopper_session.CURRENT_BASKET_SQL, (1,), ()),
+    ("order history", orders.ORDER_HISTORY_FIRST_PAGE_SQL, (1, 10), ()),
+    ("order history next page", orders.ORDER_HISTORY_NEXT_PAGE_SQL, (1, '2024-01-01', 1, 10), ()),
+    ("order lines", orders.ORDER_LINES_SQL.format(placeholders="?, ?"), (1, 2), ()),
+    ("category list", catalog.CATEGORIES_SQL, (), ("categories",)),
+    ("category products", catalog.CATEGORY_PRODUCTS_SQL, (1,), ()),
+    ("product sellers", catalog.PRODUCT_SELLERS_SQL, (1,), ()),
+    ("basket contents", basket.BASKET_SQL, (1,), ()),
+    ("product search", search.SEARCH_SQL.format(status_filter="AND p.product_status != 'Discontinued'"),
+     ('"sony"*', 11, 0), ("product_search",)),
+    ("order export", order_export.export_query('2024-01-01', '2024-02-01', ['Complete'])[0],
+     ('2024-01-01', '2024-02-01', 'Complete'), ()),
+    ("seller reviews", reviews.REVIEWS_NEXT_PAGE_SQL.format(reviews="seller_reviews", key="seller_id"),
+     (1, '2024-01-01', 1, 10), ()),
+]
+
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[3] for row in rows]
+
+
+def full_scans(plan, allowed=()):
+    """Return plan lines that scan a whole table not listed in allowed"""
+    scans = []
+    for detail in plan:
+        if not detail.startswith("SCAN "):
+            continue
+        table = detail.split()[1]
+        # "(subquery-N)" scans an intermediate result that was already filtered
+        if not table.startswith("(") and table not in allowed:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Return {query name: offending plan lines} for hot queries that do a full scan"""
+    failures = {}
+    for name, sql, params, allowed in queries:
+        scans = full_scans(explain(conn, sql, params), allowed)
+        if scans:
+            failures[name] = scans
+    return failures
+
+
+def main():
+    with get_pool().connection() as conn:
+        failures = check_query_plans(conn)
+
+    if not failures:
+        print(f"All {len(HOT_QUERIES)} hot queries use an index")
+        return 0
+
+    for name, scans in failures.items():
+        print(f"FULL SCAN in {name}:")
+        for detail in scans:
+            print(f"  {detail}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
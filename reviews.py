@@ -0,0 +1,77 @@
+# Product and seller reviews, newest first, with the rating aggregates that
+# migration 8 keeps up to date (count, sum and a 1-5 star histogram)
+
+# kind: (review table, key column, aggregate table)
+REVIEW_TABLES = {
+    'product': ('product_reviews', 'product_id', 'product_ratings'),
+    'seller': ('seller_reviews', 'seller_id', 'seller_ratings'),
+}
+
+# Keyset-paginated on (review_date, review_id) newest first
+REVIEWS_FIRST_PAGE_SQL = """
+    SELECT r.review_id, r.rating, r.comment, r.review_date,
+           sh.shopper_first_name || ' ' || SUBSTR(sh.shopper_surname, 1, 1) as reviewer
+    FROM {reviews} r
+    JOIN shoppers sh ON sh.shopper_id = r.shopper_id
+    WHERE r.{key} = ?
+    ORDER BY r.review_date DESC, r.review_id DESC
+    LIMIT ?
+"""
+
+REVIEWS_NEXT_PAGE_SQL = """
+    SELECT r.review_id, r.rating, r.comment, r.review_date,
+           sh.shopper_first_name || ' ' || SUBSTR(sh.shopper_surname, 1, 1) as reviewer
+    FROM {reviews} r
+    JOIN shoppers sh ON sh.shopper_id = r.shopper_id
+    WHERE r.{key} = ?
+    AND (r.review_date, r.review_id) < (?, ?)
+    ORDER BY r.review_date DESC, r.review_id DESC
+    LIMIT ?
+"""
+
+RATING_SQL = """
+    SELECT rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5
+    FROM {ratings}
+    WHERE {key} = ?
+"""
+
+REVIEW_PAGE_SIZE = 10
+
+
+def _tables(kind):
+    try:
+        return REVIEW_TABLES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown review kind: {kind}")
+
+
+def rating_summary(conn, kind, item_id):
+    """Return {count, average, histogram} for a product or seller from the aggregates.
+
+    histogram[n - 1] is the number of n-star reviews; average is None when
+    there are no reviews.
+    """
+    reviews, key, ratings = _tables(kind)
+    row = conn.execute(RATING_SQL.format(ratings=ratings, key=key), (item_id,)).fetchone()
+    if row is None or not row[0]:
+        return {'count': 0, 'average': None, 'histogram': [0] * 5}
+    return {'count': row[0], 'average': row[1] / row[0], 'histogram': list(row[2:])}
+
+
+def review_page(conn, kind, item_id, page_size=REVIEW_PAGE_SIZE, after=None):
+    """Return (reviews, next_cursor) for one page of a product's or seller's reviews.
+
+    Pass the returned cursor as ``after`` to fetch the next page; it is None
+    once there are no more reviews.
+    """
+    reviews, key, _ = _tables(kind)
+    if after is None:
+        rows = conn.execute(REVIEWS_FIRST_PAGE_SQL.format(reviews=reviews, key=key),
+                            (item_id, page_size)).fetchall()
+    else:
+        rows = conn.execute(REVIEWS_NEXT_PAGE_SQL.format(reviews=reviews, key=key),
+                            (item_id, after[0], after[1], page_size)).fetchall()
+    next_cursor = None
+    if len(rows) == page_size:
+        next_cursor = (rows[-1]['review_date'], rows[-1]['review_id'])
+    return rows, next_cursor
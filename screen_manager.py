@@ -0,0 +1,62 @@
+import time
+import tkinter as tk
+
+
+class ScreenManager:
+    """Stack of screens that are built once and switched with tkraise.
+
+    register(name, build) records how to build a screen; build(frame) fills
+    the frame and may return a refresh function. The first show() builds the
+    screen; every show() raises it and calls refresh, so switching screens
+    only updates data instead of recreating widgets.
+    """
+
+    def __init__(self, parent, **frame_options):
+        self.frame_options = frame_options
+        self.container = tk.Frame(parent, **frame_options)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        self.current = None
+        self.last_switch = None     # (name, built, seconds) for the timing harness
+        self._builders = {}
+        self._screens = {}
+        self._refreshers = {}
+
+    def register(self, name, build):
+        """Add a screen; it is not built until it is first shown"""
+        self._builders[name] = build
+
+    def is_built(self, name):
+        return name in self._screens
+
+    def frame(self, name):
+        """Return a screen's frame, building it if needed"""
+        frame = self._screens.get(name)
+        if frame is None:
+            frame = tk.Frame(self.container, **self.frame_options)
+            frame.grid(row=0, column=0, sticky='nsew')
+            self._refreshers[name] = self._builders[name](frame)
+            self._screens[name] = frame
+        return frame
+
+    def show(self, name):
+        """Raise a screen (building it the first time) and refresh its data"""
+        started = time.perf_counter()
+        built = not self.is_built(name)
+        frame = self.frame(name)
+        frame.tkraise()
+        self.current = name
+        refresh = self._refreshers.get(name)
+        if refresh is not None:
+            refresh()
+        self.last_switch = (name, built, time.perf_counter() - started)
+        return frame
+
+    def forget(self, name):
+        """Destroy a built screen so the next show() builds it again"""
+        frame = self._screens.pop(name, None)
+        self._refreshers.pop(name, None)
+        if frame is not None:
+            frame.destroy()
+        if self.current == name:
+            self.current = None
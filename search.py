@@ -0,0 +1,60 @@
+import re
+
+from money import Money
+
+SEARCH_PAGE_SIZE = 10
+
+# Column weights for bm25(): description, manufacturer, model, code
+SEARCH_SQL = """
+    SELECT p.product_id, p.product_description, p.product_manufacturer,
+           p.product_model, p.product_code, p.product_status,
+           ps.min_price,
+           bm25(product_search, 10.0, 5.0, 5.0, 2.0) as rank
+    FROM product_search
+    JOIN products p ON p.product_id = product_search.rowid
+    LEFT JOIN product_summary ps ON ps.product_id = p.product_id
+    WHERE product_search MATCH ?
+    {status_filter}
+    ORDER BY rank, p.product_id
+    LIMIT ? OFFSET ?
+"""
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted so characters the user types can never be read as FTS5
+    syntax. Returns None if the text has no searchable words.
+    """
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_products(conn, text, page=0, page_size=SEARCH_PAGE_SIZE, include_discontinued=False):
+    """Return one page of products matching text, best match first.
+
+    Returns (rows, has_more). Discontinued products are skipped unless
+    include_discontinued is set.
+    """
+    query = match_expression(text)
+    if query is None:
+        return [], False
+
+    status_filter = "" if include_discontinued else "AND p.product_status != 'Discontinued'"
+    sql = SEARCH_SQL.format(status_filter=status_filter)
+    rows = conn.execute(sql, (query, page_size + 1, page * page_size)).fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+def describe(row):
+    """One-line description of a search result for option lists"""
+    text = row['product_description']
+    if row['min_price'] is not None:
+        text += f" (from {Money(row['min_price'])})"
+    if row['product_status'] != 'Available':
+        text += f" [{row['product_status']}]"
+    return text
@@ -0,0 +1,109 @@
+from basket import BasketService
+from catalog import get_catalog_cache
+from orders import ORDER_HISTORY_PAGE_SIZE, checkout_key, order_history_page, place_order
+
+CURRENT_BASKET_SQL = """
+    SELECT basket_id
+    FROM shopper_baskets
+    WHERE shopper_id = ?
+    AND basket_created_date_time >= DATE('now')
+    AND basket_created_date_time < DATE('now', '+1 day')
+    ORDER BY basket_created_date_time DESC
+    LIMIT 1
+"""
+
+
+class ShopperError(Exception):
+    """Raised when a shopper operation cannot be carried out"""
+
+
+def find_shopper(conn, shopper_id):
+    """Return the shopper's name row, or None if there is no such shopper"""
+    return conn.execute("""
+        SELECT shopper_first_name, shopper_surname
+        FROM shoppers
+        WHERE shopper_id = ?
+    """, (shopper_id,)).fetchone()
+
+
+def get_current_basket(conn, shopper_id):
+    """Return the id of the shopper's basket created today, or None"""
+    result = conn.execute(CURRENT_BASKET_SQL, (shopper_id,)).fetchone()
+    if result:
+        return result['basket_id']
+    return None
+
+
+class ShopperSession:
+    """The shopper operations, free of any prompting or printing.
+
+    Both the interactive CLI and the batch runner drive the app through this
+    class. With autocommit off, basket edits are left in the open transaction
+    for the caller to commit in batches (checkout always commits).
+    """
+
+    def __init__(self, conn, shopper_id, autocommit=True):
+        self.conn = conn
+        self.shopper_id = shopper_id
+        self.baskets = BasketService(conn, autocommit=autocommit)
+        self.basket_id = get_current_basket(conn, shopper_id)
+
+    def basket(self):
+        """Return the current Basket (empty if the shopper has none)"""
+        return self.baskets.get(self.basket_id)
+
+    def _line(self, product_id):
+        line = self.basket().find(product_id)
+        if line is None:
+            raise ShopperError(f"Product {product_id} is not in the basket")
+        return line
+
+    def add_item(self, product_id, seller_id, quantity, price=None):
+        """Add a product from a seller at price (pence), looking up the seller's price if not given"""
+        if quantity <= 0:
+            raise ShopperError("The quantity must be greater than 0")
+        if price is None:
+            offer = [seller for seller in get_catalog_cache().product_sellers(product_id)
+                     if seller[0] == seller_id]
+            if not offer:
+                raise ShopperError(f"Seller {seller_id} does not sell product {product_id}")
+            price = offer[0][2]
+        if self.basket().find(product_id) is not None:
+            raise ShopperError(f"Product {product_id} is already in the basket; change its quantity instead")
+        self.basket_id = self.baskets.add_item(self.shopper_id, self.basket_id,
+                                               product_id, seller_id, quantity, price)
+        return self.basket()
+
+    def change_quantity(self, product_id, quantity):
+        """Set the quantity of a product already in the basket"""
+        if quantity <= 0:
+            raise ShopperError("The quantity must be greater than 0")
+        self._line(product_id)
+        return self.baskets.change_quantity(self.basket_id, product_id, quantity)
+
+    def remove_item(self, product_id):
+        """Remove a product from the basket"""
+        self._line(product_id)
+        return self.baskets.remove_item(self.basket_id, product_id)
+
+    def checkout(self, idempotency_key=None):
+        """Place an order for the basket and return its order id.
+
+        Repeating a checkout with the same idempotency key returns the order
+        the first one placed, even though that basket is gone by then.
+        """
+        if idempotency_key is None:
+            if self.basket().is_empty():
+                raise ShopperError("The basket is empty")
+            idempotency_key = checkout_key(self.basket_id)
+        # place_order looks the key up before it looks at the basket
+        order_id = place_order(self.conn, self.shopper_id, self.basket_id, idempotency_key)
+        if order_id is None:
+            raise ShopperError("The basket is empty")
+        self.baskets.forget(self.basket_id)
+        self.basket_id = get_current_basket(self.conn, self.shopper_id)
+        return order_id
+
+    def order_history(self, after=None, page_size=ORDER_HISTORY_PAGE_SIZE):
+        """Return (orders, next_cursor) for one page of order history"""
+        return order_history_page(self.conn, self.shopper_id, page_size, after)
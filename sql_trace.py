@@ -0,0 +1,334 @@
+import atexit
+import json
+import re
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+# Statement tracing is opt-in. database.connect only builds connections from
+# TracedConnection when tracing was switched on before they were opened, so
+# with tracing off the app uses plain sqlite3 connections and pays nothing.
+
+DEFAULT_SLOW_QUERY_MS = 50
+SAMPLES_PER_STATEMENT = 1024     # recent timings kept per statement for p99
+SLOW_LOG_SIZE = 200
+NORMALIZE_CACHE_SIZE = 4096
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def normalize(sql):
+    """Collapse a statement to a stable shape: literals and IN lists become ?"""
+    text = _SPACE_RE.sub(" ", sql).strip()
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    return _IN_LIST_RE.sub("(?...)", text)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class StatementStats:
+    """Running totals for one normalized statement"""
+
+    __slots__ = ('sql', 'calls', 'total', 'max', 'rows', 'errors', 'samples', 'plan')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.samples = deque(maxlen=SAMPLES_PER_STATEMENT)
+        self.plan = None
+
+    def as_dict(self):
+        samples = sorted(self.samples)
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.calls * 1000 if self.calls else 0.0,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class SqlTracer:
+    """Collects per-statement timings from traced connections"""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_seconds = DEFAULT_SLOW_QUERY_MS / 1000
+        self.statements = {}
+        self.slow_log = deque(maxlen=SLOW_LOG_SIZE)
+        self._normalized = {}
+        self._lock = threading.Lock()
+
+    def enable(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        """Start tracing; only connections opened from now on are traced"""
+        self.slow_seconds = slow_query_ms / 1000
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording (traced connections fall back to a flag check per call)"""
+        self.enabled = False
+
+    def reset(self):
+        """Forget all statistics and the slow-query log"""
+        with self._lock:
+            self.statements.clear()
+            self.slow_log.clear()
+
+    def _stats_for(self, sql):
+        key = self._normalized.get(sql)
+        if key is None:
+            key = normalize(sql)
+            if len(self._normalized) >= NORMALIZE_CACHE_SIZE:
+                self._normalized.clear()
+            self._normalized[sql] = key
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = self.statements.setdefault(key, StatementStats(key))
+        return stats
+
+    def record(self, conn, sql, params, elapsed, rows, failed=False):
+        """Add one finished call, capturing the query plan if it was slow"""
+        with self._lock:
+            stats = self._stats_for(sql)
+            stats.calls += 1
+            stats.total += elapsed
+            stats.rows += max(rows, 0)
+            stats.samples.append(elapsed)
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if failed:
+                stats.errors += 1
+        if elapsed >= self.slow_seconds:
+            self._log_slow(conn, stats, sql, params, elapsed)
+
+    def _log_slow(self, conn, stats, sql, params, elapsed):
+        if stats.plan is None:
+            stats.plan = explain(conn, sql, params)
+        entry = {
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'ms': elapsed * 1000,
+            'sql': stats.sql,
+            'params': _printable(params),
+            'plan': stats.plan,
+        }
+        with self._lock:
+            self.slow_log.append(entry)
+
+    def snapshot(self):
+        """Return the statistics and slow-query log as plain data"""
+        with self._lock:
+            statements = [stats.as_dict() for stats in self.statements.values()]
+            slow = list(self.slow_log)
+        statements.sort(key=lambda s: s['total_ms'], reverse=True)
+        return {'slow_query_ms': self.slow_seconds * 1000, 'statements': statements, 'slow_queries': slow}
+
+    def dump(self, file=None, limit=20):
+        """Print the most expensive statements and recent slow queries"""
+        print_report(self.snapshot(), file or sys.stderr, limit)
+
+    def dump_json(self, path):
+        """Write snapshot() to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+tracer = SqlTracer()
+
+
+def _printable(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: repr(value) for key, value in params.items()}
+    try:
+        return [repr(value) for value in params]
+    except TypeError:
+        return repr(params)
+
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN lines for a statement, or None if it has no plan"""
+    if params is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        # The base class execute is untraced, so this never records itself
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except (sqlite3.Error, ValueError):
+        return None
+    return [row[3] for row in rows]
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each statement from execute until its rows are read"""
+
+    _call = None
+
+    def _finish(self, failed=False):
+        call, self._call = self._call, None
+        if call is not None:
+            sql, params, elapsed, rows = call
+            tracer.record(self.connection, sql, params, elapsed, rows, failed)
+
+    def _start(self, method, sql, params, logged_params):
+        self._finish()
+        if not tracer.enabled:
+            return method(sql, params)
+        started = time.perf_counter()
+        try:
+            result = method(sql, params)
+        except Exception:
+            self._call = [sql, logged_params, time.perf_counter() - started, 0]
+            self._finish(failed=True)
+            raise
+        elapsed = time.perf_counter() - started
+        if self.description is None:
+            # No result set, so the statement is already done
+            self._call = [sql, logged_params, elapsed, self.rowcount]
+            self._finish()
+        else:
+            self._call = [sql, logged_params, elapsed, 0]
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._start(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Parameter batches can be huge, so only the statement is logged
+        return self._start(super().executemany, sql, seq_of_parameters, None)
+
+    def _fetch(self, method, *args):
+        call = self._call
+        if call is None:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        call[2] += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if self._call is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._call[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if self._call is not None:
+            self._call[3] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        if self._call is not None:
+            self._call[3] += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._call is not None:
+            self._call[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose statements are all run through TracedCursor"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _dump_on_signal(signum, frame):
+    tracer.dump()
+
+
+def install_dump_signal():
+    """Dump the trace to stderr on SIGUSR1 (POSIX, main thread only)"""
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _dump_on_signal)
+
+
+def enable_from_settings(slow_query_ms, dump_path=None):
+    """Switch tracing on for this process: dump on SIGUSR1 and at exit"""
+    tracer.enable(slow_query_ms)
+    install_dump_signal()
+    if dump_path:
+        atexit.register(tracer.dump_json, dump_path)
+    else:
+        atexit.register(tracer.dump)
+
+
+def print_report(report, file, limit=None):
+    """Print a snapshot() dict: costliest statements first, then the slow-query log"""
+    print(f"{'calls':>7} {'total ms':>10} {'mean':>8} {'p99':>8} {'max':>8} {'rows':>8}  statement", file=file)
+    for s in report['statements'][:limit]:
+        print(f"{s['calls']:>7} {s['total_ms']:>10.1f} {s['mean_ms']:>8.2f} {s['p99_ms']:>8.2f} "
+              f"{s['max_ms']:>8.2f} {s['rows']:>8}  {s['sql'][:100]}", file=file)
+    slow = report['slow_queries'][-limit:] if limit else report['slow_queries']
+    if slow:
+        print(f"\nSlow queries (>= {report['slow_query_ms']:g} ms):", file=file)
+        for entry in slow:
+            print(f"{entry['at']} {entry['ms']:.1f} ms  {entry['sql'][:100]}", file=file)
+            for line in entry['plan'] or []:
+                print(f"    {line}", file=file)
+
+
+def main():
+    """Print a trace written to ORINOCO_TRACE_SQL_OUT"""
+    if len(sys.argv) != 2:
+        print("usage: python sql_trace.py trace.json")
+        return 1
+    with open(sys.argv[1]) as f:
+        print_report(json.load(f), sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
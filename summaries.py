@@ -0,0 +1,99 @@
+import sys
+
+from database import get_pool
+from migrations import ORDER_ROLLUPS_SQL, SHOPPER_ROLLUPS_SQL, rebuild_rollups
+
+# Precomputed rollups kept up to date by triggers and write paths; the
+# rebuild functions recompute them from scratch.
+
+
+def rebuild_product_summary(conn):
+    """Recompute product_summary from product_sellers and return the row count"""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DELETE FROM product_summary")
+        cursor.execute("""
+            INSERT INTO product_summary (product_id, seller_count, min_price, max_price)
+            SELECT p.product_id, COUNT(ps.seller_id), MIN(ps.price), MAX(ps.price)
+            FROM products p
+            LEFT JOIN product_sellers ps ON ps.product_id = p.product_id
+            GROUP BY p.product_id
+        """)
+        count = cursor.rowcount
+        conn.commit()
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def find_rollup_drift(conn):
+    """Compare the stored rollups with a fresh aggregation and return the differences.
+
+    Each difference is (table, id, stored values, expected values); a row that
+    is missing on one side shows up as None.
+    """
+    drift = []
+    checks = [
+        ("order_rollups", "order_id", ("item_count", "order_value"), ORDER_ROLLUPS_SQL),
+        ("shopper_rollups", "shopper_id", ("order_count", "lifetime_spend"), SHOPPER_ROLLUPS_SQL),
+    ]
+    for table, key, columns, expected_sql in checks:
+        stored = {row[0]: tuple(row[1:]) for row in
+                  conn.execute(f"SELECT {key}, {', '.join(columns)} FROM {table}")}
+        expected = {row[0]: tuple(row[1:]) for row in conn.execute(expected_sql)}
+        for row_id in stored.keys() | expected.keys():
+            have = stored.get(row_id)
+            want = expected.get(row_id)
+            if have is None or want is None:
+                # A shopper whose orders are all cancelled may have a zeroed row
+                if (have or want) == (0, 0):
+                    continue
+                drift.append((table, row_id, have, want))
+            elif have != want:
+                drift.append((table, row_id, have, want))
+    return drift
+
+
+def verify_rollups(conn, repair=False):
+    """Report rollup drift, rebuilding the rollups if repair is set"""
+    drift = find_rollup_drift(conn)
+    if drift and repair:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rebuild_rollups(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return drift
+
+
+def main(argv):
+    commands = ("rebuild-product-summary", "verify-rollups", "repair-rollups")
+    if len(argv) != 2 or argv[1] not in commands:
+        print(f"Usage: python summaries.py {{{'|'.join(commands)}}}")
+        return 2
+
+    with get_pool().connection() as conn:
+        if argv[1] == "rebuild-product-summary":
+            count = rebuild_product_summary(conn)
+            print(f"Rebuilt product_summary ({count} products)")
+            return 0
+
+        drift = verify_rollups(conn, repair=argv[1] == "repair-rollups")
+
+    for table, row_id, have, want in drift:
+        print(f"{table} {row_id}: stored {have}, expected {want}")
+    if not drift:
+        print("Rollups match the order history")
+        return 0
+    if argv[1] == "repair-rollups":
+        print(f"Rebuilt rollups ({len(drift)} rows had drifted)")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from analytics import (DIMENSIONS, grouped_sales, load_sales, sales_summary, sql_grouped_sales,
+                       sql_sales_summary, sql_status_breakdown, status_breakdown)
+from database import ConnectionPool
+from valuation import LINE_STATUSES
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class SalesReportTest(unittest.TestCase):
+    """The reports built on valuation.load_lines agree with the same reports in SQL"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.conn = self.pool.acquire()
+        self.sales = load_sales(self.conn)
+
+    def tearDown(self):
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def test_grouped_reports_match_sql(self):
+        for key in DIMENSIONS:
+            report = {row['key']: (row['revenue'], row['units'], row['orders'])
+                      for row in grouped_sales(self.sales, key)}
+            self.assertEqual(report, sql_grouped_sales(self.conn, key), key)
+
+    def test_summary_and_line_status_match_sql(self):
+        summary = sales_summary(self.sales)
+        self.assertEqual((summary['revenue'], summary['units'], summary['orders']),
+                         sql_sales_summary(self.conn))
+        breakdown = {LINE_STATUSES.index(row['status']): (row['lines'], row['units'], row['value'])
+                     for row in status_breakdown(self.sales)}
+        self.assertEqual(breakdown, sql_status_breakdown(self.conn))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from api_server import ApiServer
+from database import ConnectionPool
+from shopper_session import ShopperSession
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class ApiClientErrorTest(unittest.IsolatedAsyncioTestCase):
+    """Bad requests get a 4xx answer instead of a 500 or a dropped connection"""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, self.path)
+        self.pool = ConnectionPool(self.path, size=1)
+        self.conn = self.pool.acquire()
+        self.shoppers = [row[0] for row in self.conn.execute(
+            "SELECT shopper_id FROM shoppers ORDER BY shopper_id LIMIT 2")]
+        self.offers = [tuple(row) for row in self.conn.execute("""
+            SELECT product_id, seller_id, MIN(price) FROM product_sellers
+            GROUP BY product_id ORDER BY product_id LIMIT 2
+        """)]
+        self.server = ApiServer("127.0.0.1", 0, workers=1, sweep_minutes=0, path=self.path)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.shutdown()
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    async def send(self, head, body=b""):
+        """Send a raw request and return (status, JSON body)"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(head.encode("latin-1") + b"\r\nConnection: close\r\n\r\n" + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        self.assertTrue(response, "the server closed the connection without answering")
+        status_line, _, rest = response.partition(b"\r\n")
+        return int(status_line.split()[1]), json.loads(rest.partition(b"\r\n\r\n")[2])
+
+    async def post(self, path, data, headers=""):
+        body = json.dumps(data).encode()
+        return await self.send(f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}{headers}", body)
+
+    def fill_basket(self, shopper_id, offer):
+        session = ShopperSession(self.conn, shopper_id)
+        product_id, seller_id, price = offer
+        session.add_item(product_id, seller_id, 1, price)
+        return session
+
+    async def test_bad_content_length(self):
+        path = f"/shoppers/{self.shoppers[0]}/checkout"
+        for value in ("abc", "-1", "1e3", "+5", "²"):
+            status, _ = await self.send(f"POST {path} HTTP/1.1\r\nContent-Length: {value}")
+            self.assertEqual(status, 400, value)
+        status, _ = await self.send(f"POST {path} HTTP/1.1\r\nContent-Length: 99999999999999999999")
+        self.assertEqual(status, 413)
+
+    async def test_path_ids_out_of_range(self):
+        huge = "99999999999999999999"
+        for method, path in (("GET", f"/products/{huge}/sellers"),
+                             ("GET", f"/shoppers/{huge}/basket"),
+                             ("DELETE", f"/shoppers/{self.shoppers[0]}/basket/items/{huge}")):
+            status, _ = await self.send(f"{method} {path} HTTP/1.1")
+            self.assertEqual(status, 404, path)
+
+    async def test_idempotency_key_must_be_a_string(self):
+        self.fill_basket(self.shoppers[0], self.offers[0])
+        for key in (42, ["abc"], {"key": "abc"}):
+            status, data = await self.post(f"/shoppers/{self.shoppers[0]}/checkout", {"idempotency_key": key})
+            self.assertEqual(status, 400, key)
+        self.assertFalse(ShopperSession(self.conn, self.shoppers[0]).basket().is_empty())
+
+    async def test_idempotency_keys_are_per_shopper(self):
+        self.fill_basket(self.shoppers[0], self.offers[0])
+        status, first = await self.post(f"/shoppers/{self.shoppers[0]}/checkout", {}, "\r\nIdempotency-Key: abc")
+        self.assertEqual(status, 201)
+
+        self.fill_basket(self.shoppers[1], self.offers[1])
+        status, second = await self.post(f"/shoppers/{self.shoppers[1]}/checkout", {}, "\r\nIdempotency-Key: abc")
+        self.assertEqual(status, 201)
+        self.assertNotEqual(second["order_id"], first["order_id"])
+
+        self.fill_basket(self.shoppers[0], self.offers[1])
+        status, _ = await self.post(f"/shoppers/{self.shoppers[0]}/checkout", {}, "\r\nIdempotency-Key: abc")
+        self.assertEqual(status, 409)
+
+
+if __name__ == "__main__":
+    unittest.main()
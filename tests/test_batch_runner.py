@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from batch_runner import INVALID_LINE, read_script, run_script
+from database import ConnectionPool
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class RunScriptTest(unittest.TestCase):
+    """Bad script lines are reported one by one without undoing the rest of the batch"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.conn = self.pool.acquire()
+        self.shopper_id = self.conn.execute("SELECT MIN(shopper_id) FROM shoppers").fetchone()[0]
+        offers = self.conn.execute("""
+            SELECT product_id, MIN(seller_id) FROM product_sellers GROUP BY product_id ORDER BY product_id LIMIT 2
+        """).fetchall()
+        self.offers = [tuple(offer) for offer in offers]
+
+    def tearDown(self):
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def add_item(self, offer):
+        product_id, seller_id = offer
+        return (f'{{"op": "add_item", "shopper_id": {self.shopper_id}, '
+                f'"product_id": {product_id}, "seller_id": {seller_id}, "quantity": 1, "price": "9.99"}}')
+
+    def run_lines(self, lines):
+        return run_script(self.conn, read_script(lines), commit_batch=100)
+
+    def basket_products(self):
+        return [row[0] for row in self.conn.execute("""
+            SELECT bc.product_id
+            FROM basket_contents bc
+            JOIN shopper_baskets sb ON sb.basket_id = bc.basket_id
+            WHERE sb.shopper_id = ?
+            ORDER BY bc.product_id
+        """, (self.shopper_id,))]
+
+    def error_lines(self, report):
+        return [line_no for line_no, _, _ in report.error_samples]
+
+    def test_malformed_json_keeps_earlier_ops(self):
+        report = self.run_lines([self.add_item(self.offers[0]), "{bad", self.add_item(self.offers[1])])
+        self.assertEqual(self.error_lines(report), [2])
+        self.assertEqual(report.errors[INVALID_LINE], 1)
+        self.assertEqual(self.basket_products(), sorted(offer[0] for offer in self.offers))
+
+    def test_lines_that_are_not_objects(self):
+        report = self.run_lines([self.add_item(self.offers[0]), "[1, 2]", '"add_item"', "42", "null"])
+        self.assertEqual(self.error_lines(report), [2, 3, 4, 5])
+        self.assertEqual(report.ops[INVALID_LINE], 4)
+        self.assertEqual(self.basket_products(), [self.offers[0][0]])
+
+    def test_missing_or_unknown_op(self):
+        report = self.run_lines([
+            self.add_item(self.offers[0]),
+            f'{{"shopper_id": {self.shopper_id}}}',
+            f'{{"op": ["add_item"], "shopper_id": {self.shopper_id}}}',
+            f'{{"op": "fly", "shopper_id": {self.shopper_id}}}',
+            '{"op": "view_basket", "shopper_id": [1]}',
+        ])
+        self.assertEqual(self.error_lines(report), [2, 3, 4, 5])
+        self.assertEqual(self.basket_products(), [self.offers[0][0]])
+
+    def test_bad_values_in_an_op(self):
+        product_id, seller_id = self.offers[1]
+        report = self.run_lines([
+            self.add_item(self.offers[0]),
+            f'{{"op": "add_item", "shopper_id": {self.shopper_id}, "product_id": {product_id}, '
+            f'"seller_id": {seller_id}, "quantity": 99999999999999999999, "price": "1.00"}}',
+            f'{{"op": "add_item", "shopper_id": {self.shopper_id}, "product_id": {product_id}, '
+            f'"seller_id": {seller_id}, "quantity": 1, "price": "lots"}}',
+        ])
+        self.assertEqual(self.error_lines(report), [2, 3])
+        self.assertEqual(self.basket_products(), [self.offers[0][0]])
+
+    def test_replayed_checkout_returns_the_same_order(self):
+        checkout = f'{{"op": "checkout", "shopper_id": {self.shopper_id}, "idempotency_key": "replay-1"}}'
+        orders_before = self.conn.execute("SELECT COUNT(*) FROM shopper_orders").fetchone()[0]
+        report = self.run_lines([self.add_item(self.offers[0]), checkout, checkout])
+        self.assertEqual(report.error_samples, [])
+        self.assertEqual(report.ops['checkout'], 2)
+        orders_after = self.conn.execute("SELECT COUNT(*) FROM shopper_orders").fetchone()[0]
+        self.assertEqual(orders_after, orders_before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
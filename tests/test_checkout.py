@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import ConnectionPool
+from orders import CheckoutConflict
+from shopper_session import ShopperError, ShopperSession
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class CheckoutIdempotencyTest(unittest.TestCase):
+    """Idempotency keys replay a shopper's own order and never anyone else's"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.conn = self.pool.acquire()
+        self.shoppers = [row[0] for row in self.conn.execute(
+            "SELECT shopper_id FROM shoppers ORDER BY shopper_id LIMIT 2")]
+        self.offers = [tuple(row) for row in self.conn.execute("""
+            SELECT product_id, MIN(seller_id) FROM product_sellers GROUP BY product_id ORDER BY product_id LIMIT 2
+        """)]
+
+    def tearDown(self):
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def session(self, shopper_id, offer):
+        session = ShopperSession(self.conn, shopper_id)
+        product_id, seller_id = offer
+        price = self.conn.execute("SELECT price FROM product_sellers WHERE product_id = ? AND seller_id = ?",
+                                  (product_id, seller_id)).fetchone()[0]
+        session.add_item(product_id, seller_id, 1, price)
+        return session
+
+    def order_shopper(self, order_id):
+        return self.conn.execute("SELECT shopper_id FROM shopper_orders WHERE order_id = ?",
+                                 (order_id,)).fetchone()[0]
+
+    def test_replay_returns_the_same_order(self):
+        session = self.session(self.shoppers[0], self.offers[0])
+        order_id = session.checkout("abc")
+        self.assertEqual(session.checkout("abc"), order_id)
+        self.assertEqual(ShopperSession(self.conn, self.shoppers[0]).checkout("abc"), order_id)
+
+    def test_another_shoppers_key_checks_out_their_own_basket(self):
+        first = self.session(self.shoppers[0], self.offers[0]).checkout("abc")
+        second_session = self.session(self.shoppers[1], self.offers[1])
+        second = second_session.checkout("abc")
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.order_shopper(second), self.shoppers[1])
+        self.assertTrue(second_session.basket().is_empty())
+
+    def test_key_reused_for_a_new_basket_conflicts(self):
+        session = self.session(self.shoppers[0], self.offers[0])
+        session.checkout("abc")
+        session = self.session(self.shoppers[0], self.offers[1])
+        with self.assertRaises(CheckoutConflict):
+            session.checkout("abc")
+        self.assertFalse(session.basket().is_empty())
+
+    def test_empty_basket_without_a_stored_key(self):
+        with self.assertRaises(ShopperError):
+            ShopperSession(self.conn, self.shoppers[0]).checkout("never-used")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from database import ConnectionPool
+from db_worker import DbWorker
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class FakeWidget:
+    """Stands in for the Tk widget: after() only records the job, the test runs it"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, func):
+        self.next_id += 1
+        self.jobs[self.next_id] = func
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_jobs(self):
+        jobs, self.jobs = self.jobs, {}
+        for func in jobs.values():
+            func()
+
+
+class DbWorkerPollTest(unittest.TestCase):
+    """Results keep flowing to the Tk thread when a callback raises"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.widget = FakeWidget()
+        self.busy_changes = []
+        self.worker = DbWorker(self.widget, pool=self.pool, on_busy=self.busy_changes.append)
+
+    def tearDown(self):
+        self.worker.close()
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def poll_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "results were never delivered")
+            self.assertTrue(self.widget.jobs, "the poll was not rescheduled")
+            self.widget.run_jobs()
+            time.sleep(0.01)
+
+    def test_failing_callbacks_do_not_stop_the_poll(self):
+        delivered = []
+
+        def closed_window(result):
+            raise RuntimeError("invalid command name \".!toplevel.!pagedgrid\"")
+
+        def failing_handler(error):
+            raise RuntimeError("error handler failed too")
+
+        count = lambda conn: conn.execute("SELECT COUNT(*) FROM shoppers").fetchone()[0]
+        self.worker.submit(count, closed_window)
+        self.worker.submit(lambda conn: conn.execute("SELECT * FROM no_such_table"), on_error=failing_handler)
+        self.worker.submit(count, delivered.append)
+
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.poll_until(lambda: delivered)
+        self.assertIn("error handler failed too", stderr.getvalue())
+        self.assertGreater(delivered[0], 0)
+        self.assertFalse(self.worker.busy)
+        self.assertEqual(self.busy_changes, [True, False])
+        self.assertTrue(self.widget.jobs)
+
+        # and later requests are still delivered
+        self.worker.submit(count, delivered.append)
+        self.poll_until(lambda: len(delivered) == 2)
+
+    def test_cancelled_tag_is_never_delivered(self):
+        delivered = []
+        self.worker.submit(lambda conn: 1, delivered.append, tag="grid")
+        self.worker.cancel("grid")
+        self.worker.submit(lambda conn: 2, delivered.append)
+        self.poll_until(lambda: delivered)
+        self.assertEqual(delivered, [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
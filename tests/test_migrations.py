@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from auth import normalize_email
+from database import connect
+from migrations import MIGRATIONS, migrate, schema_version
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+
+class EmailKeyMigrationTest(unittest.TestCase):
+    """Migration 10 keys login emails exactly as a login looks them up"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.conn = connect(path)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.directory)
+
+    def test_keys_use_normalize_email_and_the_oldest_keeps_a_shared_one(self):
+        first, second, third = [row[0] for row in self.conn.execute(
+            "SELECT shopper_id FROM shoppers ORDER BY shopper_id LIMIT 3")]
+        email = self.conn.execute("SELECT shopper_email_address FROM shoppers WHERE shopper_id = ?",
+                                  (first,)).fetchone()[0]
+        self.conn.execute("UPDATE shoppers SET shopper_email_address = ? WHERE shopper_id = ?",
+                          (email.upper() + "\t", second))
+        self.conn.execute("UPDATE shoppers SET shopper_email_address = ? WHERE shopper_id = ?",
+                          (" " + email, third))
+        self.conn.commit()
+
+        migrate(self.conn)
+        self.assertEqual(schema_version(self.conn), MIGRATIONS[-1][0])
+        keys = dict(self.conn.execute("SELECT shopper_id, email_key FROM shoppers"))
+        self.assertEqual(keys.pop(first), normalize_email(email))
+        self.assertIsNone(keys.pop(second))
+        self.assertIsNone(keys.pop(third))
+        emails = dict(self.conn.execute("SELECT shopper_id, shopper_email_address FROM shoppers"))
+        self.assertEqual(keys, {shopper_id: normalize_email(emails[shopper_id]) for shopper_id in keys})
+
+
+if __name__ == "__main__":
+    unittest.main()
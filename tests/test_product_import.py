@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import ConnectionPool
+from money import Money
+from product_import import import_file
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+HEADER = "product_code,category_code,description,manufacturer,model,status,seller_ref,price\n"
+
+
+class ReimportTest(unittest.TestCase):
+    """Importing the same file again updates products and offers in place"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.conn = self.pool.acquire()
+        self.category = self.conn.execute("SELECT MIN(category_code) FROM categories").fetchone()[0]
+        self.sellers = [row[0] for row in self.conn.execute(
+            "SELECT seller_account_ref FROM sellers ORDER BY seller_id LIMIT 2")]
+
+    def tearDown(self):
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def write_file(self, prices):
+        path = os.path.join(self.directory, "catalog.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(HEADER)
+            for number, price in enumerate(prices):
+                seller = self.sellers[number % len(self.sellers)]
+                f.write(f"TEST-{number},{self.category},Test product {number},Acme,M{number},Available,"
+                        f"{seller},{price}\n")
+        return path
+
+    def offers(self):
+        return self.conn.execute("""
+            SELECT p.product_code, ps.price, s.min_price, s.max_price, s.seller_count
+            FROM products p
+            JOIN product_sellers ps ON ps.product_id = p.product_id
+            JOIN product_summary s ON s.product_id = p.product_id
+            WHERE p.product_code LIKE 'TEST-%'
+            ORDER BY p.product_code
+        """).fetchall()
+
+    def test_second_import_changes_prices(self):
+        first = import_file(self.conn, self.write_file(["1.00", "2.50", "3.99"]))
+        self.assertEqual(sum(first.rejected.values()), 0)
+        second = import_file(self.conn, self.write_file(["1.50", "2.50", "4.25"]), chunk_size=2)
+        self.assertEqual(second.reject_samples, [])
+        self.assertEqual((second.products, second.offers), (3, 3))
+        expected = [Money.from_pounds(price) for price in ("1.50", "2.50", "4.25")]
+        self.assertEqual([tuple(row[1:]) for row in self.offers()],
+                         [(price, price, price, 1) for price in expected])
+
+    def test_unchanged_file_imports_cleanly(self):
+        path = self.write_file(["1.00", "2.00"])
+        import_file(self.conn, path)
+        report = import_file(self.conn, path)
+        self.assertEqual(report.reject_samples, [])
+        self.assertEqual(len(self.offers()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
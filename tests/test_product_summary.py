@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import ConnectionPool
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Orinoco.db")
+
+OFFER_UPSERT = """
+    INSERT INTO product_sellers (product_id, seller_id, price) VALUES (?, ?, ?)
+    ON CONFLICT (product_id, seller_id) DO UPDATE SET price = excluded.price
+"""
+
+
+class ProductSummaryTriggerTest(unittest.TestCase):
+    """product_summary follows every kind of write to product_sellers"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "test.db")
+        shutil.copy(SHIPPED_DB, path)
+        self.pool = ConnectionPool(path, size=1)
+        self.conn = self.pool.acquire()
+        self.product_id, self.seller_id = self.conn.execute(
+            "SELECT product_id, MIN(seller_id) FROM product_sellers GROUP BY product_id ORDER BY product_id LIMIT 1"
+        ).fetchone()
+        self.other_seller = self.conn.execute("""
+            SELECT MIN(seller_id) FROM sellers
+            WHERE seller_id NOT IN (SELECT seller_id FROM product_sellers WHERE product_id = ?)
+        """, (self.product_id,)).fetchone()[0]
+
+    def tearDown(self):
+        self.pool.release(self.conn)
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def summary(self):
+        return tuple(self.conn.execute(
+            "SELECT seller_count, min_price, max_price FROM product_summary WHERE product_id = ?",
+            (self.product_id,)).fetchone())
+
+    def expected(self):
+        return tuple(self.conn.execute(
+            "SELECT COUNT(*), MIN(price), MAX(price) FROM product_sellers WHERE product_id = ?",
+            (self.product_id,)).fetchone())
+
+    def test_upsert_changes_an_existing_price(self):
+        self.conn.execute(OFFER_UPSERT, (self.product_id, self.seller_id, 1))
+        self.conn.commit()
+        self.assertEqual(self.summary(), self.expected())
+        self.assertEqual(self.summary()[1], 1)
+
+    def test_upsert_adds_a_new_offer(self):
+        count = self.summary()[0]
+        self.conn.execute(OFFER_UPSERT, (self.product_id, self.other_seller, 99999999))
+        self.conn.commit()
+        self.assertEqual(self.summary(), self.expected())
+        self.assertEqual(self.summary()[0], count + 1)
+
+    def test_update_and_delete(self):
+        self.conn.execute("UPDATE product_sellers SET price = 2 WHERE product_id = ? AND seller_id = ?",
+                          (self.product_id, self.seller_id))
+        self.assertEqual(self.summary(), self.expected())
+        self.conn.execute("DELETE FROM product_sellers WHERE product_id = ? AND seller_id = ?",
+                          (self.product_id, self.seller_id))
+        self.conn.commit()
+        self.assertEqual(self.summary(), self.expected())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import argparse
+import operator
+import sys
+import time
+from array import array
+
+from database import get_pool
+from money import Money
+from order_export import ORDER_STATUSES, order_filter
+
+try:
+    import numpy as np
+except ImportError:     # the array fallback gives the same totals, just more slowly
+    np = None
+
+# Values sets of order lines in bulk. Lines are loaded once into flat int64
+# columns (quantity, price in pence and the keys they can be grouped by) and
+# totalled with NumPy when it is installed, or with C-level array arithmetic
+# when it is not. All arithmetic is on integer pence, so totals match SQL's
+# SUM(quantity * price) exactly.
+
+DEFAULT_BATCH_SIZE = 10000
+
+# The order date as an integer YYYYMMDD; string slicing is much cheaper per row than strftime()
+DAY_SQL = "CAST(REPLACE(substr(o.order_date, 1, 10), '-', '') AS INTEGER)"
+
+LINE_STATUSES = ('Placed', 'Dispatched', 'Delivered', 'Cancelled')
+
+
+def _status_code_sql(column, statuses):
+    """SQL mapping a status column to its index in statuses (len(statuses) for anything else)"""
+    cases = " ".join(f"WHEN '{status}' THEN {code}" for code, status in enumerate(statuses))
+    return f"CASE {column} {cases} ELSE {len(statuses)} END"
+
+
+# Grouping keys: name -> SQL expression giving an integer
+GROUP_KEYS = {
+    'order': "op.order_id",
+    'shopper': "o.shopper_id",
+    'seller': "op.seller_id",
+    'product': "op.product_id",
+    'day': DAY_SQL,
+    'category': "IFNULL(p.category_id, 0)",
+    'order_status': _status_code_sql("o.order_status", ORDER_STATUSES),
+    'line_status': _status_code_sql("op.ordered_product_status", LINE_STATUSES),
+}
+
+# Only these keys need the product row; loads without them skip the join
+PRODUCT_KEYS = ('category',)
+PRODUCT_JOIN = "\n    LEFT JOIN products p ON p.product_id = op.product_id"
+
+LINES_SQL = """
+    SELECT {columns}, op.quantity, op.price
+    FROM shopper_orders o
+    JOIN ordered_products op ON op.order_id = o.order_id{joins}
+    WHERE {order_filter}{line_filter}
+"""
+
+TOTALS_SQL = """
+    SELECT {key} as group_key, SUM(op.quantity * op.price)
+    FROM shopper_orders o
+    JOIN ordered_products op ON op.order_id = o.order_id{joins}
+    WHERE {order_filter}{line_filter}
+    GROUP BY group_key
+"""
+
+# Cancelled lines do not count towards an order's value (as in order_rollups)
+CANCELLED_LINE_FILTER = " AND op.ordered_product_status IS NOT 'Cancelled'"
+
+
+class OrderLines:
+    """Columns of order lines: quantity, price (pence) and one int64 array per grouping key"""
+
+    def __init__(self, keys=()):
+        self.keys = {name: array('q') for name in keys}
+        self.quantity = array('q')
+        self.price = array('q')
+        self.load_seconds = 0.0
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def _column(self, values):
+        return np.frombuffer(values, dtype=np.int64) if np is not None else values
+
+    def column(self, name):
+        """'quantity', 'price' or a loaded key as a NumPy array (no copy) when NumPy is available"""
+        if name == 'quantity':
+            return self._column(self.quantity)
+        if name == 'price':
+            return self._column(self.price)
+        return self._column(self.keys[name])
+
+    def line_values(self):
+        """quantity * price for every line (a NumPy array when NumPy is available)"""
+        if np is not None:
+            return self._column(self.quantity) * self._column(self.price)
+        return array('q', map(operator.mul, self.quantity, self.price))
+
+    def total(self):
+        """Total value of all lines"""
+        if np is not None:
+            return Money(int(np.dot(self._column(self.quantity), self._column(self.price))))
+        return Money(sum(map(operator.mul, self.quantity, self.price)))
+
+    def totals_by(self, key):
+        """{key value: Money total} for one of the loaded grouping keys"""
+        keys = self.keys[key]
+        if not keys:
+            return {}
+        if np is None:
+            totals = {}
+            for group, value in zip(keys, map(operator.mul, self.quantity, self.price)):
+                totals[group] = totals.get(group, 0) + value
+            return {group: Money(total) for group, total in totals.items()}
+        # Sort once, then add up each run of equal keys; integer sums stay exact
+        keys = self._column(keys)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sums = np.add.reduceat(self.line_values()[order], starts)
+        return {int(group): Money(int(total)) for group, total in zip(sorted_keys[starts], sums)}
+
+
+def _filters(date_from, date_to, statuses, include_cancelled):
+    condition, params = order_filter(date_from, date_to, statuses)
+    return condition, ("" if include_cancelled else CANCELLED_LINE_FILTER), params
+
+
+def _joins(keys):
+    return PRODUCT_JOIN if any(key in PRODUCT_KEYS for key in keys) else ""
+
+
+def load_lines(conn, keys=('order',), date_from=None, date_to=None, statuses=None,
+               include_cancelled=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Load the matching order lines into an OrderLines, batch_size rows at a time"""
+    condition, line_filter, params = _filters(date_from, date_to, statuses, include_cancelled)
+    lines = OrderLines(keys)
+    columns = [GROUP_KEYS[key] for key in keys] or ["NULL"]
+    sql = LINES_SQL.format(columns=", ".join(columns), joins=_joins(keys), order_filter=condition,
+                           line_filter=line_filter)
+    started = time.perf_counter()
+    key_arrays = list(lines.keys.values())
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        # Transpose each batch into the columns rather than appending row by row
+        columns = list(zip(*rows))
+        for values, column in zip(key_arrays, columns):
+            values.extend(column)
+        lines.quantity.extend(columns[-2])
+        lines.price.extend(columns[-1])
+    cursor.close()
+    lines.load_seconds = time.perf_counter() - started
+    return lines
+
+
+def sql_totals(conn, key, date_from=None, date_to=None, statuses=None, include_cancelled=False):
+    """The same totals computed by SQLite, for checking the engine"""
+    condition, line_filter, params = _filters(date_from, date_to, statuses, include_cancelled)
+    sql = TOTALS_SQL.format(key=GROUP_KEYS[key], joins=_joins((key,)), order_filter=condition,
+                            line_filter=line_filter)
+    return {row[0]: Money(row[1]) for row in conn.execute(sql, params)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Total the value of order lines")
+    parser.add_argument("--by", choices=sorted(GROUP_KEYS), default="day", help="group totals by")
+    parser.add_argument("--from", dest="date_from", help="first order date to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="order dates before this are included (YYYY-MM-DD)")
+    parser.add_argument("--status", action="append", choices=ORDER_STATUSES,
+                        help="only orders with this status (repeatable)")
+    parser.add_argument("--include-cancelled", action="store_true", help="count cancelled lines too")
+    parser.add_argument("--top", type=int, default=10, help="groups to print, largest first")
+    parser.add_argument("--check", action="store_true", help="compare every total with SQL")
+    args = parser.parse_args()
+
+    filters = dict(date_from=args.date_from, date_to=args.date_to, statuses=args.status,
+                   include_cancelled=args.include_cancelled)
+    with get_pool().connection() as conn:
+        started = time.perf_counter()
+        lines = load_lines(conn, (args.by,), **filters)
+        loaded = time.perf_counter()
+        totals = lines.totals_by(args.by)
+        total = lines.total()
+        finished = time.perf_counter()
+        expected = sql_totals(conn, args.by, **filters) if args.check else None
+
+    engine = "numpy" if np is not None else "array"
+    print(f"{len(lines)} lines, {len(totals)} groups by {args.by}, total {total}")
+    print(f"load {loaded - started:.2f}s, value ({engine}) {finished - loaded:.3f}s")
+    for group, value in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {group}: {value}")
+
+    if expected is not None:
+        mismatched = [group for group in expected.keys() | totals.keys()
+                      if expected.get(group) != totals.get(group)]
+        if mismatched:
+            print(f"{len(mismatched)} groups differ from SQL, e.g. {mismatched[:5]}")
+            return 1
+        print("Every total matches SQL")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())